@@ -6,8 +6,9 @@ import pytz
 from dateutil.tz import tzlocal
 import threading
 import concurrent.futures
-from multiprocessing import Process, Manager, Queue
+from multiprocessing import Process, Manager, Queue, Value
 from retry import retry
+from functools import lru_cache
 from ordered_set import OrderedSet
 
 pd.set_option('display.max_columns', 15)
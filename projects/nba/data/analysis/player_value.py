@@ -1,138 +1,250 @@
 # FIND VALUE OF EACH PLAYER
+from modelling.projects.nba import *  # import broadly used python packages
 from modelling.projects.nba.utils import *  # import user defined utilities
+from scipy import sparse
+from scipy.sparse.linalg import lsqr
 
 
-def get_plays_indices():
-    """ get the plays the given players was involved in """
-    player_plays_boolean = [player_id in play for play in players_list]
-    opp_player_plays_boolean = [player_id in play for play in opp_players_list]
+@timed
+def get_design_matrix(plays_lineups, index):
+    """ sparse matrix of possessions by players, with 1 for the players of the team with the ball and -1 otherwise """
+    players = plays_lineups.get_players(index)
+    opp_players = plays_lineups.get_players(index, opp=True)
 
-    index_1 = [i for i, x in enumerate(player_plays_boolean) if x]
-    index_2 = [i for i, x in enumerate(opp_player_plays_boolean) if x]
+    rows = np.repeat(np.arange(len(index)), players.shape[1])
+    data = np.concatenate([np.ones(players.size), -np.ones(opp_players.size)])
 
-    return index_1, index_2
+    output = sparse.csr_matrix((data, (np.concatenate([rows, rows]),
+                                       np.concatenate([players.ravel(), opp_players.ravel()]))),
+                               shape=(len(index), len(plays_lineups.player_ids)))
 
+    return output
+
+
+@timed
+def get_player_values(design, points, alpha=player_value_alpha, start=None):
+    """ ridge regression of points on each possession against the players on court, as in RAPM
 
-def get_score_list(index):
-    """ get the list of scoring events for the given index """
-    output = [event_value_list[i] if event_list[i] in ['FG Make', 'FT Make'] else 0 for i in index]
+    values are points per possession added by each player compared to an average possession, found by minimising
+    |design @ values - points|^2 + alpha * |values|^2, starting from start if given
+    """
+    target = points - points.mean()
+
+    # add the penalty as extra rows rather than using lsqr's damp, which would pull values towards start
+    penalty = np.sqrt(alpha) * sparse.identity(design.shape[1], format='csr')
+
+    output = lsqr(sparse.vstack([design, penalty], format='csr'),
+                  np.concatenate([target, np.zeros(design.shape[1])]),
+                  atol=1e-10, btol=1e-10, x0=start)[0]
 
     return output
 
 
-def get_team_scores(current_player_id, player_list, index):
-    """ input the latest player scores for each team for possession for the given index """
-    output = [sum([latest_iteration[player]['value'] for player in player_list[i].split('|')
-                   if player != current_player_id])
-              for i in index if possession_list[i] == 1]
+def get_player_possessions(design):
+    """ get the number of possessions each player was on court for, for either team """
+    output = design.getnnz(axis=0)
 
     return output
 
 
-def get_player_score(list_1, list_2, list_3):
-    """ calculate the score for the current player """
-    output = sum(list_1) - sum(list_2) + sum(list_3)
+def get_windows(games, seasons, window, step):
+    """ get the games in each season, and in rolling windows of the last window games every step games
+
+    games are numbered by their position in games, and each window runs from game first up to but not including end,
+    ending after the last game of a date so that games on the same night are kept together. Rolling windows only end
+    every step games into a season, so a season in progress has the same windows as it will once it is complete, and
+    the games since the last step are only in the season window
+    """
+    dates = games['game_date'].to_numpy()
+    output = []
+
+    for season in seasons:
+        positions = np.flatnonzero(games['season'].to_numpy() == season)
+
+        if not len(positions):
+            continue
+
+        first, last = positions[0], positions[-1] + 1
+
+        ends = np.arange(first + step, last + 1, step)
+        ends = np.unique(np.searchsorted(dates, dates[ends - 1], side='right'))
+        starts = np.maximum(0, ends - window)
+
+        output += [{'window_type': 'rolling', 'season': season, 'end_date': dates[end - 1], 'games': end - start,
+                    'first': start, 'end': end} for start, end in zip(starts, ends)]
+        output += [{'window_type': 'season', 'season': season, 'end_date': dates[last - 1], 'games': last - first,
+                    'first': first, 'end': last}]
+
+    output = pd.DataFrame(output, columns=['window_type', 'season', 'end_date', 'games', 'first', 'end'])
 
     return output
 
 
-if __name__ == '__main__':
-    engine, metadata, connection = get_connection(database)
-    engine_analysis, metadata_analysis, connection_analysis = get_connection(database_analysis)
+def get_new_windows(windows, new_games):
+    """ get the rolling windows ending since the last run, and the season windows of the new games """
+    is_new = ((windows['window_type'] == 'rolling')
+              & (pd.to_datetime(windows['end_date']) >= pd.to_datetime(new_games['game_date']).min()))
+    is_new |= (windows['window_type'] == 'season') & windows['season'].isin(new_games['season'])
+
+    output = windows[is_new].reset_index(drop=True)
+
+    return output
+
+
+def solve_windows(design, points, player_ids, windows, start=None):
+    """ solve player values for windows in order, each starting from the solution of the window before
+
+    rows of the design matrix are possessions in game order, and each window gives its first and last row in the design
+    matrix, so windows that overlap reuse the same matrix rather than building their own
+    """
+    output = []
+
+    for window in windows:
+        rows = slice(window['first_row'], window['end_row'])
+
+        values = get_player_values(design[rows], points[rows], start=start)
+        possessions = get_player_possessions(design[rows])
+        start = values
 
-    df_sql = sql.Table('season_plays', metadata_analysis, autoload=True, autoload_with=engine_analysis)
-    season_plays = pd.read_sql(sql=sql.select([df_sql]), con=engine_analysis)
+        # only players who were on court in the window
+        on_court = possessions > 0
 
-    query = get_join_query(metadata, engine, 'games', 'games_lineups', 'season', [2020])
+        window_values = pd.DataFrame({'value': values[on_court].round(5),
+                                      'possessions': possessions[on_court].astype('int'),
+                                      'player_id': player_ids[on_court]})
 
-    season_players = pd.read_sql(sql=query, con=engine)
-    player_ids = season_players['player_id'].unique()
+        for column in ['window_type', 'season', 'end_date', 'games']:
+            window_values[column] = window[column]
 
-    latest_iteration = {player: {'value': 0} for player in player_ids}
-    latest_deltas = []
-    max_delta = 1
+        output.append(window_values)
 
-    while max_delta > 0.001:
-        # set dictionary for latest iteration
-        current_iteration = {}
-        current_deltas = []
+    output = pd.concat(output, ignore_index=True)
 
-        # get index of all possessions and scoring plays, but exclude period end
-        possession_index = ((season_plays['possession'] == 1) | (season_plays['event'] == 'FT Make')) &\
-                           (season_plays['event'] != 'Period End')
+    return output
+
+
+def get_latest_values(engine, metadata, player_ids):
+    """ get the values of the last rolling window written, to start the next window from, or None if there isn't one """
+    table = get_table(metadata, engine, 'player_values')
+    latest = sql.select([sql.func.max(table.c.end_date)]).where(table.c.window_type == 'rolling')
+
+    selectable = sql.select([table.c.player_id, table.c.value]).where(sql.and_(table.c.window_type == 'rolling',
+                                                                              table.c.end_date == latest.as_scalar()))
+    latest_values = pd.read_sql(sql=selectable, con=engine)
+
+    if not len(latest_values):
+        return None
+
+    # players new to this window start at 0
+    output = latest_values.set_index('player_id')['value'].reindex(player_ids).fillna(0).to_numpy()
+
+    return output
 
-        # convert all series' to lists
-        players_list = season_plays.loc[possession_index, 'players'].tolist()
-        opp_players_list = season_plays.loc[possession_index, 'opp_players'].tolist()
-        event_list = season_plays.loc[possession_index, 'event'].tolist()
-        event_value_list = season_plays.loc[possession_index, 'event_value'].tolist()
-        possession_list = season_plays.loc[possession_index, 'possession'].tolist()
 
-        for iteration in range(len(player_ids)):
-            start_time = time.time()
+def get_windows_delete_query(metadata, engine, windows):
+    """ clear the values of windows about to be solved again, i.e. a season in progress or a rerun on the same day """
+    table = get_table(metadata, engine, 'player_values')
 
-            player_id = player_ids[iteration]
+    conditions = [sql.and_(table.c.window_type == 'rolling', table.c.end_date == i)
+                  for i in windows.loc[windows['window_type'] == 'rolling', 'end_date']]
+    conditions += [sql.and_(table.c.window_type == 'season', table.c.season == int(i))
+                   for i in windows.loc[windows['window_type'] == 'season', 'season']]
 
-            # get player indices
-            player_index, opp_player_index = get_plays_indices()
+    output = table.delete().where(sql.or_(*conditions))
 
-            # get list of scoring events
-            score_list = get_score_list(player_index)
-            opp_score_list = get_score_list(opp_player_index)
+    return output
 
-            # get player scores for team and opponent when team scores
-            team_score = get_team_scores(player_id, players_list, player_index)
-            team_score_opp = get_team_scores(player_id, opp_players_list, player_index)
 
-            # get player scores for team and opponent when opponent scores
-            opp_score = get_team_scores(player_id, opp_players_list, opp_player_index)
-            opp_score_opp = get_team_scores(player_id, players_list, opp_player_index)
+if __name__ == '__main__':
+    engine, metadata, connection = get_connection(database)
+    engine_analysis, metadata_analysis, connection_analysis = get_connection(database_analysis)
+    create_table_player_values(engine_analysis, metadata_analysis)
+    create_table_watermarks(engine, metadata)
 
-            # calculate player and opponent scores
-            player_score = get_player_score(score_list, team_score, team_score_opp)
-            player_opp_score = get_player_score(opp_score_list, opp_score, opp_score_opp)
+    # games after the last one with player values at the previous run
+    new_games = get_new_games(engine, metadata, 'player_values')
 
-            # find number of possessions player was on for and calculate average player possession value
-            player_possessions = sum([possession_list[i] for i in player_index + opp_player_index])
+    if INCREMENTAL and not len(new_games):
+        print(Colour.green + 'No new games for player values' + Colour.end)
+        sys.exit()
 
-            # divide calculation by 5, as there are 5 players on the court
-            try:
-                player_possession_value = round(((player_score-player_opp_score)/player_possessions)/5, 5)
-            except ZeroDivisionError:
-                player_possession_value = round((player_score - player_opp_score)/5, 5)
+    # games played in order, numbered by their position
+    seasons = list(range(start_season_value, end_season_value + 1))
+    selectable = get_table_query(metadata, engine, 'games', 'season', seasons)
+    games = pd.read_sql(sql=selectable, con=engine).sort_values(['game_date', 'game_id'], ignore_index=True)
+    games = games[games['home_score'].notnull()].reset_index(drop=True)
 
-            # store value in current dict
-            current_iteration[player_id] = {'value': player_possession_value, 'possessions': player_possessions}
+    if INCREMENTAL:
+        # only games with possessions loaded
+        games = games[games['game_date'] <= new_games['game_date'].max()].reset_index(drop=True)
 
-            # find delta from previous iteration and store in list
-            d = abs(player_possession_value - latest_iteration[player_id]['value'])
-            current_deltas.append(d)
+    windows = get_windows(games, seasons, player_value_window, player_value_step)
 
-            calculation_time = time.time() - start_time
+    if INCREMENTAL:
+        windows = get_new_windows(windows, new_games)
 
-            time_taken = "{:.2f}".format(calculation_time) + ' seconds Total ' + time_lapsed()
+    if not len(windows):
+        print(Colour.green + 'No windows to find player values for' + Colour.end)
+        sys.exit()
 
-            progress(iteration=iteration,
-                     iterations=len(player_ids),
-                     iteration_name=player_id + f' {player_possession_value}',
-                     lapsed=time_taken)
+    # possessions of every game in a window in game order, so every window is a block of rows, with the lineups on
+    # court for each as arrays
+    game_ids = games.loc[windows['first'].min():windows['end'].max() - 1, 'game_id'].tolist()
 
-        max_delta = max(current_deltas)
-        print(f'end of current iteration, max delta = {max_delta}')
-        latest_iteration = current_iteration
+    selectable = get_table_query(metadata, engine, 'possessions', 'game_id', game_ids)
+    possessions = pd.read_sql(sql=selectable, con=engine)
 
-    player_value = pd.DataFrame.from_dict(data=latest_iteration,
-                                          orient='index',
-                                          columns=['value', 'possessions'])
+    possessions['game_position'] = pd.Index(games['game_id']).get_indexer(possessions['game_id'])
+    possessions = possessions.sort_values(['game_position', 'play_id'], ignore_index=True)
+    plays_lineups = get_plays_lineups(engine, metadata, possessions)
 
-    player_value['player_id'] = player_value.index
-    player_value = player_value.reset_index(drop=True)
+    # a row for each possession and a column for each player, built once for all windows
+    design = get_design_matrix(plays_lineups, np.arange(len(possessions)))
+    points = possessions['points'].to_numpy(dtype='float')
 
-    status = write_data(df=player_value,
-                        name='player_value',
+    game_rows = np.searchsorted(possessions['game_position'].to_numpy(), np.arange(len(games) + 1))
+    windows['first_row'] = game_rows[windows['first']]
+    windows['end_row'] = game_rows[windows['end']]
+
+    # windows are solved in order, each starting from the window before it, with the rolling windows of a season before
+    # its season window. Seasons are split into a block for each process, which each solve their seasons as one chain
+    # given only the rows their windows need, so only the first window of each block starts from nothing
+    windows = windows.sort_values(['season', 'window_type', 'end_date'], ignore_index=True)
+    blocks = [i for i in np.array_split(windows['season'].unique(), player_value_processes) if len(i)]
+
+    start = get_latest_values(engine_analysis, metadata_analysis, plays_lineups.player_ids) if INCREMENTAL else None
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=player_value_processes) as executor:
+        futures = []
+
+        for i, block in enumerate(blocks):
+            block_windows = windows[windows['season'].isin(block)]
+            rows = slice(block_windows['first_row'].min(), block_windows['end_row'].max())
+
+            block_windows = block_windows.assign(first_row=block_windows['first_row'] - rows.start,
+                                                 end_row=block_windows['end_row'] - rows.start)
+
+            futures.append(executor.submit(solve_windows, design[rows], points[rows], plays_lineups.player_ids,
+                                           block_windows.to_dict('records'), start if i == 0 else None))
+
+        player_values = pd.concat([future.result() for future in futures], ignore_index=True)
+
+    # replace any values already written for these windows, or for the whole of each season when run in full
+    if INCREMENTAL:
+        selectable = get_windows_delete_query(metadata_analysis, engine_analysis, windows)
+    else:
+        selectable = get_delete_query(metadata_analysis, engine_analysis, 'player_values', 'season', seasons)
+
+    connection_analysis.execute(selectable)
+
+    status = write_data(df=player_values,
+                        name='player_values',
                         sql_engine=engine_analysis,
                         db_schema='nba_analysis',
                         if_exists='append',
                         index=False)
 
+    if INCREMENTAL:
+        update_watermark(engine, metadata, 'player_values', new_games)
+
     print(f"Finished and {status['sql']}")
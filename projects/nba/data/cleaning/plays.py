@@ -5,15 +5,25 @@ from modelling.projects.nba.utils import *  # import user defined utilities
 
 # LOADING AND TIDYING OF RAW PLAYS TEXT
 # get the plays for specified game
+@timed
 def get_raw_plays(plays_raw, games, game_id):
-    home_team = games.loc[games['game_id'] == game_id, 'home_team'].item()
-    away_team = games.loc[games['game_id'] == game_id, 'away_team'].item()
+    # look up the game's row through the per-game index rather than scanning the games table
+    teams = games.get_partition(game_id)
 
+    # slice only this game's rows from the shared season plays
+    output = tidy_raw_plays(plays_raw.get_partition(game_id), teams['home_team'].item(), teams['away_team'].item())
+
+    return output
+
+
+# tidy up the raw plays text of a game
+@timed
+def tidy_raw_plays(df, home_team, away_team):
     # define global team_names to be used
     global team_names
     team_names = {'home_team': home_team, 'away_team': away_team}
 
-    output = plays_raw.loc[plays_raw['game_id'] == game_id]
+    output = df
 
     # remove line breaks from strings
     output['plays'] = play_remove_line_break(output['plays'])
@@ -33,39 +43,38 @@ def get_raw_plays(plays_raw, games, game_id):
     # remove any loose whitespace
     output['plays'] = output['plays'].str.strip()
 
-    log_performance()
     return output
 
 
 # cleans line break from raw plays
+@timed
 def play_remove_line_break(x):
     output = x.str.replace(r'\n', '')
 
-    log_performance()
     return output
 
 
 # cleans out +d score from raw plays
+@timed
 def play_remove_score_added(x):
     output = x.str.replace(r'(\+[0-9])', '')
 
-    log_performance()
     return output
 
 
 # cleans out scoreboard from raw plays
+@timed
 def play_remove_score(x):
     output = x.str.replace(r'\d+-+\d+', '')
 
-    log_performance()
     return output
 
 
 # cleans out time remaining from raw plays
+@timed
 def play_remove_time(x):
     output = x.str.replace(r'\d+:\d+\.\d', '')
 
-    log_performance()
     return output
 
 
@@ -77,437 +86,351 @@ def get_play_id(df):
     return output
 
 
-# get the period of the game based on the 'start of period' line
-def get_quarter(play):
-    period = re.search(r'Start of (.*)', play).group(1)
-    if 'overtime' in period:
-        output = 'OT' + str(left(period, 1))
-    else:
-        output = re.search(r'(.*) quarter', period).group(1)
+# get the period of the game based on the 'start of period' lines
+@timed
+def get_quarter(series):
+    period = series.str.extract(r'Start of (.*)', expand=False)
+    overtime = 'OT' + period.str[0]
+    quarter = period.str.extract(r'(.*) quarter', expand=False)
+    output = overtime.where(period.str.contains('overtime', regex=False), quarter)
 
-    log_performance()
     return output
 
 
 # get the time of the play
+@timed
 def get_time(series):
     output = series.str.extract(r'(\d+:\d+\.\d)', expand=False)
     output = output.str.replace(r'\.0', '')
 
-    log_performance()
     return output
 
 
+# running home and away score after each play, from a single cumulative sum of points for each game
+@timed
 def get_score(df):
-    home_points = (df.loc[df['event'].str.contains(' Make')
-                          & (df['team_id'] == team_names['home_team']),
-                          'event_value']).reindex(range(len(df))).fillna(0)
-    home_cumulative = home_points.astype('int').cumsum().astype('str')
+    # points scored on each play in a column for each side
+    made = df['event'].str.contains(' Make', regex=False).fillna(False).to_numpy(dtype='bool')
+    points = np.where(made, pd.to_numeric(df['event_value'], errors='coerce').fillna(0), 0).astype('int')
 
-    away_points = (df.loc[df['event'].str.contains(' Make')
-                          & (df['team_id'] == team_names['away_team']),
-                          'event_value']).reindex(range(len(df))).fillna(0)
-    away_cumulative = away_points.astype('int').cumsum().astype('str')
+    sides = np.zeros((len(df), 2), dtype='int')
+    sides[:, 0] = np.where(df['team_id'] == team_names['home_team'], points, 0)
+    sides[:, 1] = np.where(df['team_id'] == team_names['away_team'], points, 0)
 
-    output = home_cumulative.str.cat(away_cumulative, sep='-')
+    output = pd.DataFrame(sides, columns=['home_score', 'away_score'], index=df.index)
+    output = output.groupby(df['game_id'].to_numpy()).cumsum()
 
-    log_performance()
     return output
 
 
+# score in the raw text line, where the position of the play before or after it gives the team
+score_pattern = re.compile(r'^(?P<before>.*?)\d+-+\d+')
+
+
 # find team_id based on the location of the actual play to the score in the raw text line (away before, home after)
+@timed
 def get_teams(series):
-    # find location of score in the strings
-    scores = series.str.extract(r'(\d+-+\d+)', expand=False)
-    score_location = pd.Series([series[i].find(str(scores[i])) for i in range(len(series))])
+    # find location of score in the strings, which is missing where there is no score
+    score_location = series.str.extract(score_pattern)['before'].str.len()
 
     # set mapping conditions
-    conditions = [score_location == -1, score_location == 2]
+    conditions = [score_location.isnull(), score_location == 2]
     teams = [None, team_names['home_team']]
 
     # generate column of teams
     output = np.select(conditions, teams, default=team_names['away_team'])
 
-    log_performance()
     return output
 
 
-def get_team_id(row, reverse=False):
+@timed
+def get_team_id(df, reverse=False):
     # set as initial team_id
-    output = row['teams']
+    output = df['teams']
 
     # in some cases (steals, blocks, some fouls), the play appears on the 'wrong' side
     if reverse:
-        output = list(team_names.values())[team_names['home_team'] == output]
+        output = pd.Series(np.where(output == team_names['home_team'],
+                                    team_names['away_team'],
+                                    team_names['home_team']),
+                           index=df.index)
 
-    log_performance()
     return output
 
 
 # GET EVENT_DETAIL FOR SHOTS
-# get the amount of points a shot was worth
-def get_shot_value(play):
-    if 'free throw' in play:
-        # FTs worth 1 point
-        output = 1
-    elif match := re.search(r'(\d)-pt', play):
-        # FGs worth amount given in play
-        output = match.group(1)
-    else:
-        output = None
+# get the amount of points a shot was worth (FTs as int, FGs as the string given in play)
+@timed
+def get_shot_value(series):
+    output = series.str.extract(r'(\d)-pt', expand=False).astype('object')
+
+    # FTs worth 1 point
+    output[series.str.contains('free throw', regex=False)] = 1
 
-    log_performance()
     return output
 
 
 # get distance of shot, or which free throw it was
-def get_shot_detail(play):
-    if match := re.search(r'free throw (\d)', play):
-        # get which number in sequence of FTs
-        output = match.group(1)
-    elif 'technical' in play:
-        # get if technical FT
-        output = 1
-    elif match := re.search(r'(\d+) ft', play):
-        # get distance of shot if FG
-        output = match.group(1)
-    else:
-        output = 0
+@timed
+def get_shot_detail(series):
+    # get which number in sequence of FTs
+    free_throw = series.str.extract(r'free throw (\d)', expand=False)
+
+    # get distance of shot if FG
+    distance = series.str.extract(r'(\d+) ft', expand=False)
+
+    conditions = [free_throw.notnull(),
+                  series.str.contains('technical', regex=False),
+                  distance.notnull()]
+    details = [free_throw, 1, distance]
+
+    output = pd.Series(np.select(conditions, details, default=0), index=series.index, dtype='object')
+
+    return output
+
+
+# get possession flag for shot make/miss, where FTs only end the possession if the final shot of a sequence
+@timed
+def get_shot_possession(df, shot_type):
+    sequence = df['plays'].str.extract(r'(\d) of (\d)')
+    final_shot = (sequence[0] == sequence[1]).astype('int')
+
+    is_sequence = (shot_type == 'FT') & ~df['plays'].str.contains('technical', regex=False)
+    output = final_shot.where(is_sequence, 1)
 
-    log_performance()
     return output
 
 
 # PRODUCE ROWS FOR EACH DIFFERENT TYPE OF EVENT
-# Produce the 'Period Start' line in order to get the correct period
-def get_period_start(row):
-    play = row['plays']
-    game_id = row['game_id']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              get_quarter(play),  # period
-              row['time'],  # time
-              None,  # score
-              None,  # team_id
-              None,  # player_id
-              'Period Start',  # event
-              None,  # event_value
-              None,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+# build rows in plays column order for the given raw plays, keyed by raw row and order within that row
+def get_event_rows(df,
+                   order,
+                   period=None,
+                   time=None,
+                   team_id=None,
+                   player_id=None,
+                   event=None,
+                   event_value=None,
+                   event_detail=None,
+                   possession=0):
+    output = pd.DataFrame({'row': df.index,
+                           'order': order,
+                           'play_id': None,
+                           'game_id': df['game_id'],
+                           'period': period,
+                           'time': df['time'] if time is None else time,
+                           'home_score': None,
+                           'away_score': None,
+                           'team_id': team_id,
+                           'player_id': player_id,
+                           'event': event,
+                           'event_value': event_value,
+                           'event_detail': event_detail,
+                           'possession': possession},
+                          index=df.index,
+                          dtype='object')
+
+    return output
+
+
+# Produce the 'Period Start' lines in order to get the correct period
+@timed
+def get_period_start(df):
+    output = get_event_rows(df, 0,
+                            period=get_quarter(df['plays']),
+                            event='Period Start')
+
     return output
 
 
-# Produce the 'Period End' line in order to get the correct period end
-def get_period_end(row):
-    game_id = row['game_id']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              '0:00',  # time
-              None,  # score
-              None,  # team_id
-              None,  # player_id
-              'Period End',  # event
-              None,  # event_value
-              None,  # event_detail
-              1  # possession
-              ]
-
-    log_performance()
+# Produce the 'Period End' lines in order to get the correct period end
+@timed
+def get_period_end(df):
+    output = get_event_rows(df, 0,
+                            time='0:00',
+                            event='Period End',
+                            possession=1)
+
     return output
 
 
-# get data for a jump ball
-def get_jump_ball_data(games_lineups, row):
-    game_id = row['game_id']
-    player_1 = row['player_1']
-    player_2 = row['player_2']
-    player_3 = row['player_3']
-    # find team that controlled the tip
-    try:
-        winning_team_id = games_lineups.team_id[(games_lineups.game_id == game_id) &
-                                                (games_lineups.player_id == player_3)].item()
+# get data for jump balls
+@timed
+def get_jump_ball_data(games_lineups, df):
+    lineups = games_lineups[['game_id', 'team_id', 'player_id']]
+
+    # find team that controlled the tip, only where the player is found exactly once in the lineups
+    tips = df.loc[df['player_3'].notnull(), ['game_id', 'player_3']].reset_index()
+    tips = tips.merge(lineups, left_on=['game_id', 'player_3'], right_on=['game_id', 'player_id'])
+    tips = tips.drop_duplicates(subset='index', keep=False).set_index('index')
+
     # very rare issue where jump ball ends out of bounds, just default to home team
-    except ValueError:
-        winning_team_id = get_team_id(row)
-    # find which player from that team competed for the jump ball
-    winning_team_players = games_lineups.player_id[(games_lineups.game_id == game_id) &
-                                                   (games_lineups.team_id == winning_team_id) &
-                                                   (games_lineups.player_id == player_1)]
-    # if player_id found in winning team, then sat that player as player_id, then set other as event_detail
-    if len(winning_team_players) > 0:
-        winning_player_id = player_1
-        losing_player_id = player_2
-    else:
-        winning_player_id = player_2
-        losing_player_id = player_1
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              winning_team_id,  # team_id
-              winning_player_id,  # player_id
-              'Jump Ball',  # event
-              1,  # event_value
-              losing_player_id,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+    winning_team_id = get_team_id(df).copy()
+    winning_team_id[tips.index] = tips['team_id']
+
+    # if player_id found in winning team, then set that player as player_id, then set other as event_detail
+    lineup_keys = pd.MultiIndex.from_frame(lineups)
+    play_keys = pd.MultiIndex.from_arrays([df['game_id'], winning_team_id, df['player_1']])
+    player_1_won = play_keys.isin(lineup_keys) & df['player_1'].notnull()
+
+    winning_player_id = df['player_1'].where(player_1_won, df['player_2'])
+    losing_player_id = df['player_2'].where(player_1_won, df['player_1'])
+
+    output = get_event_rows(df, 0,
+                            team_id=winning_team_id,
+                            player_id=winning_player_id,
+                            event='Jump Ball',
+                            event_value=1,
+                            event_detail=losing_player_id)
+
     return output
 
 
-# get necessary data for a shot attempt
-def get_shot_attempt_data(row, shot_type):
-    game_id = row['game_id']
-    play = row['plays']
-    player_id = row['player_1']
-
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              str(shot_type) + ' Shot',  # event
-              get_shot_value(play),  # event_value
-              get_shot_detail(play),  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+# get necessary data for shot attempts
+@timed
+def get_shot_attempt_data(df, shot_type):
+    output = get_event_rows(df, 0,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event=shot_type + ' Shot',
+                            event_value=get_shot_value(df['plays']),
+                            event_detail=get_shot_detail(df['plays']))
+
     return output
 
 
-# get necessary data for a made shot
-def get_shot_make_data(row, shot_type):
-    game_id = row['game_id']
-    play = row['plays']
-    player_id = row['player_1']
-
-    # flag end of possession
-    possession = 1
-    # FT end of possession if the final shot of a sequence
-    if shot_type == 'FT' and 'technical' not in row['plays']:
-        sequence = re.search(r'(\d) of \d', play).group(1)
-        ft_number = re.search(r'\d of (\d)', play).group(1)
-        possession = possession * (sequence == ft_number)
-
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              str(shot_type) + ' Make',  # event
-              get_shot_value(play),  # event_value
-              get_shot_detail(play),  # event_detail
-              possession  # possession
-              ]
-
-    log_performance()
+# get necessary data for made shots
+@timed
+def get_shot_make_data(df, shot_type):
+    output = get_event_rows(df, 1,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event=shot_type + ' Make',
+                            event_value=get_shot_value(df['plays']),
+                            event_detail=get_shot_detail(df['plays']),
+                            possession=get_shot_possession(df, shot_type))
+
     return output
 
 
-# get necessary data for a missed shot
-def get_shot_miss_data(row, shot_type):
-    game_id = row['game_id']
-    play = row['plays']
-    player_id = row['player_1']
-
-    # flag end of possession
-    possession = 1
-    # FT end of possession if the final shot of a sequence
-    if shot_type == 'FT' and 'technical' not in row['plays']:
-        sequence = re.search(r'(\d) of \d', play).group(1)
-        ft_number = re.search(r'\d of (\d)', play).group(1)
-        possession = possession * (sequence == ft_number)
-
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              str(shot_type) + ' Miss',  # event
-              get_shot_value(play),  # event_value
-              get_shot_detail(play),  # event_detail
-              possession  # possession
-              ]
-
-    log_performance()
+# get necessary data for missed shots
+@timed
+def get_shot_miss_data(df, shot_type):
+    output = get_event_rows(df, 1,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event=shot_type + ' Miss',
+                            event_value=get_shot_value(df['plays']),
+                            event_detail=get_shot_detail(df['plays']),
+                            possession=get_shot_possession(df, shot_type))
+
     return output
 
 
-# get which player assisted if there was a made shot
-def get_assist_data(row):
-    game_id = row['game_id']
-    shooter_id = row['player_1']
-    player_id = row['player_2']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              'Assist',  # event
-              1,  # event_value
-              shooter_id,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+# get which player assisted on made shots
+@timed
+def get_assist_data(df):
+    output = get_event_rows(df, 2,
+                            team_id=get_team_id(df),
+                            player_id=df['player_2'],
+                            event='Assist',
+                            event_value=1,
+                            event_detail=df['player_1'])
+
     return output
 
 
-# get which player blocked a shot
-def get_block_data(row):
-    game_id = row['game_id']
-    shooter_id = row['player_1']
-    player_id = row['player_2']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row, True),  # team_id
-              player_id,  # player_id
-              'Block',  # event
-              1,  # event_value
-              shooter_id,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+# get which player blocked shots
+@timed
+def get_block_data(df):
+    output = get_event_rows(df, 2,
+                            team_id=get_team_id(df, True),
+                            player_id=df['player_2'],
+                            event='Block',
+                            event_value=1,
+                            event_detail=df['player_1'])
+
     return output
 
 
 # combine all shot related information to produce detailed rows of data
-def get_shot_data(row):
-    play = row['plays']
-    output = []
-    # label FT or FG
-    if 'free throw' in play:
-        shot_type = 'FT'
-    else:
-        shot_type = 'FG'
+@timed
+def get_shot_data(df):
+    plays = df['plays']
 
-    # get row for shot attempt
-    shot = get_shot_attempt_data(row, shot_type)
-
-    # get row for shot miss
-    if ' misses' in play:
-        miss = get_shot_miss_data(row, shot_type)
-        output = [shot] + [miss]
+    # label FT or FG
+    shot_type = pd.Series(np.where(plays.str.contains('free throw', regex=False), 'FT', 'FG'), index=df.index)
 
-        # get row for block if shot blocked
-        if 'block by' in play:
-            block = get_block_data(row)
-            output = [shot] + [miss] + [block]
+    # split shots into misses (with or without block) and makes (with or without assist)
+    miss = plays.str.contains(' misses', regex=False)
+    make = ~miss & plays.str.contains(' makes', regex=False)
+    block = miss & plays.str.contains('block by', regex=False)
+    assist = make & plays.str.contains('assist by', regex=False)
 
-    # get row for shot make
-    elif ' makes' in play:
-        make = get_shot_make_data(row, shot_type)
-        output = [shot] + [make]
+    shots = df[miss | make]
+    misses = df[miss]
+    makes = df[make]
 
-        # get row for assist if applicable
-        if 'assist by' in play:
-            assist = get_assist_data(row)
-            output = [shot] + [make] + [assist]
+    output = pd.concat([get_shot_attempt_data(shots, shot_type[shots.index]),
+                        get_shot_miss_data(misses, shot_type[misses.index]),
+                        get_shot_make_data(makes, shot_type[makes.index]),
+                        get_block_data(df[block]),
+                        get_assist_data(df[assist])])
 
-    log_performance()
     return output
 
 
 # get who rebounded the ball, with whose shot they rebounded
-def get_rebound_data(row, last_row, second_last_row):
-    game_id = row['game_id']
-    play = row['plays']
-    last_play = last_row['plays']
-    player_id = row['player_1']
-
+@timed
+def get_rebound_data(df, last_rows, second_last_rows):
     # there is a bug with rare missing shot info, or sub occurs after FT miss so the shooter isn't picked up
-    if any(x in last_play for x in [' misses', 'block by']):
-        shooter = last_row['player_1']
-    elif any(x in second_last_row['plays'] for x in [' misses', 'block by']):
-        shooter = second_last_row['player_1']
-    else:
-        shooter = None
-
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              re.search(r'(.*) rebound', play).group(0),  # event
-              1,  # event_value
-              shooter,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
-    return output
+    last_missed = last_rows['plays'].str.contains(' misses|block by', na=False)
+    second_last_missed = second_last_rows['plays'].str.contains(' misses|block by', na=False)
+
+    conditions = [last_missed, second_last_missed]
+    shooters = [last_rows['player_1'], second_last_rows['player_1']]
+    shooter = pd.Series(np.select(conditions, shooters, default=None), index=df.index)
 
+    output = get_event_rows(df, 0,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event=df['plays'].str.extract(r'(.* rebound)', expand=False),
+                            event_value=1,
+                            event_detail=shooter)
 
-def get_turnover_data(row):
-    game_id = row['game_id']
-    play = row['plays']
-    player_id = row['player_1']
-    detail = if_none(re.search(r'\((.*);', play), re.search(r'\((.*)\)', play))
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              'Turnover',  # event
-              1,  # event_value
-              detail.group(1),  # event_detail
-              1  # possession
-              ]
-
-    log_performance()
     return output
 
 
-def get_steal_data(row):
-    game_id = row['game_id']
-    turnover_player_id = row['player_1']
-    player_id = row['player_2']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row, True),  # team_id
-              player_id,  # player_id
-              'Steal',  # event
-              1,  # event_value
-              turnover_player_id,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+@timed
+def get_turnover_data(df):
+    plays = df['plays']
+    detail = plays.str.extract(r'\((.*);', expand=False).fillna(plays.str.extract(r'\((.*)\)', expand=False))
+
+    output = get_event_rows(df, 0,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event='Turnover',
+                            event_value=1,
+                            event_detail=detail,
+                            possession=1)
+
     return output
 
 
-def get_foul_data(row):
-    game_id = row['game_id']
-    play = row['plays']
-    player_id = row['player_1']
-    fouled_player_id = row['player_2']
+@timed
+def get_steal_data(df):
+    output = get_event_rows(df, 1,
+                            team_id=get_team_id(df, True),
+                            player_id=df['player_2'],
+                            event='Steal',
+                            event_value=1,
+                            event_detail=df['player_1'])
+
+    return output
 
+
+@timed
+def get_foul_data(df):
     # find foul types which should 'reverse' the team_id
     reversed_fouls = ['Away from play foul',
                       'Clear path foul',
@@ -526,128 +449,117 @@ def get_foul_data(row):
                       'Shooting foul',
                       'Shooting block foul',
                       'Taunting technical foul']
-    event = re.search(r'(.*) foul', play).group(0)
-    reverse = any(x in event for x in reversed_fouls)
-
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row, reverse),  # team_id
-              player_id,  # player_id
-              event,  # event
-              1,  # event_value
-              fouled_player_id,  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+    event = df['plays'].str.extract(r'(.* foul)', expand=False)
+    reverse = event.str.contains('|'.join(re.escape(x) for x in reversed_fouls))
+    team_id = get_team_id(df).where(~reverse, get_team_id(df, True))
+
+    output = get_event_rows(df, 0,
+                            team_id=team_id,
+                            player_id=df['player_1'],
+                            event=event,
+                            event_value=1,
+                            event_detail=df['player_2'])
+
     return output
 
 
-def get_violation_data(row):
-    game_id = row['game_id']
-    play = row['plays']
-    player_id = row['player_1']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              'Violation',  # event
-              1,  # event_value
-              re.search(r'\((.*)\)', play).group(1),  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+@timed
+def get_violation_data(df):
+    output = get_event_rows(df, 0,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event='Violation',
+                            event_value=1,
+                            event_detail=df['plays'].str.extract(r'\((.*)\)', expand=False))
+
     return output
 
 
-def get_substitution_data(row):
-    game_id = row['game_id']
-    player_id = row['player_1']
-    sub_player_id = row['player_2']
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              player_id,  # player_id
-              'Substitution',  # event
-              1,  # event_value
-              sub_player_id,  # event_detail
-              0  # possession
-              ]
-
-    if sub_player_id is None:
-        output = []
-
-    log_performance()
+@timed
+def get_substitution_data(df):
+    # drop substitutions without a player subbed off
+    df = df[df['player_2'].notnull()]
+
+    output = get_event_rows(df, 0,
+                            team_id=get_team_id(df),
+                            player_id=df['player_1'],
+                            event='Substitution',
+                            event_value=1,
+                            event_detail=df['player_2'])
+
     return output
 
 
-def get_timeout_data(row):
-    game_id = row['game_id']
-    play = row['plays']
-    detail = re.search(r'(20 second|full|Official|no) timeout', play).group(1)
-    output = [None,  # play_id
-              game_id,  # game_id,
-              None,  # period
-              row['time'],  # time
-              None,  # score
-              get_team_id(row),  # team_id
-              None,  # player_id
-              'Timeout',  # event
-              1,  # event_value
-              detail.capitalize(),  # event_detail
-              0  # possession
-              ]
-
-    log_performance()
+@timed
+def get_timeout_data(df):
+    detail = df['plays'].str.extract(r'(20 second|full|Official|no) timeout', expand=False)
+
+    output = get_event_rows(df, 0,
+                            team_id=get_team_id(df),
+                            event='Timeout',
+                            event_value=1,
+                            event_detail=detail.str.capitalize())
+
     return output
 
 
-# iterate through plays to produce base event details
+# classify each raw play by the first event type found in its text
+@timed
+def get_event_types(series):
+    conditions = [series.str.contains('Start of ', regex=False, na=False),
+                  series.str.contains('End of ', regex=False, na=False),
+                  (series.str.contains('Jump ball', regex=False, na=False)
+                   & series.str.contains('possession', regex=False, na=False)),
+                  series.str.contains(' makes | misses ', na=False),
+                  series.str.contains(' rebound ', regex=False, na=False),
+                  series.str.contains('Turnover ', regex=False, na=False),
+                  series.str.contains(' foul ', regex=False, na=False),
+                  series.str.contains('Violation', regex=False, na=False),
+                  series.str.contains('enters the game', regex=False, na=False),
+                  series.str.contains('timeout', regex=False, na=False)]
+    event_types = ['start', 'end', 'jump_ball', 'shot', 'rebound', 'turnover', 'foul', 'violation',
+                   'substitution', 'timeout']
+
+    output = pd.Series(np.select(conditions, event_types, default=''), index=series.index)
+
+    return output
+
+
+# classify all plays at once to produce base event details, keeping the order of the raw plays
+@timed
 def clean_plays(cols, games_lineups, df):
-    output = []
-    for i in range(len(df)):
-        play = df.loc[i, 'plays']
-        row = df.loc[i]
-        if 'Start of ' in play:
-            output = output + [get_period_start(row)]
-        elif 'End of ' in play:
-            output = output + [get_period_end(row)]
-        elif all(x in play for x in ['Jump ball', 'possession']):
-            output = output + [get_jump_ball_data(games_lineups, row)]
-        elif any(x in play for x in [' makes ', ' misses ']):
-            output = output + get_shot_data(row)
-        elif ' rebound ' in play:
-            output = output + [get_rebound_data(row, df.loc[i-1], df.loc[i-2])]
-        elif 'Turnover ' in play:
-            output = output + [get_turnover_data(row)]
-            if 'steal by' in play:
-                output = output + [get_steal_data(row)]
-        elif ' foul ' in play:
-            output = output + [get_foul_data(row)]
-        elif 'Violation' in play:
-            output = output + [get_violation_data(row)]
-        elif 'enters the game' in play:
-            output = [i for i in output + [get_substitution_data(row)] if i]
-        elif 'timeout' in play:
-            output = output + [get_timeout_data(row)]
-
-    output = pd.DataFrame(output, columns=cols)
-
-    log_performance()
+    event_types = get_event_types(df['plays'])
+
+    # rebounds look back to the previous two raw plays for the shooter
+    rebounds = df[event_types == 'rebound']
+    last_rows = df[['plays', 'player_1']].shift(1).loc[rebounds.index]
+    second_last_rows = df[['plays', 'player_1']].shift(2).loc[rebounds.index]
+
+    turnovers = df[event_types == 'turnover']
+
+    output = pd.concat([get_period_start(df[event_types == 'start']),
+                        get_period_end(df[event_types == 'end']),
+                        get_jump_ball_data(games_lineups, df[event_types == 'jump_ball']),
+                        get_shot_data(df[event_types == 'shot']),
+                        get_rebound_data(rebounds, last_rows, second_last_rows),
+                        get_turnover_data(turnovers),
+                        get_steal_data(turnovers[turnovers['plays'].str.contains('steal by', regex=False)]),
+                        get_foul_data(df[event_types == 'foul']),
+                        get_violation_data(df[event_types == 'violation']),
+                        get_substitution_data(df[event_types == 'substitution']),
+                        get_timeout_data(df[event_types == 'timeout'])])
+
+    # put events back into raw play order, with each play's expanded rows in sequence
+    output = output.iloc[np.lexsort((output['order'].astype('int'), output['row'].astype('int')))]
+    output = output.drop(columns=['row', 'order'])
+    output = output.where(output.notnull(), None).infer_objects().reset_index(drop=True)
+    output.columns = cols
+
     return output
 
 
 # any additional tidying goes here
+@timed
 def period_start_end_teams(df):
     # get list of teams
     teams = [i for i in set(df['team_id']) if i is not None]
@@ -670,78 +582,88 @@ def period_start_end_teams(df):
             team_id = df.loc[i-1, 'team_id']
         df.loc[i, 'team_id'] = team_id
 
-    log_performance()
     return df
 
 
+def move_position(order, position, i, j):
+    """ move the row at position i to position j of order, updating position for each row in between """
+    row = order.pop(i)
+    order.insert(j, row)
+
+    for k in range(min(i, j), max(i, j) + 1):
+        position[order[k]] = k
+
+
+def is_involved(player_id, row_player_id, row_event_detail):
+    """ check if a player is the player_id or event_detail of a row, where no player is never involved """
+    output = player_id is not None and (row_player_id == player_id or row_event_detail == player_id)
+
+    return output
+
+
+@timed
 def fix_jump_ball_order(df):
     """ if jump ball comes before period start, swap the rows """
-    for i in df.index[df['event'] == 'Jump Ball']:
-        if df.loc[i+1, 'event'] == 'Period Start':
-            df, index = swap_rows(df, i, i+1, 'forward')
+    event = df['event'].to_numpy()
+    swap = np.flatnonzero((event[:-1] == 'Jump Ball') & (event[1:] == 'Period Start'))
 
-    return df
+    order = np.arange(len(df))
+    order[swap], order[swap + 1] = swap + 1, swap
+
+    output = df.iloc[order].set_axis(df.index, axis=0)
+
+    return output
 
 
+@timed
 def fix_substitution_order(df):
     """ if player subs on at the same time as performing an action, put the sub before the play """
-    # get all sub events and loop through
-    sub_events = df.loc[df['event'] == 'Substitution']
+    period = df['period'].to_numpy()
+    time = df['time'].to_numpy()
+    player_id = df['player_id'].to_numpy()
+    event_detail = df['event_detail'].to_numpy()
+    is_sub = (df['event'] == 'Substitution').to_numpy()
+    is_foul = df['event'].str.contains('foul').to_numpy(dtype='bool')
+
+    # subs only move among rows at the same period and time, so only those rows need checking for each sub
+    blocks = df.groupby(['period', 'time'], sort=False).indices
+
+    # row at each position and position of each row, as subs are moved around, with the frame reordered once at the end
+    order = list(range(len(df)))
+    position = list(range(len(df)))
+
+    for row in np.flatnonzero(is_sub):
+        block = blocks[(period[row], time[row])]
 
-    for row in sub_events.iterrows():
         # find current position of sub event
-        i = df.index[(df['period'] == row[1]['period']) &
-                     (df['time'] == row[1]['time']) &
-                     (df['player_id'] == row[1]['player_id']) &
-                     (df['event'] == 'Substitution')][0]
+        i = min(position[k] for k in block if is_sub[k] and player_id[k] == player_id[row])
 
         # get relevant event details
-        event_period = df.loc[i, 'period']
-        event_time = df.loc[i, 'time']
-        subbed_in = df.loc[i, 'player_id']
-        subbed_out = df.loc[i, 'event_detail']
-
-        # fix for events after player subs out
-        events_out = df[(df['period'] == event_period) & (df['time'] == event_time) & (df.index > i)]
-
-        # get all events involving the player after subbing out
-        fix_table = events_out[((events_out['player_id'] == subbed_out) |
-                                (events_out['event_detail'] == subbed_out)) &
-                               ~events_out['event'].str.contains('foul')]
-
-        # use latest play to fix if fixing forwards
-        if not fix_table.empty:
-            # if another event involves the player subbing back in, skip it
-            fix_index = fix_table.index[(fix_table['player_id'] == subbed_out) &
-                                        (fix_table['event'] == 'Substitution')]
-
-            # set sub to after the latest event
-            if fix_index.empty:
-                df, i = swap_rows(df, i, fix_table.index[len(fix_table)-1], 'forward')
-            else:
-                pass
-
-        # fix for events before player subbing in
-        events_in = df[(df['period'] == event_period) & (df['time'] == event_time) & (df.index < i)]
-
-        # get all events involving the player before subbing in
-        fix_table = events_in[((events_in['player_id'] == subbed_in) |
-                               (events_in['event_detail'] == subbed_in)) &
-                              ~events_in['event'].str.contains('foul')]
-
-        # use earliest play to fix if fixing backwards
-        if not fix_table.empty:
-            # if player was just subbed out, then set to play after
-            fix_index = fix_table.index[(fix_table['event_detail'] == subbed_in) &
-                                        (fix_table['event'] == 'Substitution')] + 1
-
-            if fix_index.empty:
-                # set sub to before the earliest event
-                df, i = swap_rows(df, i, fix_table.index[0], 'back')
-            else:
-                pass
+        subbed_in = player_id[order[i]]
+        subbed_out = event_detail[order[i]]
 
-    return df
+        # fix for events involving the player after subbing out
+        fix_rows = [k for k in block
+                    if position[k] > i and not is_foul[k] and is_involved(subbed_out, player_id[k], event_detail[k])]
+
+        # if another event involves the player subbing back in, skip it, otherwise set sub to after the latest event
+        if fix_rows and not any(is_sub[k] and player_id[k] == subbed_out for k in fix_rows):
+            j = max(position[k] for k in fix_rows)
+            move_position(order, position, i, j)
+            i = j
+
+        # fix for events involving the player before subbing in
+        fix_rows = [k for k in block
+                    if position[k] < i and not is_foul[k] and is_involved(subbed_in, player_id[k], event_detail[k])]
+
+        # if player was just subbed out, then skip it, otherwise set sub to before the earliest event
+        if fix_rows and not any(is_sub[k] and event_detail[k] == subbed_in for k in fix_rows):
+            j = min(position[k] for k in fix_rows)
+            move_position(order, position, i, j)
+
+    output = df.iloc[order].set_axis(df.index, axis=0)
+
+    return output
 
 
 def fix_incorrect_team(df, lineups):
@@ -769,17 +691,17 @@ def manual_period_fix(df, game_id):
     if game_id == '201311270DAL':
         # this game was missing a sub in the 4th
         index = df.index[(df['time'] == '5:49') & (df['event'] == 'Timeout')]
-        row_to_add = [None, game_id, None, '5:49', None, 'DAL', 'blairde01', 'Substitution', 1, 'dalemsa01', 0]
+        row_to_add = [None, game_id, None, '5:49', None, None, 'DAL', 'blairde01', 'Substitution', 1, 'dalemsa01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '201401010MIN':
         # this game was missing a sub in 4th
         index = df.index[(df['time'] == '7:34') & (df['player_id'] == 'rubiori01') & (df['event'] == 'Substitution')]
-        row_to_add = [None, game_id, None, '7:34', None, 'MIN', 'martike02', 'Substitution', 1, 'shvedal01', 0]
+        row_to_add = [None, game_id, None, '7:34', None, None, 'MIN', 'martike02', 'Substitution', 1, 'shvedal01', 0]
         df = insert_row(df, index[0]+1, row_to_add)
     elif game_id == '201503150LAL':
         # this game was missing a sub in 4th
         index = df.index[(df['time'] == '6:41') & (df['event'] == 'Defensive rebound')]
-        row_to_add = [None, game_id, None, '6:41', None, 'ATL', 'jenkijo01', 'Substitution', 1, 'bazemke01', 0]
+        row_to_add = [None, game_id, None, '6:41', None, None, 'ATL', 'jenkijo01', 'Substitution', 1, 'bazemke01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '201503160GSW':
         # this game was missing period start/end signifiers
@@ -789,39 +711,39 @@ def manual_period_fix(df, game_id):
     elif game_id == '201505050GSW':
         # this game was missing a sub in the 4th
         index = df.index[(df['time'] == '1:03') & (df['event'] == 'Timeout')]
-        row_to_add = [None, game_id, None, '1:03', None, 'MEM', 'greenje02', 'Substitution', 1, 'conlemi01', 0]
+        row_to_add = [None, game_id, None, '1:03', None, None, 'MEM', 'greenje02', 'Substitution', 1, 'conlemi01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '201601030NYK':
         # this game was missing many subs in 2nd - will add them in reverse order
         # Horford for Taveres at 2:07
         index = df.index[(df['time'] == '2:07') & (df['event'] == 'FT Make') & (df['event_detail'] == '1')]
-        row_to_add = [None, game_id, None, '2:07', None, 'ATL', 'horfoal01', 'Substitution', 1, 'tavarwa01', 0]
+        row_to_add = [None, game_id, None, '2:07', None, None, 'ATL', 'horfoal01', 'Substitution', 1, 'tavarwa01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
         # Porzingis for Williams at 3:07
         index = df.index[(df['time'] == '3:07') & (df['event'] == 'Shooting foul')]
-        row_to_add = [None, game_id, None, '3:07', None, 'NYK', 'porzikr01', 'Substitution', 1, 'willide02', 0]
+        row_to_add = [None, game_id, None, '3:07', None, None, 'NYK', 'porzikr01', 'Substitution', 1, 'willide02', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
         # multiple subs at 5:36 and one at 5:28 (consecutive subs)
         index = df.index[(df['time'] == '5:36') & (df['event'] == 'Timeout')]
-        row_to_add = [None, game_id, None, '5:28', None, 'NYK', 'lopezro01', 'Substitution', 1, 'porzikr01', 0]
+        row_to_add = [None, game_id, None, '5:28', None, None, 'NYK', 'lopezro01', 'Substitution', 1, 'porzikr01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
-        row_to_add = [None, game_id, None, '5:36', None, 'ATL', 'tavarwa01', 'Substitution', 1, 'horfoal01', 0]
+        row_to_add = [None, game_id, None, '5:36', None, None, 'ATL', 'tavarwa01', 'Substitution', 1, 'horfoal01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
-        row_to_add = [None, game_id, None, '5:36', None, 'NYK', 'caldejo01', 'Substitution', 1, 'grantje02', 0]
+        row_to_add = [None, game_id, None, '5:36', None, None, 'NYK', 'caldejo01', 'Substitution', 1, 'grantje02', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
-        row_to_add = [None, game_id, None, '5:36', None, 'ATL', 'bazemke01', 'Substitution', 1, 'pattela01', 0]
+        row_to_add = [None, game_id, None, '5:36', None, None, 'ATL', 'bazemke01', 'Substitution', 1, 'pattela01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
-        row_to_add = [None, game_id, None, '5:36', None, 'ATL', 'sefolth01', 'Substitution', 1, 'korveky01', 0]
+        row_to_add = [None, game_id, None, '5:36', None, None, 'ATL', 'sefolth01', 'Substitution', 1, 'korveky01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
         # Millsap for Scott at 7:10
         index = df.index[(df['time'] == '7:10') & (df['event'] == 'Substitution')]
-        row_to_add = [None, game_id, None, '7:10', None, 'ATL', 'millspa01', 'Substitution', 1, 'scottmi01', 0]
+        row_to_add = [None, game_id, None, '7:10', None, None, 'ATL', 'millspa01', 'Substitution', 1, 'scottmi01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
         # two subs at 8:05
         index = df.index[(df['time'] == '8:05') & (df['event'] == 'Timeout')]
-        row_to_add = [None, game_id, None, '8:05', None, 'NYK', 'afflaar01', 'Substitution', 1, 'thomala01', 0]
+        row_to_add = [None, game_id, None, '8:05', None, None, 'NYK', 'afflaar01', 'Substitution', 1, 'thomala01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
-        row_to_add = [None, game_id, None, '8:05', None, 'ATL', 'teaguje01', 'Substitution', 1, 'macksh01', 0]
+        row_to_add = [None, game_id, None, '8:05', None, None, 'ATL', 'teaguje01', 'Substitution', 1, 'macksh01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '201610300HOU':
         # subs in wrong order after period end, so moved them around
@@ -850,12 +772,12 @@ def manual_period_fix(df, game_id):
     elif game_id == '201801280HOU':
         # this game was missing a sub in 2nd
         index = df.index[(df['time'] == '12:00') & (df['event'] == 'FT Make')]
-        row_to_add = [None, game_id, None, '11:59', None, 'PHO', 'jacksjo02', 'Substitution', 1, 'bookede01', 0]
+        row_to_add = [None, game_id, None, '11:59', None, None, 'PHO', 'jacksjo02', 'Substitution', 1, 'bookede01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '201802090DET':
         # this game was missing a sub in 3rd
         index = df.index[(df['time'] == '12:00') & (df['event'] == 'FT Make')]
-        row_to_add = [None, game_id, None, '11:59', None, 'DET', 'griffbl01', 'Substitution', 1, 'tollian01', 0]
+        row_to_add = [None, game_id, None, '11:59', None, None, 'DET', 'griffbl01', 'Substitution', 1, 'tollian01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '201803150DEN':
         # this game had a false sub in the 4th
@@ -864,67 +786,93 @@ def manual_period_fix(df, game_id):
     elif game_id == '201901280LAC':
         # this game was missing a sub in 3rd
         index = df.index[(df['time'] == '12:00') & (df['event'] == 'FT Make')]
-        row_to_add = [None, game_id, None, '12:00', None, 'LAC', 'gilgesh01', 'Substitution', 1, 'willilo02', 0]
+        row_to_add = [None, game_id, None, '12:00', None, None, 'LAC', 'gilgesh01', 'Substitution', 1, 'willilo02', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
     elif game_id == '202001040LAC':
         # this game was missing a sub in 3rd
         index = df.index[(df['time'] == '12:00') & (df['event'] == 'FT Make')]
-        row_to_add = [None, game_id, None, '12:00', None, 'MEM', 'brookdi01', 'Substitution', 1, 'meltode01', 0]
+        row_to_add = [None, game_id, None, '12:00', None, None, 'MEM', 'brookdi01', 'Substitution', 1, 'meltode01', 0]
         df = insert_row(df, index[0] + 1, row_to_add)
 
     return df
 
 
-def write_game_plays(ns, queue):
-    game_ids = ns.game_ids
-    plays_raw = ns.plays_raw
-    games = ns.games
-    games_lineups = ns.games_lineups
-    columns = ns.columns
-    while not queue.empty():
-        game_start = time.process_time()
+# apply the full cleaning chain to one game's tidied raw plays
+def clean_game_plays(columns, game_id, game_lineups, game_plays_raw):
+    # base tidying up of events, details, period start and time
+    output = clean_plays(columns, game_lineups, game_plays_raw).reset_index(drop=True)
 
-        iteration = queue.get()
+    # check that Start of period comes before Jump ball
+    output = fix_jump_ball_order(output)
 
-        # grab raw plays data for the given game_id from plays_raw table
-        game_plays_raw = get_raw_plays(plays_raw, games, game_ids[iteration])
+    # set up manual fixes for games with bugs
+    output = manual_period_fix(output, game_id)
 
-        # base tidying up of events, details, period start and time
-        game_plays = clean_plays(columns, games_lineups, game_plays_raw).reset_index(drop=True)
+    # fill down period from start of period row
+    output['period'] = output['period'].fillna(method='ffill').fillna('1st')
 
-        # check that Start of period comes before Jump ball
-        game_plays = fix_jump_ball_order(game_plays)
+    # tidying up team_id for period start and end
+    output = period_start_end_teams(output)
 
-        # set up manual fixes for games with bugs
-        game_plays = manual_period_fix(game_plays, game_ids[iteration])
+    # tidy substitution order
+    output = fix_substitution_order(output)
 
-        # fill down period from start of period row
-        game_plays['period'] = game_plays['period'].fillna(method='ffill').fillna('1st')
+    # check incorrect team situations
+    output = fix_incorrect_team(output, game_lineups)
 
-        # tidying up team_id for period start and end
-        game_plays = period_start_end_teams(game_plays)
+    # generate columns of home and away scores
+    output[['home_score', 'away_score']] = get_score(output)
 
-        # tidy substitution order
-        game_plays = fix_substitution_order(game_plays)
+    # get play_id
+    output['play_id'] = get_play_id(output)
 
-        # check incorrect team situations
-        game_plays = fix_incorrect_team(game_plays, games_lineups)
+    return output
 
-        # generate column of scores
-        game_plays['score'] = get_score(game_plays)
 
-        # get play_id
-        game_plays['play_id'] = get_play_id(game_plays)
+def write_game_plays(ns, queue, performance_queue, failed_games):
+    game_ids = ns.game_ids
+    columns = ns.columns
+    season = ns.season
 
-        cleaning_time = time.process_time() - game_start
+    # attach to the season data shared by the parent process
+    plays_raw = SharedFrame(ns.plays_raw)
+    games = SharedFrame(ns.games)
+    games_lineups = SharedFrame(ns.games_lineups)
 
-        # write to DB and get status
-        status = write_data(df=game_plays,
-                            name='plays',
-                            sql_engine=engine,
+    # batch games for this process into larger writes, on the process' own pooled engine
+    writer = BufferedWriter(name='plays',
+                            sql_engine=get_engine(database),
                             db_schema='nba',
-                            if_exists='append',
-                            index=False)
+                            failed_games=failed_games)
+
+    while not queue.empty():
+        game_start = time.process_time()
+
+        iteration = queue.get()
+
+        # tag performance metrics with the game being cleaned
+        set_performance_tags(season=season, game_id=game_ids[iteration])
+
+        # grab raw plays data for the given game_id from plays_raw table
+        game_plays_raw = get_raw_plays(plays_raw, games, game_ids[iteration])
+
+        # get lineups for the game to assist with assigning players to teams
+        game_lineups = games_lineups.get_partition(game_ids[iteration])
+
+        # clean the plays, fixing known errors in the play by play, and skip games that can't be fixed so the
+        # watermark stops before them
+        try:
+            game_plays = clean_game_plays(columns, game_ids[iteration], game_lineups, game_plays_raw)
+        except Exception as e:
+            failed_games.append(game_ids[iteration])
+            sys.stdout.write('\n')
+            print(Colour.red + f'Could not clean {game_ids[iteration]}: {e!r}' + Colour.end)
+            continue
+
+        cleaning_time = time.process_time() - game_start
+
+        # add to the batch of rows to be written, and get status of the latest write
+        status = writer.write(game_plays)
 
         time_taken = 'Cleaned in ' + "{:.2f}".format(cleaning_time) + ' seconds, '\
                      'Total ' + time_lapsed()
@@ -936,26 +884,43 @@ def write_game_plays(ns, queue):
                  lapsed=time_taken,
                  sql_status=status['sql'])
 
-        write_performance()
+        # ship the game's metrics to the parent process
+        send_performance(performance_queue)
+
+    plays_raw.close()
+    games.close()
+    games_lineups.close()
+
+    writer.close()
 
 
 def write_season_plays(queue):
     # set up processes
-    processes = [Process(target=write_game_plays, name=f'Process-{i}', args=(name_space, queue,)) for i in range(8)]
+    processes = [Process(target=write_game_plays,
+                         name=f'Process-{i}',
+                         args=(name_space, queue, performance_collector.queue, failed_games,)) for i in range(8)]
     [proc.start() for proc in processes]
     [proc.join() for proc in processes]
 
     sys.stdout.write('\n')
 
+    # stop before the watermark moves if a process failed in a way its games couldn't be recorded
+    check_processes(processes)
 
-def get_season_game_ids(season):
-    games = name_space.games
 
+@timed
+def get_season_game_ids(season):
     # set games to be cleaned
     game_ids = games.loc[games['season'] == season, 'game_id'].reset_index(drop=True)
 
+    if INCREMENTAL:
+        # only clean new games, clearing any rows an unfinished run left for them
+        game_ids = game_ids[game_ids.isin(new_games['game_id'])].reset_index(drop=True)
+
+        selectable = get_delete_query(metadata, engine, 'plays', 'game_id', game_ids)
+        connection.execute(selectable)
     # if skipping already cleaned games, then check and exclude games already in plays table
-    if SKIP_SCRAPED_GAMES:
+    elif SKIP_SCRAPED_GAMES:
         # get selectable object sql query to get already scraped plays
         selectable = get_column_query(metadata, engine, 'plays', 'game_id')
         skip_games = pd.read_sql(sql=selectable, con=connection)['game_id']
@@ -967,17 +932,15 @@ def get_season_game_ids(season):
         selectable = get_delete_query(metadata, engine, 'plays', 'game_id', game_ids)
         connection.execute(selectable)
 
-    log_performance()
     return game_ids
 
 
+@timed
 def get_plays_raw_query(series):
-    metadata_raw.reflect(bind=engine_raw)
-    table = metadata_raw.tables['plays_raw']
+    table = get_table(metadata_raw, engine_raw, 'plays_raw')
 
     output = table.select().where(table.c.game_id.in_(series))
 
-    log_performance()
     return output
 
 
@@ -985,17 +948,22 @@ def write_all_plays(series):
     # iterate through seasons
     for season in series:
         # share game_ids for the season across processes
+        name_space.season = season
         name_space.game_ids = get_season_game_ids(season)
 
         # load lineups to assist with assigning players to teams
         games_lineups_query = get_table_query(metadata, engine, 'games_lineups', 'game_id', name_space.game_ids)
-        name_space.games_lineups = pd.read_sql(sql=games_lineups_query, con=engine)
+        games_lineups = pd.read_sql(sql=games_lineups_query, con=engine)
+        name_space.games_lineups, games_lineups_blocks = share_frame(games_lineups, partition='game_id')
 
         # get selectable object sql query to get raw plays for the season
         selectable = get_plays_raw_query(name_space.game_ids)
 
-        # share seasons raw plays across processes
-        name_space.plays_raw = pd.read_sql(sql=selectable, con=engine_raw)
+        # share seasons raw plays across processes through shared memory, rather than pickling through the manager,
+        # grouped by game so each worker can slice a game out directly
+        plays_raw = pd.read_sql(sql=selectable, con=engine_raw)
+        name_space.plays_raw, plays_raw_blocks = share_frame(plays_raw, partition='game_id')
+        del plays_raw
 
         # create game_id queue
         q = manager.Queue()
@@ -1004,6 +972,12 @@ def write_all_plays(series):
         if not q.empty():
             write_season_plays(q)
 
+        release_frame(games_lineups_blocks + plays_raw_blocks)
+
+        # write this process' own metrics for the season
+        set_performance_tags(season=season)
+        write_performance()
+
         print(f'Completed season {season}')
 
 
@@ -1011,24 +985,46 @@ if __name__ == '__main__':
     engine, metadata, connection = get_connection(database)
     engine_raw, metadata_raw, connection_raw = get_connection(database_raw)
     create_table_plays(engine, metadata)
+    create_table_watermarks(engine, metadata)
 
     # create manager for sharing data across processes
     manager = Manager()
     name_space = manager.Namespace()
 
     # generate base columns
-    name_space.columns = ['play_id', 'game_id', 'period', 'time', 'score', 'team_id', 'player_id',
-                          'event', 'event_value', 'event_detail', 'possession']
+    name_space.columns = ['play_id', 'game_id', 'period', 'time', 'home_score', 'away_score', 'team_id',
+                          'player_id', 'event', 'event_value', 'event_detail', 'possession']
 
     # load games table to access game_ids
-    name_space.games = load_data(df='games',
-                                 sql_engine=engine,
-                                 meta=metadata)
+    games = load_data(df='games',
+                      sql_engine=engine,
+                      meta=metadata)
+    name_space.games, games_blocks = share_frame(games, partition='game_id')
 
     # get seasons from games table to iterate
     seasons = pd.Series(range(start_season_games, end_season_games+1))
 
+    # games after the last one cleaned at the previous run, and only their seasons when loading incrementally
+    new_games = get_new_games(engine, metadata, 'plays')
+
+    if INCREMENTAL:
+        seasons = seasons[seasons.isin(new_games['season'])].reset_index(drop=True)
+
+    # merge performance metrics sent by the worker processes
+    performance_collector = PerformanceCollector()
+
+    # games the workers couldn't clean, which the watermark mustn't move past
+    failed_games = manager.list()
+
     write_all_plays(seasons)
 
+    if INCREMENTAL:
+        update_watermark(engine, metadata, 'plays', new_games, failed_games)
+
+    performance_collector.close()
+    release_frame(games_blocks)
+
     print(Colour.green + 'Plays Data Cleaned ' + str('{0:.2f}'.format(time.time() - start_time))
           + ' seconds taken' + Colour.end)
+
+    report_performance()
@@ -11,18 +11,6 @@ def get_box_key(team_id, period):
     return output
 
 
-def get_box_score(game_id, team_id, period):
-    """ get box score for period """
-    # create box key then get table from url
-    box_key = get_box_key(team_id, period)
-    url = f'https://www.basketball-reference.com/boxscores/{game_id}.html'
-    page = r.get(url)
-    content = BeautifulSoup(page.content, 'lxml')
-    output = content.find('table', {'id': box_key}).findChild('tbody')
-
-    return output
-
-
 def get_period_players(html):
     """ get all players who did not get substituted in period """
     output = [i.find('th').get('data-append-csv') for i in html.findAll('tr')
@@ -45,243 +33,283 @@ def get_seconds(i):
     return output
 
 
-def get_period_minutes(html, period):
-    """ get all players who did not get substituted in period """
+def get_period_minutes(html):
+    """ get seconds played by each player in a period's box score """
     refs = [i.find('th').find('a').get('href') for i in html.findAll('tr') if i.find('th').text != 'Reserves']
     players = [re.search(r'([a-z]+\d+).html', i).group(1) for i in refs]
     minutes_raw = [i.find('td', {'data-stat': 'mp'}) for i in html.findAll('tr') if i.find('th').text != 'Reserves']
-    minutes = [{period: get_seconds(i.text)} if i else {period: 0} for i in minutes_raw]
+    minutes = [get_seconds(i.text) if i else 0 for i in minutes_raw]
     output = dict(zip(players, minutes))
 
     return output
 
 
-def get_player_minutes(game_id, team_id, periods):
-    """ get number of minutes each player played """
-    player_minutes_list = []
+def get_periods(html):
+    """ get list of periods in game """
+    output = [i.text for i in html.find('div', {'class': 'filter switcher'}).findChildren('div')]
 
-    # get box score for each period
-    for box_period in periods:
-        box_score = get_box_score(game_id, team_id, box_period)
-        player_minutes_list.append(get_period_minutes(box_score, box_period))
+    return output
 
-    output = {}
 
-    # loop through player names and get each period minutes for that player
-    for k in player_minutes_list[0].keys():
-        output[k] = tuple(output[k] for output in player_minutes_list)
+class BoxScore:
+    """ minutes played by each player in every period of a game, from a single parse of the box score page """
+    def __init__(self, page):
+        content = BeautifulSoup(page, 'lxml')
 
-    return output
+        self.periods = get_periods(content)
 
+        # every team and period table is on the same page, so read them all at once by their box key
+        self.minutes = {table.get('id'): get_period_minutes(table.findChild('tbody'))
+                        for table in content.findAll('table', {'id': re.compile(r'^box-[A-Z]+-[a-z0-9]+-basic$')})}
 
-def get_periods(html):
-    """ get list of periods in game """
-    output = [i.text for i in html.find('div', {'class': 'filter switcher'}).findChildren('div')]
+    def get_minutes(self, team_id, period):
+        """ get seconds played by each player of a team in a period, or in the whole 'Game' """
+        output = self.minutes[get_box_key(team_id, period)]
 
-    return output
+        return output
 
 
-def get_page(game_id):
-    """ get response from url """
+@lru_cache(maxsize=32)
+def get_box_score(game_id):
+    """ get parsed box score for a game, kept for the life of the process so both teams and all periods share it """
     url = f'https://www.basketball-reference.com/boxscores/{game_id}.html'
-    output = r.get(url)
+    page = fetcher.get(url)
+    output = BoxScore(page)
 
     return output
 
 
-def get_missing_players(players, game_id, team_id, period):
-    """ find players in period and compare to original to find missing player """
-    # get page content
-    page = get_page(game_id)
-    content = BeautifulSoup(page.content, 'lxml')
+class Roster:
+    """ bit for each player of a team in a period, so that a lineup is an int with the bits of its players set """
+    __slots__ = ['bits', 'lineups']
 
-    # get periods
-    periods = get_periods(content)
-    game_periods = [i for i, x in enumerate(periods) if x not in ['Game', 'H1', 'H2', period_name[period]]]
+    def __init__(self):
+        self.bits = {}
+        self.lineups = {}
+
+    def get_bit(self, player_id):
+        """ get a player's bit, adding the player if new, where no player has no bit """
+        if not player_id:
+            return 0
+
+        output = self.bits.get(player_id)
+
+        if output is None:
+            output = self.bits[player_id] = 1 << len(self.bits)
+
+        return output
+
+    def get_lineup(self, player_ids):
+        output = 0
+
+        for player_id in player_ids:
+            output |= self.get_bit(player_id)
+
+        return output
+
+    def get_players(self, lineup):
+        """ get the player_ids in a lineup, in player_id order """
+        output = self.lineups.get(lineup)
 
-    player_minutes = get_player_minutes(game_id, team_id, periods)
+        if output is None:
+            output = self.lineups[lineup] = tuple(sorted(i for i, bit in self.bits.items() if lineup & bit))
 
-    period_players = []
+        return output
+
+
+def count_players(lineup):
+    output = bin(lineup).count('1')
+
+    return output
+
+
+def get_missing_players(period_players, game_id, team_id, period):
+    """ find players in period and compare to those found in plays to find missing player """
+    box_score = get_box_score(game_id)
+
+    # get periods
+    game_periods = [i for i in box_score.periods if i not in ['Game', 'H1', 'H2', period_name[period]]]
+
+    box_players = []
 
     # get total game played in other periods, then compare difference to find missing players
-    for i in player_minutes.keys():
-        box_played = sum([player_minutes[i][j][periods[j]] for j in game_periods])
-        total_played = player_minutes[i][0]['Game']
+    for i, total_played in box_score.get_minutes(team_id, 'Game').items():
+        box_played = sum([box_score.get_minutes(team_id, j)[i] for j in game_periods])
 
         if box_played + 60 <= total_played:
-            period_players.append(i)
-
-    # find all unique players for period
-    all_players = list(set([inner for outer in players for inner in outer]))
+            box_players.append(i)
 
     # find players that played in current period that weren't originally in list
-    output = list(set(period_players) - set(all_players))
+    output = list(set(box_players) - set(period_players))
 
     return output
 
 
-def play_players_check(players, game_id, team_id, period):
+def play_players_check(players, roster, game_id, team_id, period):
     """ check that there are exactly 5 players on the court, and fix if there are not """
     # check number of players for each play in period
-    number_list = [e for e in set([len(i) for i in players]) if e != 5]
+    number_list = [e for e in set([count_players(i) for i in players]) if e != 5]
 
     if number_list:
         # fixes here
         # if too few players, likely because a player did nothing in a period, so get from box score
         if min(number_list) < 5:
-            missing_players = get_missing_players(players, game_id, team_id, period)
-            players = [i + missing_players for i in players]
-            number_list = [e for e in set([len(i) for i in players])]
+            all_players = 0
+            for i in players:
+                all_players |= i
+
+            missing_players = roster.get_lineup(get_missing_players(roster.get_players(all_players),
+                                                                    game_id, team_id, period))
+            players = [i | missing_players for i in players]
+            number_list = [e for e in set([count_players(i) for i in players])]
 
         # double check
         if min(number_list) < 5:
-            sys.stdout.write('\n')
-            print(Colour.red + f'Too few players for {team_id} in {period} of {game_id}' + Colour.end)
-            exit()
+            raise ValueError(f'Too few players for {team_id} in {period} of {game_id}')
 
         if max(number_list) > 5:
-            sys.stdout.write('\n')
-            print(Colour.red + f'Too many players for {team_id} in {period} of {game_id}' + Colour.end)
-            exit()
+            raise ValueError(f'Too many players for {team_id} in {period} of {game_id}')
 
     return players
 
 
-def fill_players_down(players, events, subbed_in, subbed_out):
-    """ if players missing, fill down based on players in previous play """
-    players.reverse()
-    events = events.iloc[::-1].reset_index(drop=True)
-    subbed_out = subbed_out.iloc[::-1].reset_index(drop=True)
-    subbed_in = subbed_in.iloc[::-1].reset_index(drop=True)
+def fill_players_down(players, roster, events, subbed_in, subbed_out):
+    """ if players missing, fill down based on players in previous play
+
+    lineups and players are bits from the roster, with 0 for no player, so a lineup with a player removed is
+    lineup & ~player, with a player added is lineup | player, and a check that a player is on is lineup & player
+    """
+    players = players[::-1]
+    events = events[::-1]
+    subbed_in = [roster.get_bit(i) for i in subbed_in[::-1]]
+    subbed_out = [roster.get_bit(j) if i == 'Substitution' else 0 for i, j in zip(events, subbed_out[::-1])]
 
-    incorrect_player = None
-    remove_player = None
-    true_on = None
-    true_off = None
-    false_on = None
-    false_off = None
+    incorrect_player = 0
+    remove_player = 0
+    true_on = 0
+    true_off = 0
+    false_on = 0
+    false_off = 0
 
     # if period starts with 6 players, then there were likely false subs involved
-    if len(players[0]) > 5:
+    if count_players(players[0]) > 5:
         # find all players who did not do anything
-        events_players = [i for i in subbed_in[events != 'Substitution'] if i]
-        all_event_players = list(set(events_players))
+        all_event_players = 0
+        for event, player in zip(events, subbed_in):
+            if event != 'Substitution':
+                all_event_players |= player
 
         # find all unique players for period
-        all_players = list(set([inner for outer in players for inner in outer]))
+        all_players = 0
+        for i in players:
+            all_players |= i
 
-        try:
-            incorrect_player = list(set(all_players) - set(all_event_players))[0]
-            players[0].remove(incorrect_player)
-        except (IndexError, ValueError):
-            pass
+        # take the first of the players who did nothing, in player_id order
+        no_event_players = roster.get_players(all_players & ~all_event_players)
+
+        if no_event_players:
+            incorrect_player = roster.get_bit(no_event_players[0])
+            players[0] &= ~incorrect_player
 
     # find players in current play that weren't in previous play
     for i in range(1, len(players)):
         # remove player tagged as the false '6th man'
-        if incorrect_player in players[i]:
-            players[i].remove(incorrect_player)
+        lineup = players[i] & ~incorrect_player
 
-        if events.loc[i] == 'Substitution':
+        if events[i] == 'Substitution':
             # if there's a substitution find who was substituted
-            player_off = [subbed_out.loc[i]]
-            player_on = [subbed_in.loc[i]]
+            player_off = subbed_out[i]
+            player_on = subbed_in[i]
 
             # in case of incorrect sub over multiple plays, remove true subbed in player
-            if true_on in players[i]:
-                players[i].remove(true_on)
+            lineup &= ~true_on
 
             # if player designated as false sub is brought on properly, clear designation
-            if player_on[0] == incorrect_player != false_off:
-                players[i] = players[i] + [incorrect_player]
-                incorrect_player = None
+            if player_on == incorrect_player != false_off:
+                lineup |= incorrect_player
+                incorrect_player = 0
 
             # if subbed out player still in, designate to remove
-            if player_off[0] in players[i]:
-                remove_player = player_off[0]
+            if lineup & player_off:
+                remove_player = player_off
 
             # THIS SECTION COVERS SUBS WHERE AN ALREADY OFF-COURT PLAYER WAS SUBBED OFF
             # if incorrect player was subbed off in play by play, this fixes it in the make-up sub
-            if player_on[0] == false_off:
-                # replace falsely taken off player with actually substituted player
-                players[i] = [player.replace(false_off, true_on) for player in players[i]]
-
-                # check if fixed, and append player if needed
-                if true_on not in players[i]:
-                    players[i].append(true_on)
+            if player_on == false_off:
+                # replace falsely taken off player with actually substituted player, adding them if needed
+                lineup = lineup & ~false_off | true_on
 
                 #  if the incorrect sub is explained by this bug, clear the removed player
                 if false_off == remove_player:
-                    remove_player = ''
+                    remove_player = 0
 
                 # clear incorrect subs bug fix variables
-                false_off = None
-                true_on = None
+                false_off = 0
+                true_on = 0
 
             # if subbed out player was already off, skip the sub, then note the players involved for check in next play
-            if player_off[0] not in players[i-1]:
-                if player_on[0] in players[i]:
-                    players[i].remove(player_on[0])
+            if not players[i-1] & player_off:
+                lineup &= ~player_on
 
                 # this player was meant to remain on the court
-                false_off = player_off[0]
+                false_off = player_off
 
                 # this player is meant to come on and the make-up sub will fix this
-                true_on = player_on[0]
+                true_on = player_on
 
             # THIS SECTION COVERS SUBS WHERE AN ALREADY ON-COURT PLAYER WAS SUBBED ON
             # if incorrect player was subbed on in play by play, this fixes it in the make-up sub
-            if player_off[0] == false_on:
+            if player_off == false_on:
                 # replace actually substituted player with falsely taken off player
-                players[i] = [player.replace(true_off, false_on) for player in players[i]]
+                if lineup & true_off:
+                    lineup = lineup & ~true_off | false_on
 
                 # ensure this player is not re-added
-                player_off = [true_off]
+                player_off = true_off
 
                 #  if the incorrect sub is explained by this bug, clear the removed player
                 if false_on == remove_player:
-                    remove_player = ''
+                    remove_player = 0
 
                 # clear incorrect subs bug fix variables
-                false_on = None
-                true_off = None
+                false_on = 0
+                true_off = 0
 
             # if subbed in player was already on, skip the sub, then note the players involved for check in next play
-            if player_on[0] in players[i-1]:
+            if players[i-1] & player_on:
                 # this player is taken off in the next play
-                true_off = player_off[0]
+                true_off = player_off
 
                 # this player was already on and the make-up sub comes after
-                false_on = player_on[0]
+                false_on = player_on
 
-                player_off = []
+                player_off = 0
 
             # if player designated to remove subs back in, clear designation
-            if subbed_in.iloc[i] == remove_player:
-                remove_player = ''
+            if player_on == remove_player:
+                remove_player = 0
 
-            # find missing players from previous row, excluding subbed out player
-            new_players = list(set(players[i-1]) - set(players[i]) - set(player_off))
+            # add missing players from previous row, excluding subbed out player
+            lineup |= players[i-1] & ~player_off
         else:
-            new_players = list(set(players[i-1]) - set(players[i]))
-
-        # add on distinct new player
-        players[i] = list(OrderedSet(players[i] + new_players))
+            lineup |= players[i-1]
 
         # remove any designated players, and clear designation if no longer on court
-        if remove_player in players[i]:
-            players[i].remove(remove_player)
+        if lineup & remove_player:
+            lineup &= ~remove_player
         else:
-            remove_player = ''
+            remove_player = 0
+
+        players[i] = lineup
 
     return players
 
 
-def manual_bug_fixes(players, df):
+def manual_bug_fixes(lineup, roster, df):
     if [df['game_id'], str(df['time']), df['player_id']] == ['200502230DEN', '12:00:00', 'boykiea01']:
-        players.remove('boykiea01')
+        lineup &= ~roster.get_bit('boykiea01')
 
-    return players
+    return lineup
 
 
 def check_manual_fix_game(game_id, period, team_id):
@@ -293,8 +321,9 @@ def check_manual_fix_game(game_id, period, team_id):
     return output
 
 
+@timed
 def find_on_court_players(plays, game_id, team_id, period):
-    """ go through play information to figure out which players are on the court """
+    """ go through play information to figure out which players are on the court, as tuples of player_ids """
     # ignore plays after period end, if it exists, as these can be incorrect and cause errors
     try:
         plays = plays[plays.index <= plays.index[plays['event'] == 'Period End'][0]]
@@ -305,68 +334,159 @@ def find_on_court_players(plays, game_id, team_id, period):
     period_plays = plays.iloc[::-1]
 
     # get player_id, event and event_detail columns
-    player_ids = period_plays['player_id']
-    events = period_plays['event']
-    event_details = period_plays['event_detail']
+    player_ids = period_plays['player_id'].tolist()
+    events = period_plays['event'].tolist()
+    event_details = period_plays['event_detail'].tolist()
 
-    # initialise players list
-    players = [[i for i in [player_ids.iloc[0]] if i]]
+    # each player of the team gets a bit, so lineups are ints and subs are bit operations on them
+    roster = Roster()
 
-    # get first player
-    latest_players = [i for i in [player_ids.iloc[0]] if i]
+    # initialise players list with the first player
+    latest_players = roster.get_bit(player_ids[0])
+    players = [latest_players]
 
     # designate if period needs manual bug fix
     fix_needed = check_manual_fix_game(game_id, period, team_id)
 
     for i in range(1, len(player_ids)):
         # get current play player_id (except fouls, to avoid potential bench players)
-        if any(string in events.iloc[i].lower() for string in [' foul', 'technical']):
-            player_id = None
+        if any(string in events[i].lower() for string in [' foul', 'technical']):
+            player_id = 0
         else:
-            player_id = player_ids.iloc[i]
+            player_id = roster.get_bit(player_ids[i])
 
         # if previous play was a substitution, replace player who was brought on with player who was taken off
-        if events.iloc[i-1] == 'Substitution':
-            player_on = player_ids.iloc[i-1]
-            player_off = event_details.iloc[i-1]
+        if events[i-1] == 'Substitution':
+            player_on = roster.get_bit(player_ids[i-1])
+            player_off = roster.get_bit(event_details[i-1])
 
-            latest_players = [player.replace(player_on, player_off) for player in latest_players]
+            if latest_players & player_on:
+                latest_players = latest_players & ~player_on | player_off
 
-        # get last play players and add new player_id if not already existing
-        play_players = latest_players + [player_id] if player_id not in latest_players + [None] else latest_players
+        # get last play players and add new player_id
+        play_players = latest_players | player_id
 
-        # keep distinct
-        play_players = list(OrderedSet(play_players))
+        if fix_needed:
+            play_players = manual_bug_fixes(play_players, roster, period_plays.iloc[i])
 
         # append current player_ids to list of player_ids
         players.append(play_players)
 
-        if fix_needed:
-            play_players = manual_bug_fixes(play_players, period_plays.iloc[i])
-
         # update latest players
         latest_players = play_players
 
-    players = fill_players_down(players, events, player_ids, event_details)
+    players = fill_players_down(players, roster, events, player_ids, event_details)
 
     # check data correctness
-    players = play_players_check(players, game_id, team_id, period)
+    players = play_players_check(players, roster, game_id, team_id, period)
 
-    # create key for players
-    players = ["|".join(play) for play in players]
+    output = pd.Series([roster.get_players(play) for play in players], index=plays.index, dtype='object')
 
-    output = pd.Series(players, index=plays.index)
+    return output
+
+
+def get_game_plays_players(columns, game_id, game_plays, home_team, away_team):
+    """ get players on court, and opposition players on court, for every play in a game """
+    # initialise series'
+    players = pd.Series(dtype='object')
+    opp_players = pd.Series(dtype='object')
+
+    # loop through periods
+    for period in list(set(game_plays['period'])):
+        # get each teams plays, then players for each team
+        home_period_plays = game_plays.loc[(game_plays['period'] == period) & (game_plays['team_id'] == home_team)]
+        home_players = find_on_court_players(home_period_plays, game_id, home_team, period)
+        away_period_plays = game_plays.loc[(game_plays['period'] == period) & (game_plays['team_id'] == away_team)]
+        away_players = find_on_court_players(away_period_plays, game_id, away_team, period)
+
+        # get DataFrame index
+        period_index = home_period_plays.index.tolist() + away_period_plays.index.tolist()
+
+        # fill each series back and forward for complete list of players for ALL plays in period
+        home_players = home_players.reindex(sorted(period_index)).fillna(method='ffill').fillna(method='bfill')
+        away_players = away_players.reindex(sorted(period_index)).fillna(method='ffill').fillna(method='bfill')
+
+        # convert the series' into team and opposition players
+        period_players = pd.concat([home_players[home_period_plays.index],
+                                    away_players[away_period_plays.index]])
+        period_opp_players = pd.concat([home_players[away_period_plays.index],
+                                        away_players[home_period_plays.index]])
+
+        players = players.append(period_players)
+        opp_players = opp_players.append(period_opp_players)
+
+    # rows for the lineups table, and the id of each lineup for the plays
+    lineups = get_lineups(pd.concat([players, opp_players]))
+    lineup_ids = dict(zip(lineups[lineup_columns[1:]].itertuples(index=False, name=None), lineups['lineup_id']))
+
+    players = players.map(lineup_ids)
+    opp_players = opp_players.map(lineup_ids)
+
+    # create DataFrame to write
+    output = pd.concat([game_plays['play_id'], game_plays['game_id'], players, opp_players], axis=1)
+    output.columns = columns
+
+    return output, lineups
+
+
+def get_game_possessions(game_plays, game_plays_players):
+    """ get a row for each possession in a game, with both lineups and the points scored by the team with the ball
+
+    a possession ends on a play flagged as ending one, i.e. a shot, the last of a set of free throws or a turnover, and
+    its points are all those the team scored since the last possession ended, including any earlier free throws
+    """
+    plays = game_plays.merge(game_plays_players[['play_id', 'lineup_id', 'opp_lineup_id']], on='play_id')
+
+    ends = plays['possession'].fillna(0).astype('int') == 1
+    number = ends.shift(fill_value=False).cumsum()
+
+    made = plays['event'].isin(['FG Make', 'FT Make'])
+    points = pd.to_numeric(plays['event_value'], errors='coerce').fillna(0).where(made, 0)
+    points = points.groupby([number, plays['team_id']]).transform('sum')
+
+    # periods end a possession without a team having the ball, as can plays with no team, e.g. some timeouts
+    output = plays.loc[ends & (plays['event'] != 'Period End') & plays['team_id'].notnull(),
+                       ['play_id', 'game_id', 'period', 'team_id', 'lineup_id', 'opp_lineup_id']]
+    output['points'] = points[output.index].astype('int')
+
+    output = output.reset_index(drop=True)
 
     return output
 
 
-def write_game_plays_players(ns, queue):
+def write_game_plays_players(ns, queue, failed_games):
     """ loop through queue and set up relevant data, then write to DB """
     # get all the shared objects for the process
     game_ids = ns.game_ids
     columns = ns.columns
-    plays = ns.plays
-    games = ns.games
+
+    # attach to the season data shared by the parent process
+    plays = SharedFrame(ns.plays)
+    games = SharedFrame(ns.games)
+
+    # lineups are found again in later games and by other processes, so only new ones are kept
+    writer_lineups = BufferedWriter(name='lineups',
+                                    sql_engine=get_engine(database),
+                                    db_schema='nba',
+                                    method=insert_ignore)
+
+    # batch games for this process into larger writes, on the process' own pooled engine, only once their lineups are
+    # written so a failed write can't leave ids pointing to nothing
+    writer = BufferedWriter(name='plays_players',
+                            sql_engine=get_engine(database),
+                            db_schema='nba',
+                            after=writer_lineups,
+                            failed_games=failed_games)
+
+    writer_possessions = BufferedWriter(name='possessions',
+                                        sql_engine=get_engine(database),
+                                        db_schema='nba',
+                                        after=writer_lineups,
+                                        failed_games=failed_games)
+
+    # box scores are fetched through the page cache, with a fetcher per process as its event loop cannot be forked
+    global fetcher
+    fetcher = get_fetcher('plays_players', processes=plays_players_processes)
 
     while not queue.empty():
         game_start = time.process_time()
@@ -376,52 +496,28 @@ def write_game_plays_players(ns, queue):
         game_id = game_ids[iteration]
 
         # get plays and teams for game
-        game_plays = plays.loc[plays['game_id'] == game_id].reset_index(drop=True)
-        team_ids = games.loc[games['game_id'] == game_id, ['home_team', 'away_team']]
+        game_plays = plays.get_partition(game_id).reset_index(drop=True)
+        team_ids = games.get_partition(game_id)
         home_team = team_ids['home_team'].item()
         away_team = team_ids['away_team'].item()
 
-        # initialise series'
-        players = pd.Series(dtype='object')
-        opp_players = pd.Series(dtype='object')
-
-        # loop through periods
-        for period in list(set(game_plays['period'])):
-            # get each teams plays, then players for each team
-            home_period_plays = game_plays.loc[(game_plays['period'] == period) & (game_plays['team_id'] == home_team)]
-            home_players = find_on_court_players(home_period_plays, game_id, home_team, period)
-            away_period_plays = game_plays.loc[(game_plays['period'] == period) & (game_plays['team_id'] == away_team)]
-            away_players = find_on_court_players(away_period_plays, game_id, away_team, period)
-
-            # get DataFrame index
-            period_index = home_period_plays.index.tolist() + away_period_plays.index.tolist()
-
-            # fill each series back and forward for complete list of players for ALL plays in period
-            home_players = home_players.reindex(sorted(period_index)).fillna(method='ffill').fillna(method='bfill')
-            away_players = away_players.reindex(sorted(period_index)).fillna(method='ffill').fillna(method='bfill')
-
-            # convert the series' into team and opposition players
-            period_players = pd.concat([home_players[home_period_plays.index],
-                                        away_players[away_period_plays.index]])
-            period_opp_players = pd.concat([home_players[away_period_plays.index],
-                                            away_players[home_period_plays.index]])
-
-            players = players.append(period_players)
-            opp_players = opp_players.append(period_opp_players)
-
-        # create DataFrame to write
-        plays_players = pd.concat([game_plays['play_id'], game_plays['game_id'], players, opp_players], axis=1)
-        plays_players.columns = columns
+        # find the players on court for every play, skipping games that can't be solved so the watermark stops
+        # before them
+        try:
+            plays_players, lineups = get_game_plays_players(columns, game_id, game_plays, home_team, away_team)
+            possessions = get_game_possessions(game_plays, plays_players)
+        except Exception as e:
+            failed_games.append(game_id)
+            sys.stdout.write('\n')
+            print(Colour.red + f'Could not find players for {game_id}: {e!r}' + Colour.end)
+            continue
 
         cleaning_time = time.process_time() - game_start
 
-        # write to DB and get status
-        status = write_data(df=plays_players,
-                            name='plays_players',
-                            sql_engine=engine,
-                            db_schema='nba',
-                            if_exists='append',
-                            index=False)
+        # add to the batch of rows to be written, and get status of the latest write
+        writer_lineups.write(lineups)
+        writer_possessions.write(possessions)
+        status = writer.write(plays_players)
 
         time_taken = 'Cleaned in ' + "{:.2f}".format(cleaning_time) + ' seconds, ' \
                                                                       'Total ' + time_lapsed()
@@ -433,27 +529,41 @@ def write_game_plays_players(ns, queue):
                  lapsed=time_taken,
                  sql_status=status['sql'])
 
+    fetcher.close()
+
+    plays.close()
+    games.close()
+
+    close_writers(writer_possessions, writer, writer_lineups)
+
 
 def write_season_plays_players(queue):
     """ define processes for the season """
     # set up processes
-    processes = [Process(target=write_game_plays_players, name=f'Process-{i}', args=(name_space, queue,))
-                 for i in range(8)]
+    processes = [Process(target=write_game_plays_players, name=f'Process-{i}', args=(name_space, queue, failed_games,))
+                 for i in range(plays_players_processes)]
     [proc.start() for proc in processes]
     [proc.join() for proc in processes]
 
     sys.stdout.write('\n')
 
+    # stop before the watermark moves if a process failed in a way its games couldn't be recorded
+    check_processes(processes)
+
 
 def get_season_game_ids(season):
     """ get game_ids for the selected season """
-    games = name_space.games
-
     # set games to be cleaned
     game_ids = games.loc[games['season'] == season, 'game_id'].reset_index(drop=True)
 
+    if INCREMENTAL:
+        # only clean new games, clearing any rows an unfinished run left for them
+        game_ids = game_ids[game_ids.isin(new_games['game_id'])].reset_index(drop=True)
+
+        for table in ['plays_players', 'possessions']:
+            connection.execute(get_delete_query(metadata, engine, table, 'game_id', game_ids))
     # if skipping already cleaned games, then check and exclude games already in plays table
-    if SKIP_SCRAPED_GAMES:
+    elif SKIP_SCRAPED_GAMES:
         # get selectable object sql query to get already scraped plays
         selectable = get_column_query(metadata, engine, 'plays_players', 'game_id')
         skip_games = pd.read_sql(sql=selectable, con=connection)['game_id']
@@ -462,8 +572,8 @@ def get_season_game_ids(season):
         game_ids = game_ids[~game_ids.isin(skip_games)].reset_index(drop=True)
     else:
         # clear rows where play data already exists
-        selectable = get_delete_query(metadata, engine, 'plays_players', 'game_id', game_ids)
-        connection.execute(selectable)
+        for table in ['plays_players', 'possessions']:
+            connection.execute(get_delete_query(metadata, engine, table, 'game_id', game_ids))
 
     return game_ids
 
@@ -476,7 +586,12 @@ def write_all_plays_players(series):
 
         # get selectable object sql query to get plays for the season
         selectable = get_table_query(metadata, engine, 'plays', 'game_id', name_space.game_ids)
-        name_space.plays = pd.read_sql(sql=selectable, con=engine)
+        plays = pd.read_sql(sql=selectable, con=engine)
+
+        # share season plays across processes through shared memory, rather than pickling through the manager,
+        # grouped by game so each worker can slice a game out directly
+        name_space.plays, plays_blocks = share_frame(plays, partition='game_id')
+        del plays
 
         # create game_id queue
         q = manager.Queue()
@@ -485,27 +600,47 @@ def write_all_plays_players(series):
         if not q.empty():
             write_season_plays_players(q)
 
+        release_frame(plays_blocks)
+
         print(f'Completed season {season}')
 
 
 if __name__ == '__main__':
     engine, metadata, connection = get_connection(database)
     create_table_plays_players(engine, metadata)
+    create_table_lineups(engine, metadata)
+    create_table_possessions(engine, metadata)
+    create_table_watermarks(engine, metadata)
 
     # create manager for sharing data across processes
     manager = Manager()
     name_space = manager.Namespace()
 
-    name_space.columns = ['play_id', 'game_id', 'players', 'opp_players']
+    name_space.columns = ['play_id', 'game_id', 'lineup_id', 'opp_lineup_id']
 
-    name_space.games = load_data(df='games',
-                                 sql_engine=engine,
-                                 meta=metadata)
+    games = load_data(df='games',
+                      sql_engine=engine,
+                      meta=metadata)
+    name_space.games, games_blocks = share_frame(games, partition='game_id')
 
     # get seasons from games table to iterate
     seasons = pd.Series(range(start_season_games, end_season_games+1))
 
+    # games after the last one cleaned at the previous run, and only their seasons when loading incrementally
+    new_games = get_new_games(engine, metadata, 'plays_players')
+
+    if INCREMENTAL:
+        seasons = seasons[seasons.isin(new_games['season'])].reset_index(drop=True)
+
+    # games the workers couldn't solve, which the watermark mustn't move past
+    failed_games = manager.list()
+
     write_all_plays_players(seasons)
 
+    if INCREMENTAL:
+        update_watermark(engine, metadata, 'plays_players', new_games, failed_games)
+
+    release_frame(games_blocks)
+
     print(Colour.green + 'Got on-court players ' + str('{0:.2f}'.format(time.time() - start_time))
           + ' seconds taken' + Colour.end)
@@ -0,0 +1,325 @@
+# STREAM EACH GAME FROM SCRAPING THROUGH CLEANING TO ON-COURT PLAYERS
+from modelling.projects.nba import *  # import broadly used python packages
+from modelling.projects.nba.utils import *  # import user defined utilities
+from modelling.projects.nba.data import *  # import data specific packages
+from modelling.projects.nba.data.scraping.plays_raw import get_page_url, get_game_plays_raw
+from modelling.projects.nba.data.cleaning.plays import tidy_raw_plays, clean_game_plays
+from modelling.projects.nba.data.cleaning.plays_players import get_game_plays_players, get_game_possessions
+from modelling.projects.nba.data.cleaning import plays_players
+from multiprocessing import Event
+from queue import Full
+
+
+def get_stored_plays(df):
+    """ match plays read back from nba.plays, where MySQL stores 'MM:SS' times as hours and minutes """
+    output = df.copy()
+    output['time'] = pd.to_timedelta(output['time'] + ':00')
+
+    return output
+
+
+def get_game_teams(games, game_id):
+    """ get home and away team for a game """
+    teams = games.get_partition(game_id)
+    output = teams['home_team'].item(), teams['away_team'].item()
+
+    return output
+
+
+def put_until_stopped(queue, item, stop):
+    """ put an item on a bounded queue, giving up once a stage has died, so a full queue can't block forever """
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=1)
+            return
+        except Full:
+            continue
+
+    raise RuntimeError('A pipeline stage has stopped')
+
+
+def watch_stages(processes, stop):
+    """ tell every stage to stop as soon as any stage process dies, until they have all finished """
+    while any(proc.is_alive() for proc in processes):
+        if any(proc.exitcode not in (None, 0) for proc in processes):
+            stop.set()
+            return
+
+        time.sleep(1)
+
+
+def scrape_game(game_id):
+    """ scrape a game's raw plays, write them, then pass them on, waiting while the cleaning stage is full """
+    # nothing can be passed on once a stage has died
+    if stop.is_set():
+        failed_games.append(game_id)
+        return
+
+    try:
+        tree = parse_page(fetcher.get(get_page_url(game_id)))
+        game_plays_raw = get_game_plays_raw(tree, game_id)
+    except Exception as e:
+        sys.stdout.write('\n')
+        print(Colour.red + f'Could not scrape {game_id}: {e!r}' + Colour.end)
+        failed_games.append(game_id)
+        return
+
+    writer_raw.write(game_plays_raw)
+
+    try:
+        put_until_stopped(raw_queue, (game_id, game_plays_raw), stop)
+    except RuntimeError:
+        failed_games.append(game_id)
+
+
+def clean_stage(ns, raw_queue, plays_queue, stop, failed_games, performance_queue):
+    """ clean raw plays from the queue until told to stop, passing each game on to the players stage """
+    plays_columns = ns.plays_columns
+
+    games = SharedFrame(ns.games)
+    games_lineups = SharedFrame(ns.games_lineups)
+
+    # each game's rows from earlier runs are replaced as it is written
+    writer = BufferedWriter(name='plays',
+                            sql_engine=get_engine(database),
+                            db_schema='nba',
+                            replace_on='game_id',
+                            failed_games=failed_games)
+
+    while (item := raw_queue.get()) is not None:
+        game_id, game_plays_raw = item
+        set_performance_tags(game_id=game_id)
+
+        # the cleaning steps raise on plays they can't fix, which should only skip that game here
+        try:
+            home_team, away_team = get_game_teams(games, game_id)
+            game_lineups = games_lineups.get_partition(game_id)
+
+            game_plays_raw = tidy_raw_plays(game_plays_raw, home_team, away_team)
+            game_plays = clean_game_plays(plays_columns, game_id, game_lineups, game_plays_raw)
+        except Exception as e:
+            sys.stdout.write('\n')
+            print(Colour.red + f'Could not clean {game_id}: {e!r}' + Colour.end)
+            failed_games.append(game_id)
+            continue
+
+        writer.write(game_plays)
+        put_until_stopped(plays_queue, (game_id, game_plays), stop)
+
+        send_performance(performance_queue)
+
+    games.close()
+    games_lineups.close()
+
+    writer.close()
+
+
+def players_stage(ns, plays_queue, games_done, failed_games, performance_queue):
+    """ find on-court players for cleaned plays from the queue until told to stop """
+    plays_players_columns = ns.plays_players_columns
+    games_count = ns.games_count
+
+    games = SharedFrame(ns.games)
+
+    # lineups are found again in later games and by other processes, so only new ones are kept
+    writer_lineups = BufferedWriter(name='lineups',
+                                    sql_engine=get_engine(database),
+                                    db_schema='nba',
+                                    method=insert_ignore)
+
+    # rows pointing to lineups are only written once their lineups are, so a failed write can't leave ids to nothing,
+    # and replace each game's rows from earlier runs
+    writer = BufferedWriter(name='plays_players',
+                            sql_engine=get_engine(database),
+                            db_schema='nba',
+                            after=writer_lineups,
+                            replace_on='game_id',
+                            failed_games=failed_games)
+
+    writer_possessions = BufferedWriter(name='possessions',
+                                        sql_engine=get_engine(database),
+                                        db_schema='nba',
+                                        after=writer_lineups,
+                                        replace_on='game_id',
+                                        failed_games=failed_games)
+
+    # box scores for missing players are fetched through plays_players' own fetcher
+    plays_players.fetcher = get_fetcher('plays_players', processes=pipeline_players_processes)
+
+    while (item := plays_queue.get()) is not None:
+        game_id, game_plays = item
+        set_performance_tags(game_id=game_id)
+
+        try:
+            home_team, away_team = get_game_teams(games, game_id)
+            game_plays_players, lineups = get_game_plays_players(plays_players_columns, game_id,
+                                                                 get_stored_plays(game_plays), home_team, away_team)
+            possessions = get_game_possessions(game_plays, game_plays_players)
+        except Exception as e:
+            sys.stdout.write('\n')
+            print(Colour.red + f'Could not find players for {game_id}: {e!r}' + Colour.end)
+            failed_games.append(game_id)
+            continue
+
+        writer_lineups.write(lineups)
+        writer_possessions.write(possessions)
+        status = writer.write(game_plays_players)
+
+        with games_done.get_lock():
+            games_done.value += 1
+            iteration = games_done.value - 1
+
+        # show progress of games through the whole pipeline
+        progress(iteration=iteration,
+                 iterations=games_count,
+                 iteration_name=game_id,
+                 lapsed=time_lapsed(),
+                 sql_status=status['sql'])
+
+        send_performance(performance_queue)
+
+    plays_players.fetcher.close()
+
+    games.close()
+
+    close_writers(writer_possessions, writer, writer_lineups)
+
+
+def get_pipeline_game_ids():
+    """ get games in the season range that don't have on-court players yet, or all of them to reprocess """
+    output = games.loc[games['season'].between(start_season_games, end_season_games), 'game_id']
+    output = output.reset_index(drop=True)
+
+    if INCREMENTAL:
+        # only games after the last one with on-court players at the previous run
+        output = output[output.isin(new_games['game_id'])].reset_index(drop=True)
+    elif SKIP_SCRAPED_GAMES:
+        selectable = get_column_query(metadata, engine, 'plays_players', 'game_id')
+        skip_games = pd.read_sql(sql=selectable, con=connection)['game_id']
+
+        output = output[~output.isin(skip_games)].reset_index(drop=True)
+
+    return output
+
+
+def start_stages():
+    """ start the processes for each cleaning stage, which wait on their queues """
+    clean_processes = [Process(target=clean_stage,
+                               name=f'Clean-{i}',
+                               args=(name_space, raw_queue, plays_queue, stop, failed_games,
+                                     performance_collector.queue,))
+                       for i in range(pipeline_clean_processes)]
+    players_processes = [Process(target=players_stage,
+                                 name=f'Players-{i}',
+                                 args=(name_space, plays_queue, games_done, failed_games, performance_collector.queue,))
+                         for i in range(pipeline_players_processes)]
+    [proc.start() for proc in clean_processes + players_processes]
+
+    # stop the other stages if one dies, rather than leaving them blocked on a full queue
+    threading.Thread(target=watch_stages, args=(clean_processes + players_processes, stop), daemon=True).start()
+
+    return clean_processes, players_processes
+
+
+def scrape_all_games():
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
+        list(executor.map(scrape_game, game_ids))
+
+
+def stop_stages(clean_processes, players_processes):
+    """ stop each stage once the one before it has finished, so every game is passed all the way through """
+    try:
+        [put_until_stopped(raw_queue, None, stop) for _ in clean_processes]
+        [proc.join() for proc in clean_processes]
+
+        [put_until_stopped(plays_queue, None, stop) for _ in players_processes]
+        [proc.join() for proc in players_processes]
+    except RuntimeError:
+        # a stage has died, so the others can't all be reached through the queues
+        [proc.terminate() for proc in clean_processes + players_processes if proc.is_alive()]
+        [proc.join() for proc in clean_processes + players_processes]
+
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    engine, metadata, connection = get_connection(database)
+    engine_raw, metadata_raw, connection_raw = get_connection(database_raw)
+    create_table_plays_raw(engine_raw, metadata_raw)
+    create_table_plays(engine, metadata)
+    create_table_plays_players(engine, metadata)
+    create_table_lineups(engine, metadata)
+    create_table_possessions(engine, metadata)
+    create_table_watermarks(engine, metadata)
+
+    # create manager for sharing data with the stage processes, which don't rely on being forked from this one
+    manager = Manager()
+    name_space = manager.Namespace()
+
+    # column names for the plays and plays_players tables
+    name_space.plays_columns = ['play_id', 'game_id', 'period', 'time', 'home_score', 'away_score', 'team_id',
+                                'player_id', 'event', 'event_value', 'event_detail', 'possession']
+    name_space.plays_players_columns = ['play_id', 'game_id', 'lineup_id', 'opp_lineup_id']
+
+    games = load_data(df='games',
+                      sql_engine=engine,
+                      meta=metadata)
+
+    # games after the last one to make it through the pipeline at the previous run, which streams games from scraping
+    # so only needs their lineups loaded
+    new_games = get_new_games(engine, metadata, 'plays_players', upstream=['games_lineups'])
+    game_ids = get_pipeline_game_ids()
+
+    # share games and their lineups with the stage processes, grouped by game
+    games_lineups_query = get_table_query(metadata, engine, 'games_lineups', 'game_id', game_ids)
+    games_lineups = pd.read_sql(sql=games_lineups_query, con=engine)
+    name_space.games, games_blocks = share_frame(games, partition='game_id')
+    name_space.games_lineups, games_lineups_blocks = share_frame(games_lineups, partition='game_id')
+    name_space.games_count = len(game_ids)
+
+    # bounded queues between stages, so a slow stage holds back the ones before it rather than filling memory
+    raw_queue = Queue(maxsize=pipeline_queue_size)
+    plays_queue = Queue(maxsize=pipeline_queue_size)
+    games_done = Value('i', 0)
+
+    # set once any stage dies, so nothing waits on a queue the dead stage would have emptied
+    stop = Event()
+
+    # games that failed at any stage, which the watermarks mustn't move past
+    failed_games = manager.list()
+
+    performance_collector = PerformanceCollector()
+
+    clean_processes, players_processes = start_stages()
+
+    # scrape in threads of this process, sharing one rate limited connection pool and page cache, which are only
+    # opened once the stage processes have been forked
+    fetcher = get_fetcher('pipeline')
+    writer_raw = BufferedWriter(name='plays_raw',
+                                sql_engine=engine_raw,
+                                db_schema='nba_raw',
+                                replace_on='game_id',
+                                failed_games=failed_games)
+
+    scrape_all_games()
+
+    fetcher.close()
+
+    stop_stages(clean_processes, players_processes)
+
+    performance_collector.close()
+    release_frame(games_blocks + games_lineups_blocks)
+
+    writer_raw.close()
+
+    # stop before the watermarks move if a stage failed in a way its games couldn't be recorded
+    check_processes(clean_processes + players_processes)
+
+    if INCREMENTAL:
+        for stage in ['plays_raw', 'plays', 'plays_players']:
+            update_watermark(engine, metadata, stage, new_games, failed_games)
+
+    print(Colour.green + 'Pipeline Completed ' + str('{0:.2f}'.format(time.time() - start_time))
+          + ' seconds taken' + Colour.end)
+
+    report_performance()
@@ -3,141 +3,97 @@ from modelling.projects.nba import *  # import broadly used python packages
 from modelling.projects.nba.utils import *  # import user defined utilities
 from modelling.projects.nba.data import *  # import data specific packages
 
+# column names for games table
+columns = ['game_id', 'game_date', 'home_team', 'home_score', 'away_team', 'away_score', 'season', 'is_playoffs']
+
+# schedule cells holding each team and score
+team_stats = {'home_team_name': 'home_team', 'visitor_team_name': 'away_team'}
+score_stats = {'home_pts': 'home_score', 'visitor_pts': 'away_score'}
+
 
 # convert to standardised date format
+@timed
 def convert_date(x):
     output = dt.strptime(x, "%a, %b %d, %Y").strftime("%Y-%m-%d")
 
-    log_performance()
-    return output
-
-
-# find header from each row and return game_id
-def get_game_id(rows):
-    output = [x.findChild('th').get('csk') for x in rows]
-
-    log_performance()
-    return output
-
-
-# get date from row header and convert to standardised date
-def get_game_date(rows):
-    output = [convert_date(x.findChild('th').findChild('a').text) for x in rows]
-
-    log_performance()
-    return output
-
-
-# return 'csk' item from the element of each row designated to home team name, then extract team_id
-def get_home_team(rows):
-    output = [re.search(r'([A-Z]+)\.', x[i].get('csk')).group(1) for x in rows for i in range(len(rows[0]))
-              if x[i].get('data-stat') == 'home_team_name']
-
-    log_performance()
-    return output
-
-
-# return text from the element of each row designated to home points
-def get_home_score(rows):
-    output = [x[i].text for x in rows for i in range(len(rows[0]))
-              if x[i].get('data-stat') == 'home_pts']
-
-    log_performance()
     return output
 
 
-# return 'csk' item from the element of each row designated to away team name, then extract team_id
-def get_away_team(rows):
-    output = [re.search(r'([A-Z]+)\.', x[i].get('csk')).group(1) for x in rows for i in range(len(rows[0]))
-              if x[i].get('data-stat') == 'visitor_team_name']
+# get the url of each month's schedule in a season
+@timed
+def get_month_urls(tree):
+    output = ['https://www.basketball-reference.com' + x for x in tree.xpath("//div[@class='filter']/div/a/@href")]
 
-    log_performance()
     return output
 
 
-# return text from the element of each row designated to visitor points
-def get_away_score(rows):
-    output = [x[i].text for x in rows for i in range(len(rows[0]))
-              if x[i].get('data-stat') == 'visitor_pts']
-
-    log_performance()
-    return output
-
+# read every game in a month's schedule table into columns, in one pass over the rows
+@timed
+def get_month_games(tree):
+    output = {column: [] for column in columns[:6]}
+    playoff_date = None
+    last_date = None
 
-def scrape_season_games(driver, months, season):
-    # initialise season dataframe
-    output = pd.DataFrame(columns=columns)
+    for row in tree.iterfind(".//table[@id='schedule']/tbody/tr"):
+        # header rows within the table have a class, and the playoffs header follows the last regular season game
+        if row.get('class'):
+            if row.text_content().strip() == 'Playoffs':
+                playoff_date = last_date
+            continue
 
-    # set a default date for playoffs start, which will be updated later when we know the date
-    playoff_date = dt.strptime(f'{season}-12-31', '%Y-%m-%d')
+        header = row.find('th')
+        last_date = convert_date(header.text_content())
 
-    for x in months:
-        # initialise monthly dataframe
-        monthly = pd.DataFrame(columns=columns)
+        output['game_id'].append(header.get('csk'))
+        output['game_date'].append(last_date)
 
-        # set month for url (lower case, and 2020 includes two separate Octobers)
-        month = x.lower().replace(' ', '-')
+        # team names hold the team_id in 'csk' (e.g. LAL.201910220), and points are the cell text
+        for cell in row.iterfind('td'):
+            stat = cell.get('data-stat')
 
-        # jump to month/season combination of games
-        driver.get(f"https://www.basketball-reference.com/leagues/NBA_{season}_games-{month}.html")
-        time.sleep(0.5)
+            if stat in team_stats:
+                output[team_stats[stat]].append(re.search(r'([A-Z]+)\.', cell.get('csk')).group(1))
+            elif stat in score_stats:
+                output[score_stats[stat]].append(cell.text_content())
 
-        # get schedule table
-        schedule = driver.find_element_by_id('schedule')
+    return output, playoff_date
 
-        # get html text of schedule table, and return all rowz
-        soup = BeautifulSoup(schedule.get_attribute('innerHTML'), 'html.parser')
-        table = soup.findChild('tbody').findChildren('tr')
 
-        # get whole rows
-        rows = [x for x in table if x.get('data-row') is not None and x.get('class') is None]
+@timed
+def scrape_season_games(season):
+    url = f'https://www.basketball-reference.com/leagues/NBA_{season}_games.html'
 
-        # get row cells
-        row_cells = [x.findChildren('td') for x in rows]
+    # get every month page for the season at once, falling back to the season page if it has no months to pick
+    month_urls = get_month_urls(parse_page(fetcher.get(url))) or [url]
+    months = [get_month_games(parse_page(page)) for page in fetcher.get_all(month_urls)]
 
-        # if playoffs happen in the month, update the playoff_date
-        try:
-            playoff = [i for i in range(len(table)) if table[i].text == 'Playoffs'][0]
-            playoff_date = convert_date(table[playoff-1].findChild('th').findChild('a').text)
-        except IndexError:
-            pass
+    # join the month columns, and build the season DataFrame once
+    output = pd.DataFrame({column: [x for games, _ in months for x in games[column]] for column in columns[:6]},
+                          columns=columns)
 
-        # manually set playoff date for 2020 since it is not given by basketball reference
-        if season == 2020:
-            playoff_date = '2020-08-15'
+    # set a default date for playoffs start, which is updated if the playoffs header is found
+    playoff_date = next((date for _, date in months if date is not None), f'{season}-12-31')
 
-        # get all data into monthly data_frame
-        monthly['game_id'] = get_game_id(rows)
-        monthly['game_date'] = get_game_date(rows)
-        monthly['home_team'] = get_home_team(row_cells)
-        monthly['home_score'] = get_home_score(row_cells)
-        monthly['away_team'] = get_away_team(row_cells)
-        monthly['away_score'] = get_away_score(row_cells)
-        monthly['season'] = [season] * len(monthly)
-        monthly['is_playoffs'] = (pd.to_datetime(monthly['game_date']) > playoff_date)*1
+    # manually set playoff date for 2020 since it is not given by basketball reference
+    if season == 2020:
+        playoff_date = '2020-08-15'
 
-        output = output.append(monthly)
+    output['season'] = season
+    output['is_playoffs'] = (pd.to_datetime(output['game_date']) > playoff_date)*1
 
-        log_performance()
     return output
 
 
 def write_season_data(iteration):
-    driver = webdriver.Chrome(executable_path=str(ROOT_DIR) + "/utils/chromedriver.exe",
-                              options=options)
-
-    # go to base game schedule for the season
-    driver.get(f"https://www.basketball-reference.com/leagues/NBA_{season_range[iteration]}_games.html")
+    # scrape the season data for all months
+    yearly = scrape_season_games(season_range[iteration])
 
-    # wait for page to load
-    time.sleep(0.5)
+    # games not yet played have no score
+    yearly[['home_score', 'away_score']] = yearly[['home_score', 'away_score']].replace({'': None})
 
-    # get all the months for the season
-    month_elements = driver.find_elements_by_xpath("//*[@class='filter']/div")
-    months = [x.text for x in month_elements]
-
-    # scrape the season data for all found months
-    yearly = scrape_season_games(driver, months, season_range[iteration])
+    # when loading incrementally, only keep games after those already loaded
+    if scrape_after is not None:
+        yearly = yearly[pd.to_datetime(yearly['game_date']) > pd.Timestamp(scrape_after)]
 
     status = write_data(df=yearly,
                         name='games',
@@ -152,12 +108,19 @@ def write_season_data(iteration):
              lapsed=time_lapsed(),
              sql_status=status['sql'])
 
-    driver.quit()
+
+def get_last_completed_date():
+    """ get date of the last game with a score """
+    table = get_table(metadata, engine, 'games')
+    output = connection.execute(sql.select([sql.func.max(table.c.game_date)])
+                                .where(table.c.home_score.isnot(None))).scalar()
+
+    return output
 
 
 def write_all_games_data():
     iteration = list(range(len(season_range)))
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
         executor.map(write_season_data, iteration)
         executor.shutdown()
 
@@ -165,14 +128,27 @@ def write_all_games_data():
 if __name__ == '__main__':
     engine, metadata, connection = get_connection(database)
     create_table_games(engine, metadata)
-
-    # column names for games table
-    columns = ['game_id', 'game_date', 'home_team', 'home_score', 'away_team', 'away_score', 'season', 'is_playoffs']
+    create_table_watermarks(engine, metadata)
 
     # pick up date range from parameters
     season_range = pd.Series(range(start_season_games, end_season_games+1))
 
-    if SKIP_SCRAPED_GAMES:
+    # only keep games after this date, if set
+    scrape_after = None
+
+    if INCREMENTAL:
+        # re-scrape from the latest season loaded, replacing any games which hadn't been played at the last run
+        table = get_table(metadata, engine, 'games')
+        scrape_after = get_watermark(engine, metadata, 'games')
+
+        latest_season = connection.execute(sql.select([sql.func.max(table.c.season)])).scalar()
+        season_range = season_range[season_range >= (latest_season or start_season_games)].reset_index(drop=True)
+
+        if scrape_after is not None:
+            connection.execute(table.delete().where(table.c.game_date > scrape_after))
+        else:
+            connection.execute(table.delete().where(table.c.season.in_(season_range)))
+    elif SKIP_SCRAPED_GAMES:
         # return seasons of existing games
         selectable = get_column_query(metadata, engine, 'games', 'season')
         skip_seasons = pd.read_sql(sql=selectable, con=connection)['season']
@@ -184,12 +160,17 @@ if __name__ == '__main__':
         selectable = get_delete_query(metadata, engine, 'games', 'season', season_range)
         connection.execute(selectable)
 
-    # defining threads
-    thread_local = threading.local()
+    # share one rate limited connection pool and page cache across all threads
+    fetcher = get_fetcher('games')
 
-    # scrape all lineups and write them to the DB
+    # scrape all seasons and write them to the DB
     write_all_games_data()
 
+    fetcher.close()
+
+    # later stages only pick up games up to the last one played
+    set_watermark(engine, metadata, 'games', get_last_completed_date())
+
     # return to regular output writing
     sys.stdout.write('\n')
 
@@ -5,34 +5,35 @@ from modelling.projects.nba.data import *  # import data specific packages
 
 
 # generate list of 5 starters
+@timed
 def get_starters_roles():
     output = ['Starter'] * 5
 
-    log_performance()
     return output
 
 
 # generate list of bench players where not a starter and received minutes
+@timed
 def get_bench_roles(rows):
     players = rows[5:]
     bench = [i.findChild('th').get('data-append-csv') for i in players if i.findAll('td', {'data-stat': 'mp'})]
     output = ['Bench'] * len(bench)
 
-    log_performance()
     return output
 
 
 # generate list of dnp players where reason for not playing provided
+@timed
 def get_dnp_roles(rows):
     players = rows[5:]
     dnp = [i.findChild('th').get('data-append-csv') for i in players if i.findAll('td', {'data-stat': 'reason'})]
     output = ['DNP'] * len(dnp)
 
-    log_performance()
     return output
 
 
 # find box scores for each team, then combine player roles and write
+@timed
 def get_team_roles(html, team_id, game_id):
     # get box score
     box = html.find(id=f'box-{team_id}-game-basic').findChild('tbody')
@@ -57,68 +58,55 @@ def get_team_roles(html, team_id, game_id):
 
     output.columns = columns
 
-    log_performance()
     return output
 
 
 # get contents of page
-def get_page_content(game_id, session):
+@timed
+def get_page_content(game_id):
     # get url
     url = f'https://www.basketball-reference.com/boxscores/{game_id}.html'
 
-    page = session.get(url)
-    output = BeautifulSoup(page.content, 'lxml')
+    page = fetcher.get(url)
+    output = BeautifulSoup(page, 'lxml')
 
-    log_performance()
     return output
 
 
 # get team names by home/away
+@timed
 def get_teams(game_id):
     output = games.loc[games['game_id'] == game_id, ['home_team', 'away_team']]
 
-    log_performance()
     return output
 
 
-# open session for each thread
-def get_session():
-    if not hasattr(thread_local, "session"):
-        thread_local.session = r.session()
-    else:
-        pass
-    return thread_local.session
-
-
 # get the team lineups then write
+@timed
 def write_lineup(iteration):
-    # open session for thread
-    session = get_session()
-
     # get game_id
     game_id = game_ids[iteration]
 
-    # get page content
-    soup = get_page_content(game_id, session)
+    # get the lineups for each team, keeping track of games that fail so they are tried again
+    try:
+        soup = get_page_content(game_id)
+        teams = get_teams(game_id)
 
-    # get teams
-    teams = get_teams(game_id)
+        home_team = teams['home_team'].item()
+        away_team = teams['away_team'].item()
 
-    home_team = teams['home_team'].item()
-    away_team = teams['away_team'].item()
-
-    # get lineups for each team
-    home_roles = get_team_roles(soup, home_team, game_id)
-    away_roles = get_team_roles(soup, away_team, game_id)
+        home_roles = get_team_roles(soup, home_team, game_id)
+        away_roles = get_team_roles(soup, away_team, game_id)
+    except Exception as e:
+        failed_games.append(game_id)
+        sys.stdout.write('\n')
+        print(Colour.red + f'Could not scrape {game_id}: {e!r}' + Colour.end)
+        return
 
     output = home_roles.append(away_roles)
 
-    status = write_data(df=output,
-                        name='games_lineups',
-                        sql_engine=engine,
-                        db_schema='nba',
-                        if_exists='append',
-                        index=False)
+    # add to the batch of rows to be written, and get status of the latest write
+    status = writer.write(output)
 
     progress(iteration=iteration,
              iterations=len(game_ids),
@@ -126,13 +114,12 @@ def write_lineup(iteration):
              lapsed=time_lapsed(),
              sql_status=status['sql'])
 
-    log_performance()
     return output
 
 
 def write_all_lineups():
     iterations = range(len(game_ids))
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
         executor.map(write_lineup, iterations)
         executor.shutdown()
 
@@ -140,6 +127,7 @@ def write_all_lineups():
 if __name__ == '__main__':
     engine, metadata, connection = get_connection(database)
     create_table_games_lineups(engine, metadata)
+    create_table_watermarks(engine, metadata)
 
     # column names for plays_raw table
     columns = ['game_id', 'team_id', 'player_id', 'role']
@@ -152,8 +140,17 @@ if __name__ == '__main__':
     # create game index for accessing website
     game_ids = games['game_id']
 
-    # skip games that have already been scraped
-    if SKIP_SCRAPED_GAMES:
+    # games after the last one scraped at the previous run
+    new_games = get_new_games(engine, metadata, 'games_lineups')
+
+    if INCREMENTAL:
+        # only scrape new games, clearing any rows an unfinished run left for them
+        game_ids = new_games['game_id']
+
+        selectable = get_delete_query(metadata, engine, 'games_lineups', 'game_id', game_ids)
+        connection.execute(selectable)
+    elif SKIP_SCRAPED_GAMES:
+        # skip games that have already been scraped
         selectable = get_column_query(metadata, engine, 'games_lineups', 'game_id')
         skip_game_ids = pd.read_sql(sql=selectable, con=connection)['game_id']
 
@@ -163,12 +160,27 @@ if __name__ == '__main__':
         selectable = get_delete_query(metadata, engine, 'games_lineups', 'game_id', game_ids)
         connection.execute(selectable)
 
-    # defining threads
-    thread_local = threading.local()
+    # share one rate limited connection pool and page cache across all threads
+    fetcher = get_fetcher('games_lineups')
+
+    # games that couldn't be scraped, which the watermark mustn't move past
+    failed_games = []
+
+    # batch rows from all threads into larger writes
+    writer = BufferedWriter(name='games_lineups',
+                            sql_engine=engine,
+                            db_schema='nba',
+                            failed_games=failed_games)
 
     # scrape all lineups and write them to the DB
     write_all_lineups()
 
+    writer.close()
+    fetcher.close()
+
+    if INCREMENTAL:
+        update_watermark(engine, metadata, 'games_lineups', new_games, failed_games)
+
     # return to regular output writing
     sys.stdout.write('\n')
 
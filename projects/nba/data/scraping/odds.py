@@ -4,18 +4,19 @@ from modelling.projects.nba.utils import *  # import user defined utilities
 from modelling.projects.nba.data import *  # import data specific packages
 
 
-def get_max_page_number():
-    page = BeautifulSoup(driver.page_source, 'lxml')
+@timed
+def get_max_page_number(page_source):
+    page = BeautifulSoup(page_source, 'lxml')
     page_button = page.find('span', text=re.compile(r'»\|')).find_parent()
     output = int(page_button.get('x-page'))
 
-    log_performance()
     return output
 
 
-def get_raw_rows():
+@timed
+def get_raw_rows(page_source):
     # grab html data
-    soup = BeautifulSoup(driver.page_source, 'lxml')
+    soup = BeautifulSoup(page_source, 'lxml')
 
     # set type of rows to be scraped (Date and game data)
     rows = ['center nob-border', 'odd deactivate', 'deactivate']
@@ -23,150 +24,141 @@ def get_raw_rows():
     # get raw text from html
     output = [x.getText() for x in soup.find_all('tr', {'class': rows})]
 
-    log_performance()
     return output
 
 
-# Get game date for game_id
-def get_raw_date(x):
-    try:
-        formatted_date = dt.strptime(x, '%d %b %Y')
-        output = formatted_date.strftime('%Y%m%d')
-    except ValueError:
-        output = None
-
-    log_performance()
-    return output
+# date rows start with the date, and game rows with the kick off time then 'home team - away team'
+date_pattern = re.compile(r'^(?P<date>\d{2} \w{3} \d{4})')
+game_pattern = re.compile(r'^(?P<time>\d{2}:\d{2})(?P<home_name>.+?) - (?P<rest>.*)$')
 
+# odds after the score, each read up to 2 decimal places as the home and away odds are not separated
+odds_pattern = re.compile(r'^(?P<home_odds>[^.]*\..{0,2})(?P<away_odds>[^.]*\..{0,2})?')
 
-# Convert scraped date to Western US Time (note that odds portal timezone selection is unreliable)
-def convert_date(df_1, df_2, x):
-    try:
-        formatted_datetime = dt.strptime(df_2[x] + left(df_1[x], 5), '%Y%m%d%H:%M')
-        default_timezone = pytz.timezone("Etc/GMT")
-        target_timezone = pytz.timezone("US/Pacific")
-        updated_datetime = default_timezone.localize(formatted_datetime).astimezone(target_timezone)
-        output = updated_datetime.strftime('%Y%m%d')
-    except ValueError:
-        output = None
 
-    log_performance()
-    return output
+def get_game_scores(df):
+    """ 'home_score:away_score' for each game_id, as written in odds rows, e.g. '102:111' """
+    home_scores = df['home_score'].fillna(0).astype(int).astype(str)
+    away_scores = df['away_score'].fillna(0).astype(int).astype(str)
 
+    output = pd.Series((home_scores + ':' + away_scores).values, index=df['game_id'])
 
-# Get short team name for game_id
-def get_short_name(x):
-    try:
-        output = Team.team_ids[Team.full_names.index(mid(x, 5, x.find('-') - 6))]
-    except ValueError:
-        output = None
-
-    log_performance()
     return output
 
 
-def fix_game_id(name_series, date_series, old_name, new_name, valid_date):
-    output = [name_series[i] and name_series[i].replace(old_name, new_name)
-              if int(if_none(date_series[i], 0)) < valid_date
-              else name_series[i]
-              for i in range(len(name_series))]
+# Convert scraped date and time to the date in Western US Time (note that odds portal timezone selection is unreliable)
+@timed
+def get_odds_date(odds_raw, rows):
+    odds_date_gmt = pd.to_datetime(odds_raw.str.extract(date_pattern)['date'], format='%d %b %Y')
+    odds_date_gmt = odds_date_gmt.fillna(method='ffill')
+    odds_datetime = odds_date_gmt + pd.to_timedelta(rows['time'] + ':00')
+
+    output = odds_datetime.dt.tz_localize('Etc/GMT').dt.tz_convert('US/Pacific').dt.strftime('%Y%m%d')
 
-    log_performance()
     return output
 
 
-def get_game_id(raw_df, dates):
+@timed
+def get_game_id(rows, dates):
     # get short name for home team for game_id
-    short_names = [get_short_name(x) if mid(x, 2, 1) == ':' else None for x in raw_df]
+    short_names = rows['home_name'].map(Team.by_full_name).map(lambda team: team.team_id, na_action='ignore')
 
-    # fix for team names
-    short_names = fix_game_id(short_names, dates, 'NOP', 'NOH', 20130701)
-    short_names = fix_game_id(short_names, dates, 'BRK', 'NJN', 20120701)
-    short_names = fix_game_id(short_names, dates, 'CHO', 'CHA', 20140520)
+    # fix for teams listed under their current name for games before they were renamed
+    short_names = pd.Series([Team.get_team_id(team_id, float(date)) for team_id, date in zip(short_names, dates)],
+                            index=short_names.index)
 
     # get game_id
-    output = pd.Series(dates) + '0' + pd.Series(short_names)
+    output = dates + '0' + short_names
 
-    log_performance()
     return output
 
 
-def get_scores(df):
-    home_scores = df.game_id.map(games.set_index('game_id')['home_score']).fillna(0).astype(int)
-    away_scores = df.game_id.map(games.set_index('game_id')['away_score']).fillna(0).astype(int)
+@timed
+def get_odds(rows, scores):
+    # odds follow the final score, which is found from games as it runs straight into the odds
+    odds_text = pd.Series([rest.partition(score)[2] for rest, score in zip(rows['rest'].fillna(''), scores)])
 
-    output = [str(home_scores[i]) + ':' + str(away_scores[i]) for i in range(len(home_scores))]
+    output = odds_text.str.extract(odds_pattern)
 
-    log_performance()
     return output
 
 
-# Get odds for home team
-def get_home_odds(df, scores, x):
-    try:
-        odds_data = right(df[x], len(df[x]) - df[x].find(scores[x]) - len(scores[x]))
-        output = left(odds_data, odds_data.find('.') + 3)
-    except TypeError:
-        output = None
-
-    log_performance()
-    return output
-
-
-# Get odds for away team
-def get_away_odds(df, scores, x):
-    try:
-        odds_data = right(df[x], len(df[x]) - df[x].find(scores[x]) - len(scores[x]))
-        home_odds = left(odds_data, odds_data.find('.') + 3)
-        trimmed_odds_data = right(odds_data, len(odds_data) - len(home_odds))
-        output = left(trimmed_odds_data, trimmed_odds_data.find('.') + 3)
-    except TypeError:
-        output = None
+def get_odds_data(seasons):
+    # each browser in the pool takes a season or page from the queue until all have been scraped
+    pool = BrowserPool(size=browser_pool_size)
 
-    log_performance()
-    return output
+    failed = run_browser_tasks(pool=pool,
+                               tasks=[(season, 1) for season in seasons],
+                               task_function=get_season_page)
 
+    pool.close()
 
-def get_odds_data(seasons):
-    # map get_season_data onto list of seasons
-    for i in seasons:
-        get_season_data(i)
+    # keep the pages scraped for seasons that are missing some, but stop the run so they aren't taken as complete
+    incomplete_seasons = write_incomplete_seasons(failed)
 
     # return to regular output writing
     sys.stdout.write('\n')
 
+    if incomplete_seasons:
+        raise RuntimeError(f'Odds for seasons {incomplete_seasons} are missing pages {sorted(failed)}, '
+                           f'so scrape them again with SKIP_SCRAPED_GAMES off')
+
     print(Colour.green + 'Odds Data Loaded' + ' ' + str('{0:.2f}'.format(time.time() - start_time))
           + ' seconds taken' + Colour.end)
 
 
-@retry(ElementNotInteractableException, tries=5, delay=1)
-def get_page_data(page_number):
-    driver.find_element_by_xpath(f"//span[text()='{page_number}']").click()
+def get_season_url(season):
+    output = f'https://www.oddsportal.com/basketball/usa/nba-{season-1}-{season}/results/'
+
+    return output
+
+
+@timed
+def load_page(driver, season, page_number):
+    url = get_season_url(season)
+    page_url = url if page_number == 1 else url + f'#/page/{page_number}/'
+
+    # a browser already on this season only changes the page anchor, so reload to get the new page's table
+    same_season = driver.current_url.startswith(url)
+    driver.get(page_url)
+
+    if same_season:
+        driver.refresh()
+
+    # wait for game rows, which are loaded after the rest of the page
+    wait_for(driver, '#tournamentTable tr.deactivate')
 
-    time.sleep(1)
+    output = driver.page_source
 
+    return output
+
+
+@timed
+def get_page_data(page_source):
     # initialise df
     page_odds = pd.DataFrame(columns=columns)
 
     # get raw rows
-    odds_raw = get_raw_rows()
+    odds_raw = get_raw_rows(page_source)
 
     # remove OT indicator
-    odds_raw = pd.Series(odds_raw).str.replace(r'\sOT', '')
+    odds_raw = pd.Series(odds_raw, dtype=object).str.replace(r'\sOT', '')
+
+    # split game rows into kick off time, home team, and the rest of the row
+    rows = odds_raw.str.extract(game_pattern)
 
     # set a date for each row, then convert to Western US timezone
-    odds_date_gmt = pd.Series([get_raw_date(left(x, 11)) for x in odds_raw]).fillna(method='ffill')
-    odds_date = [convert_date(odds_raw, odds_date_gmt, i) for i in range(len(odds_raw))]
+    odds_date = get_odds_date(odds_raw, rows)
 
     # get game_ids
-    page_odds.game_id = get_game_id(odds_raw, odds_date)
+    page_odds.game_id = get_game_id(rows, odds_date)
 
     # get game scores to help scrape from raw text
-    scores = get_scores(page_odds)
+    scores = page_odds['game_id'].map(game_scores).fillna('0:0')
 
     # get odds
-    page_odds.home_odds = [get_home_odds(odds_raw, scores, x) for x in range(len(odds_raw))]
-    page_odds.away_odds = [get_away_odds(odds_raw, scores, x) for x in range(len(odds_raw))]
+    odds = get_odds(rows, scores)
+    page_odds.home_odds = odds['home_odds']
+    page_odds.away_odds = odds['away_odds']
 
     # convert to numeric and clear any dirty data
     page_odds['home_odds'] = pd.to_numeric(page_odds['home_odds'], errors='coerce')
@@ -174,40 +166,36 @@ def get_page_data(page_number):
     page_odds.loc[page_odds['home_odds'].isnull(), 'away_odds'] = None
 
     # keep only games in the games folder (i.e. excluding All-Star and Pre-season)
-    output = page_odds.loc[page_odds['game_id'].isin(games['game_id'])]
+    output = page_odds.loc[page_odds['game_id'].isin(game_scores.index)]
 
-    log_performance()
     return output
 
 
-def get_season_data(season):
-    # initialise season DataFrame
-    season_odds = pd.DataFrame(columns=columns)
-
-    # get season url
-    url = f'https://www.oddsportal.com/basketball/usa/nba-{season-1}-{season}/results/'
+def get_season_page(driver, task, add_task):
+    """ scrape a page of a season's odds, queueing the season's other pages from its first page """
+    season, page_number = task
+    page_source = load_page(driver, season, page_number)
 
-    # go to season page
-    driver.get(url)
+    if page_number == 1:
+        max_page_number = get_max_page_number(page_source)
+        season_pages[season] = {'pages': max_page_number, 'odds': {}}
 
-    # start from page 1
-    page_number = 1
+        [add_task((season, i)) for i in range(2, max_page_number + 1)]
 
-    # find max page number for season
-    max_page_number = get_max_page_number()
-    while page_number <= max_page_number:
-        page_odds = get_page_data(page_number)
+    page_odds = get_page_data(page_source)
 
-        season_odds = season_odds.append(page_odds)
+    with season_lock:
+        season_pages[season]['odds'][page_number] = page_odds
+        done = len(season_pages[season]['odds']) == season_pages[season]['pages']
 
-        progress(iteration=page_number - 1,
-                 iterations=max_page_number,
-                 iteration_name=str(season) + ' Season',
-                 lapsed=time_lapsed(),
-                 sql_status='')
+    # write each season once all of its pages are in
+    if done:
+        write_season_data(season)
 
-        page_number += 1
 
+def write_season_data(season):
+    pages = season_pages.pop(season)['odds']
+    season_odds = pd.concat([pages[i] for i in sorted(pages)])
     season_odds = season_odds.drop_duplicates(ignore_index=True)
 
     write_data(df=season_odds,
@@ -217,6 +205,25 @@ def get_season_data(season):
                if_exists='append',
                index=False)
 
+    with season_lock:
+        seasons_done.append(season)
+
+        progress(iteration=len(seasons_done) - 1,
+                 iterations=len(season_range),
+                 iteration_name=str(season) + ' Season',
+                 lapsed=time_lapsed(),
+                 sql_status='')
+
+
+def write_incomplete_seasons(failed):
+    """ write the pages that were scraped for seasons with pages that failed, returning those seasons """
+    output = sorted(set([season for season, page_number in failed]))
+
+    # a season whose first page failed has no pages to write
+    [write_season_data(season) for season in output if season in season_pages]
+
+    return output
+
 
 if __name__ == '__main__':
     engine, metadata, connection = get_connection(database)
@@ -229,6 +236,9 @@ if __name__ == '__main__':
                       sql_engine=engine,
                       meta=metadata)
 
+    # index of each game's score, looked up for every row scraped
+    game_scores = get_game_scores(games)
+
     season_range = pd.Series(range(start_season_odds, end_season_odds + 1))
 
     if SKIP_SCRAPED_GAMES:
@@ -247,10 +257,12 @@ if __name__ == '__main__':
         selectable = get_delete_query(metadata, engine, 'odds', 'game_id', game_ids)
         connection.execute(selectable)
 
-    # using selenium web driver as requests seem to return 'page not found' issues
-    driver = webdriver.Chrome(executable_path=str(ROOT_DIR) + "/utils/chromedriver.exe",
-                              options=options)
+    # pages of each season scraped so far, and seasons written, shared by the browser threads
+    season_pages = {}
+    seasons_done = []
+    season_lock = threading.Lock()
 
+    # using selenium web drivers as requests seem to return 'page not found' issues
     get_odds_data(season_range)
 
-    driver.quit()
+    write_performance()
@@ -4,65 +4,66 @@ from modelling.projects.nba.utils import *  # import user defined utilities
 from modelling.projects.nba.data import *  # import data specific packages
 
 
+@timed
 def get_player_name(html):
     output = html.find('h1', {'itemprop': 'name'}).text.replace('\n', '')
 
-    log_performance()
     return output
 
 
+@timed
 def get_player_dob(html):
     output = html.find('span', {'itemprop': 'birthDate'}).get('data-birth')
 
-    log_performance()
     return output
 
 
+@timed
 def get_player_height(html):
     height = html.find('span', {'itemprop': 'height'}).text
     inches = int(left(height, 1))*12 + int(re.search(r'-(\d+)', height).group(1))
     output = int(inches*2.54)
 
-    log_performance()
     return output
 
 
+@timed
 def get_player_weight(html):
     weight = html.find('span', {'itemprop': 'weight'}).text
     pounds = int(re.search(r'(\d+)lb', weight).group(1))
     output = int(pounds/2.205)
 
-    log_performance()
     return output
 
 
+@timed
 def get_player_hand(html):
     # the line with position contains players shooting hand
     output = html.find('strong', text=re.compile(r'Shoots:')).next_sibling.strip()
 
-    log_performance()
     return output
 
 
+@timed
 def get_player_position(html):
     raw = html.find('strong', text=re.compile(r'Position:')).next_sibling
     output = positions[raw.split()[0]]
 
-    log_performance()
     return output
 
 
 # need to add undrafted exception
+@timed
 def get_drafted_year(html):
     try:
         output = html.find('a', text=re.compile(r' NBA Draft')).text.split()[0]
     except AttributeError:
         output = None
 
-    log_performance()
     return output
 
 
+@timed
 def get_draft_pick(html):
     try:
         raw = html.find('a', text=re.compile(r' NBA Draft')).previous_sibling
@@ -70,11 +71,11 @@ def get_draft_pick(html):
     except AttributeError:
         output = None
 
-    log_performance()
     return output
 
 
 # need to add no debut exception
+@timed
 def get_rookie_year(html):
     try:
         raw = html.find('strong', text=re.compile(r'NBA Debut:')).next_sibling.get('href')
@@ -90,51 +91,38 @@ def get_rookie_year(html):
     except AttributeError:
         output = None
 
-    log_performance()
     return output
 
 
+@timed
 def get_player_url_list(series):
     initial = [left(i, 1) for i in series]
     output = [f'players/{initial[i]}/{series[i]}.html' for i in range(len(series))]
 
     print(Colour.green + 'Generated list of URLs' + Colour.end)
 
-    log_performance()
     return output
 
 
-# open session for each thread
-def get_session():
-    if not hasattr(thread_local, "session"):
-        thread_local.session = r.session()
-    else:
-        pass
-    return thread_local.session
+@timed
+def get_page_content(url):
+    page = fetcher.get(url)
+    output = BeautifulSoup(page, 'lxml')
 
-
-def get_page_content(url, session):
-    page = session.get(url)
-    output = BeautifulSoup(page.content, 'lxml')
-
-    log_performance()
     return output
 
 
+@timed
 def get_player_info(soup):
     output = soup.find('div', {'itemtype': 'https://schema.org/Person'})
 
-    log_performance()
     return output
 
 
 def write_player_data(iteration):
-    # open session for thread
-    session = get_session()
-
     url = 'https://www.basketball-reference.com/' + url_list[iteration]
 
-    page = get_page_content(url, session)
+    page = get_page_content(url)
 
     player_info = get_player_info(page)
 
@@ -163,12 +151,8 @@ def write_player_data(iteration):
 
     df = pd.DataFrame([player], columns=columns)
 
-    status = write_data(df=df,
-                        name='players',
-                        sql_engine=engine,
-                        db_schema='nba',
-                        if_exists='append',
-                        index=False)
+    # add to the batch of rows to be written, and get status of the latest write
+    status = writer.write(df)
 
     progress(iteration=iteration,
              iterations=len(url_list),
@@ -179,7 +163,7 @@ def write_player_data(iteration):
 
 def write_all_players():
     iterations = range(len(url_list))
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
         executor.map(write_player_data, iterations)
         executor.shutdown()
 
@@ -215,12 +199,20 @@ if __name__ == '__main__':
     # get list of urls
     url_list = get_player_url_list(player_list)
 
-    # defining threads
-    thread_local = threading.local()
+    # share one rate limited connection pool and page cache across all threads
+    fetcher = get_fetcher('players')
+
+    # batch rows from all threads into larger writes
+    writer = BufferedWriter(name='players',
+                            sql_engine=engine,
+                            db_schema='nba')
 
     # scrape all lineups and write them to the DB
     write_all_players()
 
+    writer.close()
+    fetcher.close()
+
     # return to regular output writing
     sys.stdout.write('\n')
 
@@ -4,97 +4,83 @@ from modelling.projects.nba.utils import *  # import user defined utilities
 from modelling.projects.nba.data import *  # import data specific packages
 
 
-# get the nth player_id from a play
-def get_player_id(x, n):
-    # get all rows
-    row_elements = x.findChildren('td')
+# get the first three player_ids from a play
+def get_player_ids(row):
+    # get the links in each cell that has any
+    links = [[a.get('href', '') for a in cell.iter('a')] for cell in row.iter('td')]
+    links = [cell_links for cell_links in links if cell_links]
 
-    # get all associated href elements (which include player_id in link)
-    href_elements = [y.findChildren('a') for y in row_elements if y.findChildren('a')]
+    output = [None, None, None]
 
-    # extract player_id if there is a href link
-    try:
-        url = [player[n].get('href') for player in href_elements]
-        output = re.search(r'players/\w/(.*).html', url[0]).group(1)
-    except (IndexError, AttributeError):
-        output = None
+    # the nth player is only read if every cell with links has at least n links, as the original parser did
+    if links:
+        for n in range(min(min([len(i) for i in links]), len(output))):
+            player = re.search(r'players/\w/(.*).html', links[0][n])
+            output[n] = player.group(1) if player else None
 
-    log_performance()
     return output
 
 
-# open session for each thread
-def get_session():
-    if not hasattr(thread_local, "session"):
-        thread_local.session = r.session()
-    else:
-        pass
-    return thread_local.session
+# get url of play by play page
+def get_page_url(game_id):
+    output = f'https://www.basketball-reference.com/boxscores/pbp/{game_id}.html'
+
+    return output
 
 
 # get contents of page
-def get_page_content(game_id, session):
-    # get url
-    url = f'https://www.basketball-reference.com/boxscores/pbp/{game_id}.html'
-
-    page = session.get(url)
-    output = BeautifulSoup(page.content, 'lxml')
+@timed
+def get_page_content(game_id):
+    page = fetcher.get(get_page_url(game_id))
+    output = parse_page(page)
 
-    log_performance()
     return output
 
 
-# get play by play table from soup
-def get_table_content(soup):
-    output = soup.find('table', {'id': 'pbp'})
+# get play by play table from page
+@timed
+def get_table_content(tree):
+    output = tree.find('.//table[@id="pbp"]')
 
-    log_performance()
     return output
 
 
-def get_raw_plays(soup):
-    # raw plays
-    plays = [x.getText() for x in soup.find_all('tr')]
+@timed
+def get_raw_plays(table):
+    # read the text and player_ids of each row in a single pass over the table
+    output = [(row.text_content(), *get_player_ids(row)) for row in table.iter('tr')]
 
-    # scrape first player_id
-    player_1 = [get_player_id(x, 0) for x in soup.find_all('tr')]
+    return output
 
-    # scrape second player_id
-    player_2 = [get_player_id(x, 1) for x in soup.find_all('tr')]
 
-    # scrape third player_id
-    player_3 = [get_player_id(x, 2) for x in soup.find_all('tr')]
+def get_game_plays_raw(tree, game_id):
+    # get play by play table html from page
+    table = get_table_content(tree)
 
-    output = list(zip(plays, player_1, player_2, player_3))
+    # scrape the raw plays and tidy the dataframe
+    output = get_raw_plays(table)
+    output = pd.DataFrame(output, columns=['plays', 'player_1', 'player_2', 'player_3'])
+    output['game_id'] = game_id
 
-    log_performance()
     return output
 
 
 def write_raw_plays(iteration):
-    # open session for thread
-    session = get_session()
-
     # get game_id
     game_id = game_ids[iteration]
 
-    # get page html for game
-    soup = get_page_content(game_id, session)
-
-    # get play by play table html from page
-    table = get_table_content(soup)
-
-    # scrape the raw plays and tidy the dataframe
-    game_plays = get_raw_plays(table)
-    game_plays = pd.DataFrame(game_plays, columns=['plays', 'player_1', 'player_2', 'player_3'])
-    game_plays['game_id'] = game_id
+    # get page html for game, then the raw plays in it, keeping track of games that fail so they are tried again
+    try:
+        tree = get_page_content(game_id)
+        game_plays = get_game_plays_raw(tree, game_id)
+    except Exception as e:
+        failed_games.append(game_id)
+        sys.stdout.write('\n')
+        print(Colour.red + f'Could not scrape {game_id}: {e!r}' + Colour.end)
+        return
 
-    status = write_data(df=game_plays,
-                        name='plays_raw',
-                        sql_engine=engine_raw,
-                        db_schema='nba_raw',
-                        if_exists='append',
-                        index=False)
+    # add to the batch of rows to be written, and get status of the latest write
+    status = writer.write(game_plays)
 
     progress(iteration=iteration,
              iterations=len(game_ids),
@@ -105,7 +91,7 @@ def write_raw_plays(iteration):
 
 def write_all_raw_plays():
     iterations = range(len(game_ids))
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_concurrency) as executor:
         executor.map(write_raw_plays, iterations)
         executor.shutdown()
 
@@ -114,6 +100,7 @@ if __name__ == '__main__':
     engine, metadata, connection = get_connection(database)
     engine_raw, metadata_raw, connection_raw = get_connection(database_raw)
     create_table_plays_raw(engine_raw, metadata_raw)
+    create_table_watermarks(engine, metadata)
 
     # column names for plays_raw table
     columns = ['plays', 'player_1', 'player_2', 'player_3', 'game_id']
@@ -122,8 +109,17 @@ if __name__ == '__main__':
     selectable = get_column_query(metadata, engine, 'games', 'game_id')
     game_ids = pd.read_sql(sql=selectable, con=connection)['game_id']
 
-    # skip games that have already been scraped
-    if SKIP_SCRAPED_GAMES:
+    # games after the last one scraped at the previous run
+    new_games = get_new_games(engine, metadata, 'plays_raw')
+
+    if INCREMENTAL:
+        # only scrape new games, clearing any rows an unfinished run left for them
+        game_ids = new_games['game_id']
+
+        selectable = get_delete_query(metadata_raw, engine_raw, 'plays_raw', 'game_id', game_ids)
+        connection_raw.execute(selectable)
+    elif SKIP_SCRAPED_GAMES:
+        # skip games that have already been scraped
         selectable = get_column_query(metadata_raw, engine_raw, 'plays_raw', 'game_id')
         skip_games = pd.read_sql(sql=selectable, con=connection_raw)['game_id']
 
@@ -133,12 +129,27 @@ if __name__ == '__main__':
         selectable = get_delete_query(metadata_raw, engine_raw, 'plays_raw', 'game_id', game_ids)
         connection_raw.execute(selectable)
 
-    # defining threads
-    thread_local = threading.local()
+    # share one rate limited connection pool and page cache across all threads
+    fetcher = get_fetcher('plays_raw')
+
+    # games that couldn't be scraped, which the watermark mustn't move past
+    failed_games = []
+
+    # batch rows from all threads into larger writes
+    writer = BufferedWriter(name='plays_raw',
+                            sql_engine=engine_raw,
+                            db_schema='nba_raw',
+                            failed_games=failed_games)
 
     # scrape all lineups and write them to the DB
     write_all_raw_plays()
 
+    writer.close()
+    fetcher.close()
+
+    if INCREMENTAL:
+        update_watermark(engine, metadata, 'plays_raw', new_games, failed_games)
+
     # return to regular output writing
     sys.stdout.write('\n')
 
@@ -0,0 +1 @@
+""" Tests checking rewritten parsing and cleaning steps against the original implementations """
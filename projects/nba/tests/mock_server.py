@@ -0,0 +1,89 @@
+# LOCAL SERVER FOR TESTING AND BENCHMARKING THE FETCH ENGINE
+from modelling.projects import time
+from modelling.projects.nba.utils.fetch import FetchEngine
+import asyncio
+import threading
+from aiohttp import web
+
+
+class MockServer:
+    """ local HTTP server returning a fixed page after a delay, to test and benchmark fetching offline """
+    def __init__(self, latency=0.1, page=b'<html><body><table id="pbp"></table></body></html>', status=200,
+                 headers=None):
+        self.latency = latency
+        self.page = page
+        self.status = status
+        self.headers = headers
+        self.requests = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='MockServer', daemon=True)
+        self.thread.start()
+
+        self.port = asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+        self.url = f'http://127.0.0.1:{self.port}'
+
+    async def handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return web.Response(body=self.page, status=self.status, headers=self.headers, content_type='text/html')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/{path:.*}', self.handle)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+
+        # bind to any free port
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+
+        output = self.runner.addresses[0][1]
+        return output
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def benchmark_fetch(pages=200, latency=0.1, threads=2, concurrency=8, rate=1000):
+    """ compare the thread pool of requests sessions against FetchEngine on a local mock server """
+    import concurrent.futures
+    import requests as r
+
+    server = MockServer(latency=latency)
+    urls = [f'{server.url}/boxscores/pbp/{i}.html' for i in range(pages)]
+
+    # current path, a requests session per thread
+    thread_local = threading.local()
+
+    def get_page(url):
+        if not hasattr(thread_local, 'session'):
+            thread_local.session = r.session()
+        return thread_local.session.get(url).content
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(get_page, urls))
+    threaded = time.perf_counter() - start
+
+    fetcher = FetchEngine(concurrency=concurrency, rate=rate, burst=concurrency)
+    start = time.perf_counter()
+    fetcher.get_all(urls)
+    engine = time.perf_counter() - start
+    fetcher.close()
+
+    server.close()
+
+    output = {'threaded': threaded, 'engine': engine}
+    print(f'{pages} pages at {latency} seconds latency: {threads} threads {threaded:.2f} seconds, '
+          f'fetch engine {engine:.2f} seconds')
+
+    return output
+
+
+if __name__ == '__main__':
+    benchmark_fetch()
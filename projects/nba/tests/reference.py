@@ -0,0 +1,630 @@
+# ORIGINAL IMPLEMENTATIONS, KEPT TO CHECK THE REWRITTEN ONES AGAINST
+from modelling.projects.nba import *  # import broadly used python packages
+from modelling.projects.nba.utils.functions import if_none, left
+
+# home and away team of the game being cleaned, originally set as a global when reading each game's raw plays
+team_names = None
+
+
+# get the nth player_id from a play, as originally parsed with BeautifulSoup
+def get_player_id(x, n):
+    # get all rows
+    row_elements = x.findChildren('td')
+
+    # get all associated href elements (which include player_id in link)
+    href_elements = [y.findChildren('a') for y in row_elements if y.findChildren('a')]
+
+    # extract player_id if there is a href link
+    try:
+        url = [player[n].get('href') for player in href_elements]
+        output = re.search(r'players/\w/(.*).html', url[0]).group(1)
+    except (IndexError, AttributeError):
+        output = None
+
+    return output
+
+
+def get_raw_plays_soup(soup):
+    """ original BeautifulSoup parser of the play by play table """
+    # raw plays
+    plays = [x.getText() for x in soup.find_all('tr')]
+
+    # scrape first, second and third player_id
+    player_1 = [get_player_id(x, 0) for x in soup.find_all('tr')]
+    player_2 = [get_player_id(x, 1) for x in soup.find_all('tr')]
+    player_3 = [get_player_id(x, 2) for x in soup.find_all('tr')]
+
+    output = list(zip(plays, player_1, player_2, player_3))
+
+    return output
+
+
+# move row i to row j by copying every row in between, as originally done row by row
+def swap_rows(df, i, j, direction):
+    temp = df.loc[i].copy()
+
+    if direction == 'forward':
+        for row in range(i, j):
+            df.loc[row] = df.loc[row+1]
+
+        df.loc[j] = temp
+
+    elif direction == 'back':
+        for row in reversed(range(j, i+1)):
+            df.loc[row] = df.loc[row-1]
+
+        df.loc[j] = temp
+
+    return df, j
+
+
+def fix_jump_ball_order(df):
+    """ if jump ball comes before period start, swap the rows """
+    for i in df.index[df['event'] == 'Jump Ball']:
+        if df.loc[i+1, 'event'] == 'Period Start':
+            df, index = swap_rows(df, i, i+1, 'forward')
+
+    return df
+
+
+def fix_substitution_order(df):
+    """ if player subs on at the same time as performing an action, put the sub before the play """
+    # get all sub events and loop through
+    sub_events = df.loc[df['event'] == 'Substitution']
+
+    for row in sub_events.iterrows():
+        # find current position of sub event
+        i = df.index[(df['period'] == row[1]['period']) &
+                     (df['time'] == row[1]['time']) &
+                     (df['player_id'] == row[1]['player_id']) &
+                     (df['event'] == 'Substitution')][0]
+
+        # get relevant event details
+        event_period = df.loc[i, 'period']
+        event_time = df.loc[i, 'time']
+        subbed_in = df.loc[i, 'player_id']
+        subbed_out = df.loc[i, 'event_detail']
+
+        # fix for events after player subs out
+        events_out = df[(df['period'] == event_period) & (df['time'] == event_time) & (df.index > i)]
+
+        # get all events involving the player after subbing out
+        fix_table = events_out[((events_out['player_id'] == subbed_out) |
+                                (events_out['event_detail'] == subbed_out)) &
+                               ~events_out['event'].str.contains('foul')]
+
+        # use latest play to fix if fixing forwards
+        if not fix_table.empty:
+            # if another event involves the player subbing back in, skip it
+            fix_index = fix_table.index[(fix_table['player_id'] == subbed_out) &
+                                        (fix_table['event'] == 'Substitution')]
+
+            # set sub to after the latest event
+            if fix_index.empty:
+                df, i = swap_rows(df, i, fix_table.index[len(fix_table)-1], 'forward')
+
+        # fix for events before player subbing in
+        events_in = df[(df['period'] == event_period) & (df['time'] == event_time) & (df.index < i)]
+
+        # get all events involving the player before subbing in
+        fix_table = events_in[((events_in['player_id'] == subbed_in) |
+                               (events_in['event_detail'] == subbed_in)) &
+                              ~events_in['event'].str.contains('foul')]
+
+        # use earliest play to fix if fixing backwards
+        if not fix_table.empty:
+            # if player was just subbed out, then set to play after
+            fix_index = fix_table.index[(fix_table['event_detail'] == subbed_in) &
+                                        (fix_table['event'] == 'Substitution')] + 1
+
+            if fix_index.empty:
+                # set sub to before the earliest event
+                df, i = swap_rows(df, i, fix_table.index[0], 'back')
+
+    return df
+
+
+# get the period of the game based on the 'start of period' line
+def get_quarter(play):
+    period = re.search(r'Start of (.*)', play).group(1)
+    if 'overtime' in period:
+        output = 'OT' + str(left(period, 1))
+    else:
+        output = re.search(r'(.*) quarter', period).group(1)
+
+    return output
+
+
+def get_team_id(row, reverse=False):
+    # set as initial team_id
+    output = row['teams']
+
+    # in some cases (steals, blocks, some fouls), the play appears on the 'wrong' side
+    if reverse:
+        output = list(team_names.values())[team_names['home_team'] == output]
+
+    return output
+
+
+# GET EVENT_DETAIL FOR SHOTS
+# get the amount of points a shot was worth
+def get_shot_value(play):
+    if 'free throw' in play:
+        # FTs worth 1 point
+        output = 1
+    elif match := re.search(r'(\d)-pt', play):
+        # FGs worth amount given in play
+        output = match.group(1)
+    else:
+        output = None
+
+    return output
+
+
+# get distance of shot, or which free throw it was
+def get_shot_detail(play):
+    if match := re.search(r'free throw (\d)', play):
+        # get which number in sequence of FTs
+        output = match.group(1)
+    elif 'technical' in play:
+        # get if technical FT
+        output = 1
+    elif match := re.search(r'(\d+) ft', play):
+        # get distance of shot if FG
+        output = match.group(1)
+    else:
+        output = 0
+
+    return output
+
+
+# PRODUCE ROWS FOR EACH DIFFERENT TYPE OF EVENT
+# Produce the 'Period Start' line in order to get the correct period
+def get_period_start(row):
+    play = row['plays']
+    game_id = row['game_id']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              get_quarter(play),  # period
+              row['time'],  # time
+              None,  # score
+              None,  # team_id
+              None,  # player_id
+              'Period Start',  # event
+              None,  # event_value
+              None,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+# Produce the 'Period End' line in order to get the correct period end
+def get_period_end(row):
+    game_id = row['game_id']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              '0:00',  # time
+              None,  # score
+              None,  # team_id
+              None,  # player_id
+              'Period End',  # event
+              None,  # event_value
+              None,  # event_detail
+              1  # possession
+              ]
+
+    return output
+
+
+# get data for a jump ball
+def get_jump_ball_data(games_lineups, row):
+    game_id = row['game_id']
+    player_1 = row['player_1']
+    player_2 = row['player_2']
+    player_3 = row['player_3']
+    # find team that controlled the tip
+    try:
+        winning_team_id = games_lineups.team_id[(games_lineups.game_id == game_id) &
+                                                (games_lineups.player_id == player_3)].item()
+    # very rare issue where jump ball ends out of bounds, just default to home team
+    except ValueError:
+        winning_team_id = get_team_id(row)
+    # find which player from that team competed for the jump ball
+    winning_team_players = games_lineups.player_id[(games_lineups.game_id == game_id) &
+                                                   (games_lineups.team_id == winning_team_id) &
+                                                   (games_lineups.player_id == player_1)]
+    # if player_id found in winning team, then sat that player as player_id, then set other as event_detail
+    if len(winning_team_players) > 0:
+        winning_player_id = player_1
+        losing_player_id = player_2
+    else:
+        winning_player_id = player_2
+        losing_player_id = player_1
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              winning_team_id,  # team_id
+              winning_player_id,  # player_id
+              'Jump Ball',  # event
+              1,  # event_value
+              losing_player_id,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+# get necessary data for a shot attempt
+def get_shot_attempt_data(row, shot_type):
+    game_id = row['game_id']
+    play = row['plays']
+    player_id = row['player_1']
+
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              str(shot_type) + ' Shot',  # event
+              get_shot_value(play),  # event_value
+              get_shot_detail(play),  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+# get necessary data for a made shot
+def get_shot_make_data(row, shot_type):
+    game_id = row['game_id']
+    play = row['plays']
+    player_id = row['player_1']
+
+    # flag end of possession
+    possession = 1
+    # FT end of possession if the final shot of a sequence
+    if shot_type == 'FT' and 'technical' not in row['plays']:
+        sequence = re.search(r'(\d) of \d', play).group(1)
+        ft_number = re.search(r'\d of (\d)', play).group(1)
+        possession = possession * (sequence == ft_number)
+
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              str(shot_type) + ' Make',  # event
+              get_shot_value(play),  # event_value
+              get_shot_detail(play),  # event_detail
+              possession  # possession
+              ]
+
+    return output
+
+
+# get necessary data for a missed shot
+def get_shot_miss_data(row, shot_type):
+    game_id = row['game_id']
+    play = row['plays']
+    player_id = row['player_1']
+
+    # flag end of possession
+    possession = 1
+    # FT end of possession if the final shot of a sequence
+    if shot_type == 'FT' and 'technical' not in row['plays']:
+        sequence = re.search(r'(\d) of \d', play).group(1)
+        ft_number = re.search(r'\d of (\d)', play).group(1)
+        possession = possession * (sequence == ft_number)
+
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              str(shot_type) + ' Miss',  # event
+              get_shot_value(play),  # event_value
+              get_shot_detail(play),  # event_detail
+              possession  # possession
+              ]
+
+    return output
+
+
+# get which player assisted if there was a made shot
+def get_assist_data(row):
+    game_id = row['game_id']
+    shooter_id = row['player_1']
+    player_id = row['player_2']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              'Assist',  # event
+              1,  # event_value
+              shooter_id,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+# get which player blocked a shot
+def get_block_data(row):
+    game_id = row['game_id']
+    shooter_id = row['player_1']
+    player_id = row['player_2']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row, True),  # team_id
+              player_id,  # player_id
+              'Block',  # event
+              1,  # event_value
+              shooter_id,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+# combine all shot related information to produce detailed rows of data
+def get_shot_data(row):
+    play = row['plays']
+    output = []
+    # label FT or FG
+    if 'free throw' in play:
+        shot_type = 'FT'
+    else:
+        shot_type = 'FG'
+
+    # get row for shot attempt
+    shot = get_shot_attempt_data(row, shot_type)
+
+    # get row for shot miss
+    if ' misses' in play:
+        miss = get_shot_miss_data(row, shot_type)
+        output = [shot] + [miss]
+
+        # get row for block if shot blocked
+        if 'block by' in play:
+            block = get_block_data(row)
+            output = [shot] + [miss] + [block]
+
+    # get row for shot make
+    elif ' makes' in play:
+        make = get_shot_make_data(row, shot_type)
+        output = [shot] + [make]
+
+        # get row for assist if applicable
+        if 'assist by' in play:
+            assist = get_assist_data(row)
+            output = [shot] + [make] + [assist]
+
+    return output
+
+
+# get who rebounded the ball, with whose shot they rebounded
+def get_rebound_data(row, last_row, second_last_row):
+    game_id = row['game_id']
+    play = row['plays']
+    last_play = last_row['plays']
+    player_id = row['player_1']
+
+    # there is a bug with rare missing shot info, or sub occurs after FT miss so the shooter isn't picked up
+    if any(x in last_play for x in [' misses', 'block by']):
+        shooter = last_row['player_1']
+    elif any(x in second_last_row['plays'] for x in [' misses', 'block by']):
+        shooter = second_last_row['player_1']
+    else:
+        shooter = None
+
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              re.search(r'(.*) rebound', play).group(0),  # event
+              1,  # event_value
+              shooter,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+def get_turnover_data(row):
+    game_id = row['game_id']
+    play = row['plays']
+    player_id = row['player_1']
+    detail = if_none(re.search(r'\((.*);', play), re.search(r'\((.*)\)', play))
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              'Turnover',  # event
+              1,  # event_value
+              detail.group(1),  # event_detail
+              1  # possession
+              ]
+
+    return output
+
+
+def get_steal_data(row):
+    game_id = row['game_id']
+    turnover_player_id = row['player_1']
+    player_id = row['player_2']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row, True),  # team_id
+              player_id,  # player_id
+              'Steal',  # event
+              1,  # event_value
+              turnover_player_id,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+def get_foul_data(row):
+    game_id = row['game_id']
+    play = row['plays']
+    player_id = row['player_1']
+    fouled_player_id = row['player_2']
+
+    # find foul types which should 'reverse' the team_id
+    reversed_fouls = ['Away from play foul',
+                      'Clear path foul',
+                      'Def 3 sec tech foul',
+                      'Double technical foul',
+                      'Elbow foul',
+                      'Flagrant foul',
+                      'Hanging tech foul',
+                      'Ill def tech foul',
+                      'Inbound foul',
+                      'Non unsport tech foul',
+                      'Offensive charge foul',
+                      'Personal foul',
+                      'Personal block foul',
+                      'Personal take foul',
+                      'Shooting foul',
+                      'Shooting block foul',
+                      'Taunting technical foul']
+    event = re.search(r'(.*) foul', play).group(0)
+    reverse = any(x in event for x in reversed_fouls)
+
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row, reverse),  # team_id
+              player_id,  # player_id
+              event,  # event
+              1,  # event_value
+              fouled_player_id,  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+def get_violation_data(row):
+    game_id = row['game_id']
+    play = row['plays']
+    player_id = row['player_1']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              'Violation',  # event
+              1,  # event_value
+              re.search(r'\((.*)\)', play).group(1),  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+def get_substitution_data(row):
+    game_id = row['game_id']
+    player_id = row['player_1']
+    sub_player_id = row['player_2']
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              player_id,  # player_id
+              'Substitution',  # event
+              1,  # event_value
+              sub_player_id,  # event_detail
+              0  # possession
+              ]
+
+    if sub_player_id is None:
+        output = []
+
+    return output
+
+
+def get_timeout_data(row):
+    game_id = row['game_id']
+    play = row['plays']
+    detail = re.search(r'(20 second|full|Official|no) timeout', play).group(1)
+    output = [None,  # play_id
+              game_id,  # game_id,
+              None,  # period
+              row['time'],  # time
+              None,  # score
+              get_team_id(row),  # team_id
+              None,  # player_id
+              'Timeout',  # event
+              1,  # event_value
+              detail.capitalize(),  # event_detail
+              0  # possession
+              ]
+
+    return output
+
+
+# iterate through plays to produce base event details
+def clean_plays(cols, games_lineups, df):
+    output = []
+    for i in range(len(df)):
+        play = df.loc[i, 'plays']
+        row = df.loc[i]
+        if 'Start of ' in play:
+            output = output + [get_period_start(row)]
+        elif 'End of ' in play:
+            output = output + [get_period_end(row)]
+        elif all(x in play for x in ['Jump ball', 'possession']):
+            output = output + [get_jump_ball_data(games_lineups, row)]
+        elif any(x in play for x in [' makes ', ' misses ']):
+            output = output + get_shot_data(row)
+        elif ' rebound ' in play:
+            output = output + [get_rebound_data(row, df.loc[i-1], df.loc[i-2])]
+        elif 'Turnover ' in play:
+            output = output + [get_turnover_data(row)]
+            if 'steal by' in play:
+                output = output + [get_steal_data(row)]
+        elif ' foul ' in play:
+            output = output + [get_foul_data(row)]
+        elif 'Violation' in play:
+            output = output + [get_violation_data(row)]
+        elif 'enters the game' in play:
+            output = [i for i in output + [get_substitution_data(row)] if i]
+        elif 'timeout' in play:
+            output = output + [get_timeout_data(row)]
+
+    output = pd.DataFrame(output, columns=cols)
+
+    return output
@@ -0,0 +1,18 @@
+# CHECK THAT TEAMS CAN BE SENT BETWEEN PROCESSES
+from modelling.projects.nba.utils.classes import Team
+import copy
+import pickle
+
+
+def test_teams_pickle_and_copy_to_the_same_team():
+    team = Team.by_id['NOP']
+
+    assert pickle.loads(pickle.dumps(team)) is team
+    assert copy.copy(team) is team
+    assert copy.deepcopy({'home_team': team})['home_team'] is team
+
+
+def test_renamed_teams_use_their_old_id_before_the_rename():
+    assert Team.get_team_id('NOP', 20130101) == 'NOH'
+    assert Team.get_team_id('NOP', 20140101) == 'NOP'
+    assert Team.get_team_id('MIL', 20000101) == 'MIL'
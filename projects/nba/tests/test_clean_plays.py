@@ -0,0 +1,41 @@
+# CHECK THE CLEANING OF RAW PLAYS AGAINST THE ORIGINAL ROW BY ROW IMPLEMENTATION
+from modelling.projects.nba.data.cleaning import plays
+from modelling.projects.nba.tests import reference
+from pathlib import Path
+import pandas as pd
+import pytest
+
+fixtures = Path(__file__).parent / 'fixtures'
+
+columns = ['play_id', 'game_id', 'period', 'time', 'home_score', 'away_score', 'team_id',
+           'player_id', 'event', 'event_value', 'event_detail', 'possession']
+
+# the original cleaning left a single score column to be filled in later, which is not part of the comparison
+reference_columns = ['play_id', 'game_id', 'period', 'time', 'score', 'team_id',
+                     'player_id', 'event', 'event_value', 'event_detail', 'possession']
+
+
+def load_fixture(name):
+    """ stored csv with empty cells read as None, as they are read from the DB """
+    output = pd.read_csv(fixtures / name, dtype={'index': 'int'}, keep_default_na=False)
+    output = output.replace({'': None})
+
+    return output
+
+
+# raw plays of generated games, with every kind of play the cleaning handles, and the lineups of those games
+plays_raw = load_fixture('plays_raw_generated.csv')
+games_lineups = load_fixture('games_lineups_generated.csv')
+
+
+@pytest.mark.parametrize('game_id', plays_raw['game_id'].unique())
+def test_clean_plays_matches_original(game_id):
+    game_plays_raw = plays_raw[plays_raw['game_id'] == game_id].reset_index(drop=True)
+    game_lineups = games_lineups[games_lineups['game_id'] == game_id]
+
+    plays.team_names = reference.team_names = {'home_team': 'MIL', 'away_team': 'LAL'}
+
+    expected = reference.clean_plays(reference_columns, game_lineups, game_plays_raw.copy()).drop(columns='score')
+    output = plays.clean_plays(columns, game_lineups, game_plays_raw.copy()).drop(columns=['home_score', 'away_score'])
+
+    pd.testing.assert_frame_equal(output, expected)
@@ -0,0 +1,27 @@
+# CHECK RETRIES OF THE FETCH ENGINE AGAINST A LOCAL SERVER
+from modelling.projects.nba.utils.fetch import *
+from modelling.projects.nba.tests.mock_server import MockServer
+import email.utils
+import pytest
+
+
+def test_retry_after_seconds_and_dates():
+    retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+
+    assert get_retry_after('12') == 12
+    assert 25 < get_retry_after(email.utils.format_datetime(retry_at, usegmt=True)) <= 30
+    assert get_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert get_retry_after('soon') == 0
+
+
+def test_busy_server_raises_after_last_retry():
+    server = MockServer(latency=0, page=b'Too Many Requests', status=429)
+    fetcher = FetchEngine(rate=1000, retries=2, backoff=0.01)
+
+    try:
+        with pytest.raises(aiohttp.ClientResponseError):
+            fetcher.get(f'{server.url}/boxscores/pbp/201912190MIL.html')
+        assert server.requests == 3
+    finally:
+        fetcher.close()
+        server.close()
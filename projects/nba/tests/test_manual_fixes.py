@@ -0,0 +1,26 @@
+# CHECK THE MANUAL FIXES TO GAMES WITH MISSING PLAYS
+from modelling.projects.nba.data.cleaning.plays import *
+
+columns = ['play_id', 'game_id', 'period', 'time', 'home_score', 'away_score', 'team_id',
+           'player_id', 'event', 'event_value', 'event_detail', 'possession']
+
+
+def test_missing_sub_is_inserted_after_the_timeout():
+    game_id = '201311270DAL'
+    # as cleaned, before periods and scores are filled in
+    plays = pd.DataFrame([[None, game_id, None, '5:52', None, None, 'DAL', 'nowitdi01', 'FG Make', '2', '15', 1],
+                          [None, game_id, None, '5:49', None, None, 'DAL', None, 'Timeout', 1, 'Full', 0],
+                          [None, game_id, None, '5:49', None, None, 'DAL', 'dalemsa01', 'Substitution', 1,
+                           'ellismo01', 0],
+                          [None, game_id, None, '5:30', None, None, 'SAS', 'duncati01', 'FG Miss', '2', '10', 0]],
+                         columns=columns)
+
+    output = manual_period_fix(plays, game_id)
+
+    assert output.index.tolist() == [0, 1, 2, 3, 4]
+    assert output['event'].tolist() == ['FG Make', 'Timeout', 'Substitution', 'Substitution', 'FG Miss']
+    assert output.loc[2, ['team_id', 'player_id', 'event_detail']].tolist() == ['DAL', 'blairde01', 'dalemsa01']
+
+    # inserting a row keeps the types of the columns
+    assert output.dtypes.to_dict() == plays.dtypes.to_dict()
+    assert output['possession'].tolist() == [1, 0, 0, 0, 0]
@@ -0,0 +1,26 @@
+# CHECK THAT THE PIPELINE STOPS WHEN A STAGE DIES
+from modelling.projects.nba.data.pipeline import *
+import pytest
+
+
+def test_put_gives_up_on_a_full_queue_once_stopped():
+    queue = Queue(maxsize=1)
+    stop = Event()
+    queue.put('201912190MIL')
+
+    # nothing takes from the queue, as if the next stage had died
+    threading.Timer(0.5, stop.set).start()
+
+    with pytest.raises(RuntimeError):
+        put_until_stopped(queue, '201912200LAL', stop)
+
+
+def test_stages_are_stopped_when_one_dies():
+    stop = Event()
+    processes = [Process(target=time.sleep, args=(2,)), Process(target=sys.exit, args=(1,))]
+    [proc.start() for proc in processes]
+
+    watch_stages(processes, stop)
+
+    assert stop.is_set()
+    [proc.join() for proc in processes]
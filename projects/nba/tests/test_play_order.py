@@ -0,0 +1,53 @@
+# CHECK THE REORDERING OF PLAYS AGAINST THE ORIGINAL ROW BY ROW IMPLEMENTATION
+from modelling.projects.nba.data.cleaning.plays import *
+from modelling.projects.nba.tests import reference
+import pytest
+
+players = [f'p{i}' for i in range(8)]
+events = ['Substitution', 'FG Make', 'Rebound', 'Personal foul', 'Jump Ball', 'Period Start', 'Assist']
+
+
+def get_generated_game(rng, n):
+    """ game of random plays with many sharing a time, so that subs and jump balls often need reordering """
+    times = np.sort(rng.integers(0, n // 4, n))[::-1]
+    event = rng.choice(events, n, p=[.3, .2, .15, .1, .1, .05, .1])
+
+    # every sub has a player coming on and going off
+    player_id = [rng.choice(players) if x == 'Substitution' else rng.choice(players + [None]) for x in event]
+    event_detail = [rng.choice(players) if x == 'Substitution' else rng.choice(players + [None] * 3) for x in event]
+
+    output = pd.DataFrame({'period': '1st',
+                           'time': [f'{x // 60}:{x % 60:02d}.0' for x in times],
+                           'player_id': player_id,
+                           'event': event,
+                           'event_detail': event_detail,
+                           'play': range(n)}, dtype=object)
+
+    # the original sub fix can't move a sub before the first row, so the period starts at a time of its own
+    output.loc[0, ['time', 'event']] = ['12:00.0', 'Period Start']
+
+    # the original jump ball fix looks at the row after each jump ball, so games can't end on one
+    while output['event'].iloc[-1] == 'Jump Ball':
+        output = output.iloc[:-1]
+
+    return output
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_play_order_matches_original(seed):
+    rng = np.random.default_rng(seed)
+
+    for _ in range(5):
+        game = get_generated_game(rng, int(rng.integers(20, 200)))
+
+        expected = reference.fix_substitution_order(reference.fix_jump_ball_order(game.copy()))
+        output = fix_substitution_order(fix_jump_ball_order(game.copy()))
+
+        pd.testing.assert_frame_equal(output, expected)
+
+
+def test_play_order_moves_plays():
+    game = get_generated_game(np.random.default_rng(0), 200)
+    output = fix_substitution_order(fix_jump_ball_order(game.copy()))
+
+    assert (output['play'] != game['play']).any()
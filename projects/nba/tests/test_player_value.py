@@ -0,0 +1,65 @@
+# CHECK PLAYER VALUES AND THE WINDOWS THEY ARE FOUND FOR
+from modelling.projects.nba.data.analysis.player_value import *
+
+
+def get_generated_games():
+    """ two seasons of games, with up to 10 games a night """
+    rng = np.random.default_rng(0)
+    dates = [date for season in [2019, 2020]
+             for date in pd.date_range(f'{season - 1}-10-22', f'{season}-04-15').date
+             for _ in range(rng.integers(0, 11))]
+
+    output = pd.DataFrame({'game_date': dates, 'season': [x.year + (x.month > 6) for x in dates]})
+
+    return output
+
+
+def test_windows_of_season_in_progress_are_kept():
+    games = get_generated_games()
+    windows = get_windows(games, [2019, 2020], 500, 100)
+    rolling = windows[windows['window_type'] == 'rolling']
+
+    # rolling windows end every 100 games, after the last game of that date
+    assert (rolling['games'] <= 500).all()
+    assert games['game_date'].to_numpy()[rolling['end'].to_numpy() - 1].tolist() == rolling['end_date'].tolist()
+
+    # a run part way through each night of a season finds the same rolling windows as a run with the full season
+    for end_date in pd.date_range('2019-11-01', '2020-04-15', freq='17D').date:
+        played = games[games['game_date'] <= end_date]
+        played_windows = get_windows(played, [2019, 2020], 500, 100)
+        played_rolling = played_windows[played_windows['window_type'] == 'rolling']
+
+        expected = rolling[rolling['end'] <= len(played)]
+        pd.testing.assert_frame_equal(played_rolling.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_no_windows_without_new_games():
+    games = get_generated_games()
+    windows = get_windows(games, [2019, 2020], 500, 100)
+    no_games = pd.DataFrame({'game_id': [], 'game_date': [], 'season': []})
+
+    assert get_new_windows(windows, no_games).empty
+    assert get_windows(games.head(0), [2019, 2020], 500, 100).empty
+
+    # new games on the last night of 2020 only need its season window, as no rolling window has ended since
+    new_games = games[games['game_date'] == games['game_date'].max()]
+    new_windows = get_new_windows(windows, new_games)
+
+    assert new_windows[['window_type', 'season']].values.tolist() == [['season', 2020]]
+
+
+def test_player_values_match_closed_form_ridge():
+    rng = np.random.default_rng(1)
+    design = sparse.csr_matrix(rng.choice([-1.0, 0.0, 1.0], size=(300, 20), p=[0.25, 0.5, 0.25]))
+    points = rng.choice([0.0, 1.0, 2.0, 3.0], size=300)
+    alpha = 50
+
+    # (X'X + alpha I)^-1 X'y, on points centred as in get_player_values
+    x = design.toarray()
+    expected = np.linalg.solve(x.T @ x + alpha * np.identity(20), x.T @ (points - points.mean()))
+
+    np.testing.assert_allclose(get_player_values(design, points, alpha=alpha), expected, atol=1e-8)
+
+    # starting from another solution gives the same values
+    start = rng.normal(size=20)
+    np.testing.assert_allclose(get_player_values(design, points, alpha=alpha, start=start), expected, atol=1e-8)
@@ -0,0 +1,29 @@
+# CHECK THE LXML PLAY BY PLAY PARSER AGAINST THE ORIGINAL BEAUTIFULSOUP ONE
+from modelling.projects.nba.data.scraping.plays_raw import *
+from modelling.projects.nba.tests.reference import get_raw_plays_soup
+from pathlib import Path
+
+fixtures = Path(__file__).parent / 'fixtures'
+
+
+def get_fixture_page():
+    output = (fixtures / 'pbp_201912190MIL.html').read_bytes()
+
+    return output
+
+
+def test_raw_plays_match_soup_parser():
+    page = get_fixture_page()
+    soup = BeautifulSoup(page, 'lxml').find('table', {'id': 'pbp'})
+
+    assert get_raw_plays(get_table_content(parse_page(page))) == get_raw_plays_soup(soup)
+
+
+def test_player_ids_need_a_link_in_every_cell():
+    game_plays_raw = get_game_plays_raw(parse_page(get_fixture_page()), '201912190MIL')
+    substitutions = game_plays_raw[game_plays_raw['plays'].str.contains('enters the game')]
+    players = substitutions[['player_1', 'player_2', 'player_3']]
+
+    # both sides sub at once, so only the first cell's first two links are read, whichever null pandas uses for the rest
+    assert [[None if pd.isna(x) else x for x in row] for row in players.values.tolist()] == \
+        [['ilyaser01', 'lopezbr01', None]]
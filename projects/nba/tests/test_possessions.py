@@ -0,0 +1,24 @@
+# CHECK THE POSSESSIONS FOUND FROM A GAME'S PLAYS
+from modelling.projects.nba.data.cleaning.plays_players import get_game_possessions
+import pandas as pd
+
+
+def test_possessions_skip_plays_without_a_team():
+    game_id = '201912190MIL'
+    game_plays = pd.DataFrame([['1', '1st', 'MIL', 'FT Make', '1', 0],
+                               ['2', '1st', 'MIL', 'FT Make', '1', 1],
+                               ['3', '1st', 'LAL', 'FG Miss', '3', 1],
+                               ['4', '1st', None, 'Timeout', None, 1],
+                               ['5', '1st', 'MIL', 'FG Make', '2', 1],
+                               ['6', '1st', None, 'Period End', None, 1]],
+                              columns=['play_id', 'period', 'team_id', 'event', 'event_value', 'possession'])
+    game_plays['game_id'] = game_id
+
+    game_plays_players = pd.DataFrame({'play_id': game_plays['play_id'],
+                                       'lineup_id': [1, 1, 2, 2, 1, 1],
+                                       'opp_lineup_id': [2, 2, 1, 1, 2, 2]})
+
+    output = get_game_possessions(game_plays, game_plays_players)
+
+    assert output[['play_id', 'team_id', 'lineup_id', 'opp_lineup_id', 'points']].values.tolist() == \
+        [['2', 'MIL', 1, 2, 2], ['3', 'LAL', 2, 1, 0], ['5', 'MIL', 1, 2, 2]]
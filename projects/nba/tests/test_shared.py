@@ -0,0 +1,30 @@
+# CHECK THAT FRAMES SHARED WITH WORKER PROCESSES READ BACK AS THEY WERE
+from modelling.projects.nba.utils.shared import *
+import datetime
+
+
+def test_shared_frame_reads_back_each_kind_of_column():
+    df = pd.DataFrame({'game_id': ['201912190MIL', '201912190MIL', '201912200LAL'],
+                       'player_id': pd.array(['antetgi01', None, 'jamesle01'], dtype='string'),
+                       'team_id': ['MIL', None, 'LAL'],
+                       'points': [2, 3, 1],
+                       'possession': [True, False, True],
+                       'minutes': pd.array([30, None, 35], dtype='Int64'),
+                       'game_date': [datetime.date(2019, 12, 19)] * 2 + [datetime.date(2019, 12, 20)]})
+
+    spec, blocks = share_frame(df, partition='game_id')
+    shared = SharedFrame(spec)
+
+    try:
+        output = shared.get_partition('201912190MIL')
+
+        assert output['points'].tolist() == [2, 3]
+        assert output['possession'].tolist() == [True, False]
+        assert [None if pd.isna(x) else x for x in output['player_id']] == ['antetgi01', None]
+        assert [None if pd.isna(x) else x for x in output['team_id']] == ['MIL', None]
+        assert [None if pd.isna(x) else x for x in output['minutes']] == [30, None]
+        assert output['game_date'].tolist() == [datetime.date(2019, 12, 19)] * 2
+        assert len(shared.get_partition('202001010LAL')) == 0
+    finally:
+        shared.close()
+        release_frame(blocks)
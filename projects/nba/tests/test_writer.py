@@ -0,0 +1,43 @@
+# CHECK THAT ROWS THE BUFFERED WRITER CAN'T WRITE ARE REPORTED
+from modelling.projects.nba.utils.writer import *
+import pytest
+
+
+def get_game_rows(game_id):
+    output = pd.DataFrame({'play_id': [f'{game_id}000{i}' for i in range(3)], 'game_id': game_id, 'event': 'FG Make'})
+
+    return output
+
+
+def test_failing_batch_is_dropped_and_its_games_failed(tmp_path):
+    engine = sql.create_engine(f'sqlite:///{tmp_path}/plays.db')
+    failed_games = []
+
+    # sqlite has no nba schema, so every write fails
+    writer = BufferedWriter('plays', engine, 'nba', max_retries=2, failed_games=failed_games, flush_interval=60)
+    writer.write(get_game_rows('201912190MIL'))
+    writer.write(get_game_rows('201912200LAL'))
+
+    with pytest.raises(RuntimeError, match='Could not write 6 rows to plays'):
+        writer.close()
+
+    assert failed_games == ['201912190MIL', '201912200LAL']
+    assert writer.buffer == []
+
+
+def test_batch_is_kept_until_it_can_be_written(tmp_path):
+    engine = sql.create_engine(f'sqlite:///{tmp_path}/plays.db')
+    failed_games = []
+
+    writer = BufferedWriter('plays', engine, None, replace_on='game_id', failed_games=failed_games, flush_interval=60)
+    writer.write(get_game_rows('201912190MIL'))
+
+    # the table doesn't exist yet for the delete, so the first flush fails and keeps the batch
+    writer.flush()
+    assert writer.buffer_rows == 3
+
+    get_game_rows('201912190MIL').head(0).to_sql('plays', engine, index=False)
+    writer.close()
+
+    assert failed_games == []
+    assert pd.read_sql('SELECT * FROM plays', engine).shape == (3, 3)
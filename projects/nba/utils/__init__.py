@@ -4,8 +4,15 @@ from modelling.projects.nba.utils.colours import *
 from modelling.projects.nba.utils.connections import *
 from modelling.projects.nba.utils.dicts import *
 from modelling.projects.nba.utils.functions import *
+from modelling.projects.nba.utils.cache import *
+from modelling.projects.nba.utils.browser import *
 from modelling.projects.nba.utils.environment import *
+from modelling.projects.nba.utils.fetch import *
+from modelling.projects.nba.utils.lineups import *
 from modelling.projects.nba.utils.params import *
 from modelling.projects.nba.utils.path import *
 from modelling.projects.nba.utils.performance import *
+from modelling.projects.nba.utils.shared import *
 from modelling.projects.nba.utils.tables import *
+from modelling.projects.nba.utils.watermarks import *
+from modelling.projects.nba.utils.writer import *
@@ -0,0 +1,164 @@
+# POOL OF REUSABLE HEADLESS BROWSERS
+from modelling.projects import ROOT_DIR
+from modelling.projects.nba.utils.colours import *
+from modelling.projects.nba.utils.params import *
+from contextlib import contextmanager
+import queue
+import threading
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+def start_browser():
+    """ start a headless Chrome session """
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+
+    output = webdriver.Chrome(executable_path=str(ROOT_DIR) + '/utils/chromedriver.exe',
+                              options=options)
+
+    return output
+
+
+def quit_browser(driver):
+    """ quit a browser, which may already have crashed """
+    try:
+        driver.quit()
+    except WebDriverException:
+        pass
+
+
+def wait_for(driver, css, timeout=None):
+    """ wait until an element matching the css selector is on the page, rather than sleeping a fixed time """
+    condition = expected_conditions.presence_of_element_located((By.CSS_SELECTOR, css))
+    output = WebDriverWait(driver, timeout or browser_timeout).until(condition)
+
+    return output
+
+
+class BrowserPool:
+    """ fixed number of browser sessions, each lent to one thread at a time and kept open between pages """
+    def __init__(self, size=4):
+        self.size = size
+        self.browsers = queue.Queue()
+        self.lock = threading.Lock()
+        self.open = []
+
+        # browsers are only started when first needed, so a small job doesn't open the whole pool
+        self.started = 0
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                start = self.browsers.empty() and self.started < self.size
+                self.started += start
+
+            if start:
+                break
+
+            # check again now and then, in case a browser that failed has given its place back
+            try:
+                return self.browsers.get(timeout=1)
+            except queue.Empty:
+                continue
+
+        # give the place in the pool back if the browser can't be started, so a later acquire tries again
+        try:
+            output = start_browser()
+        except Exception:
+            with self.lock:
+                self.started -= 1
+            raise
+
+        with self.lock:
+            self.open.append(output)
+
+        return output
+
+    def release(self, driver):
+        self.browsers.put(driver)
+
+    def recycle(self, driver):
+        """ replace a crashed or stuck browser with a new one, leaving the rest of the pool running
+
+        if a new browser can't be started the failed one is dropped from the pool, so a later acquire starts one
+        """
+        quit_browser(driver)
+
+        with self.lock:
+            self.open = [i for i in self.open if i is not driver]
+            self.started -= 1
+
+        try:
+            output = start_browser()
+        except Exception as e:
+            print(Colour.red + f'Could not restart a browser that failed: {e!r}' + Colour.end)
+            return None
+
+        with self.lock:
+            self.open.append(output)
+            self.started += 1
+
+        print(Colour.red + 'Restarted a browser that failed' + Colour.end)
+
+        return output
+
+    @contextmanager
+    def browser(self):
+        """ borrow a browser, e.g. with pool.browser() as driver:, which is replaced if it fails """
+        driver = self.acquire()
+
+        try:
+            yield driver
+        except WebDriverException:
+            driver = self.recycle(driver)
+            raise
+        finally:
+            if driver is not None:
+                self.release(driver)
+
+    def close(self):
+        with self.lock:
+            [quit_browser(driver) for driver in self.open]
+            self.open = []
+
+
+def run_browser_tasks(pool, tasks, task_function, tries=3):
+    """ run tasks from a queue on threads each holding a browser from the pool until the queue is empty
+
+    task_function(driver, task, add_task) may add further tasks, e.g. the pages found on a season's first page,
+    and a task whose browser fails is retried on a new browser up to tries times, returning the tasks that failed
+    """
+    work = queue.Queue()
+    [work.put((task, 1)) for task in tasks]
+
+    output = []
+
+    def worker():
+        while True:
+            task, attempt = work.get()
+
+            try:
+                with pool.browser() as driver:
+                    task_function(driver, task, lambda new_task: work.put((new_task, 1)))
+            except WebDriverException as e:
+                if attempt < tries:
+                    work.put((task, attempt + 1))
+                else:
+                    output.append(task)
+                    print(Colour.red + f'Could not scrape {task} after {tries} tries: {e!r}' + Colour.end)
+            except Exception as e:
+                # anything else is a problem with the page rather than the browser, so retrying won't help
+                output.append(task)
+                print(Colour.red + f'Could not scrape {task}: {e!r}' + Colour.end)
+            finally:
+                work.task_done()
+
+    [threading.Thread(target=worker, name=f'Browser-{i}', daemon=True).start() for i in range(pool.size)]
+
+    work.join()
+
+    return output
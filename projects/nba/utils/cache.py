@@ -0,0 +1,125 @@
+# CACHING SCRAPED PAGES ON DISK
+from modelling.projects import time
+from modelling.projects.nba.utils.path import p
+import hashlib
+import os
+import sqlite3
+import threading
+import zstandard
+
+
+class PageNotCached(Exception):
+    """ raised when running offline and a page has never been downloaded """
+    pass
+
+
+class PageCache:
+    """ compressed pages stored once per distinct content, with an SQLite index from url to content hash """
+    def __init__(self,
+                 directory=p / 'data' / 'cache',
+                 ttl=None,
+                 max_bytes=2*1024**3,
+                 offline=False,
+                 level=10):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.level = level
+
+        (directory / 'pages').mkdir(parents=True, exist_ok=True)
+
+        # the index can be shared by scraper threads and cleaning processes, so wait on locks rather than failing
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(directory / 'index.db'), timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pages '
+                                '(url TEXT PRIMARY KEY, hash TEXT, fetched_at REAL, accessed_at REAL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+        self.connection.commit()
+
+    def get_path(self, key):
+        output = self.directory / 'pages' / key[:2] / f'{key}.zst'
+        return output
+
+    def get(self, url):
+        """ return cached page content, or None if missing or older than the ttl (unless offline) """
+        with self.lock:
+            row = self.connection.execute('SELECT hash, fetched_at FROM pages WHERE url = ?', (url,)).fetchone()
+
+            if row is None:
+                return None
+
+            key, fetched_at = row
+            if self.ttl is not None and time.time() - fetched_at > self.ttl and not self.offline:
+                return None
+
+            self.connection.execute('UPDATE pages SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self.connection.commit()
+
+        # decompress outside the lock, so other threads can use the index meanwhile
+        try:
+            output = zstandard.ZstdDecompressor().decompress(self.get_path(key).read_bytes())
+        except FileNotFoundError:
+            return None
+
+        return output
+
+    def put(self, url, content):
+        """ store page content under the hash of the content, so identical pages share one file """
+        key = hashlib.sha256(content).hexdigest()
+        path = self.get_path(key)
+        now = time.time()
+
+        # compress and write outside the lock, so other threads can use the index meanwhile
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            blob = zstandard.ZstdCompressor(level=self.level).compress(content)
+
+            # write then rename, so other threads and processes never read a partial file
+            temp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            temp_path.write_bytes(blob)
+            temp_path.replace(path)
+        else:
+            blob = None
+
+        with self.lock:
+            if blob is not None:
+                self.connection.execute('INSERT OR REPLACE INTO blobs VALUES (?, ?)', (key, len(blob)))
+
+            self.connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)', (url, key, now, now))
+            self.connection.commit()
+
+            self.evict()
+
+    def evict(self):
+        """ drop least recently used pages until the cache fits in max_bytes, then delete unreferenced files """
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        urls = self.connection.execute('SELECT url, blobs.size FROM pages JOIN blobs ON pages.hash = blobs.hash '
+                                       'ORDER BY accessed_at').fetchall()
+
+        # pages sharing a file are over-counted here, which only means evicting slightly more than needed
+        removed = []
+        for url, size in urls:
+            if total <= self.max_bytes * 0.9:
+                break
+            removed.append((url,))
+            total -= size
+
+        self.connection.executemany('DELETE FROM pages WHERE url = ?', removed)
+
+        orphans = self.connection.execute('SELECT hash FROM blobs WHERE hash NOT IN (SELECT hash FROM pages)')
+        orphans = [row[0] for row in orphans.fetchall()]
+
+        for key in orphans:
+            self.get_path(key).unlink(missing_ok=True)
+
+        self.connection.executemany('DELETE FROM blobs WHERE hash = ?', [(key,) for key in orphans])
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
@@ -1,77 +1,157 @@
 # DEFINE KEY CLASSES
-# Define base Team class
+import numpy as np
+
+# mean radius of the earth in kilometres, for great-circle distances
+earth_radius = 6371.0
+
+
+# Define base Team class, with indexes of all teams by id and name
 class Team:
+    __slots__ = ['team_id', 'short_name', 'full_name', 'latitude', 'longitude']
+
     instances = []
-    team_ids = []
-    short_names = []
-    full_names = []
-    coordinates = []
+    by_id = {}
+    by_short_name = {}
+    by_full_name = {}
+
+    # older team_ids of renamed teams, with the date before which games were played under that id
+    aliases = {}
+
+    # row and column of each team_id in the distances matrix, which is set once all teams are created
+    index = {}
+    distances = None
 
     def __init__(self,
                  team_id,
                  short_name,
                  full_name,
                  coordinates):
+        latitude, longitude = coordinates
+
+        object.__setattr__(self, 'team_id', team_id)
+        object.__setattr__(self, 'short_name', short_name)
+        object.__setattr__(self, 'full_name', full_name)
+        object.__setattr__(self, 'latitude', float(latitude))
+        object.__setattr__(self, 'longitude', float(longitude))
+
+        # names shared by a current and a deprecated team refer to the current team, which is created first
         self.__class__.instances.append(self)
+        self.__class__.by_id[team_id] = self
+        self.__class__.by_short_name.setdefault(short_name, self)
+        self.__class__.by_full_name.setdefault(full_name, self)
 
-        self.team_id = team_id
-        self.__class__.team_ids.append(team_id)
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Team {self.team_id} can not be changed')
 
-        self.short_name = short_name
-        self.__class__.short_names.append(short_name)
+    def __reduce__(self):
+        # teams can't be changed, so pickles and copies refer back to the team of the same id
+        return self.__class__.get_team, (self.team_id,)
 
-        self.full_name = full_name
-        self.__class__.full_names.append(full_name)
+    def __repr__(self):
+        return f'Team({self.team_id!r}, {self.short_name!r}, {self.full_name!r}, {self.coordinates!r})'
 
-        self.coordinates = coordinates
-        self.__class__.coordinates.append(coordinates)
+    @property
+    def coordinates(self):
+        return self.latitude, self.longitude
 
     def to_dict(self):
         return {
             'team_id': self.team_id,
             'short_name': self.short_name,
             'full_name': self.full_name,
-            'coordinates': self.coordinates
+            'coordinates': f'({self.latitude}, {self.longitude})'
         }
 
+    @classmethod
+    def get_team(cls, team_id):
+        output = cls.by_id[team_id]
+
+        return output
+
+    @classmethod
+    def add_alias(cls, team_id, old_team_id, valid_date):
+        """ record that team_id played as old_team_id before valid_date, given as an int like 20130701 """
+        cls.aliases.setdefault(team_id, []).append((old_team_id, valid_date))
+
+    @classmethod
+    def get_team_id(cls, team_id, date):
+        """ get the team_id a team played under at a date, given as an int like 20130701 """
+        output = team_id
+
+        for old_team_id, valid_date in cls.aliases.get(team_id, []):
+            if date < valid_date:
+                output = old_team_id
+
+        return output
+
+    @classmethod
+    def set_distances(cls):
+        """ great-circle distance in kilometres between every pair of teams, indexed by Team.index """
+        cls.index = {team.team_id: i for i, team in enumerate(cls.instances)}
+
+        latitudes = np.radians([team.latitude for team in cls.instances])
+        longitudes = np.radians([team.longitude for team in cls.instances])
+
+        # haversine formula, for all pairs at once
+        d_latitude = latitudes[:, None] - latitudes[None, :]
+        d_longitude = longitudes[:, None] - longitudes[None, :]
+        a = (np.sin(d_latitude / 2) ** 2
+             + np.cos(latitudes[:, None]) * np.cos(latitudes[None, :]) * np.sin(d_longitude / 2) ** 2)
+
+        cls.distances = 2 * earth_radius * np.arcsin(np.sqrt(a))
+        cls.distances.flags.writeable = False
+
+    @classmethod
+    def get_distance(cls, team_id, other_team_id):
+        output = cls.distances[cls.index[team_id], cls.index[other_team_id]]
+
+        return output
+
 
 # Create objects of class Team
-Team('ATL', 'Atlanta', 'Atlanta Hawks', '(33.757222, -84.396389)')
-Team('BOS', 'Boston', 'Boston Celtics', '(42.366303, -71.062228)')
-Team('BRK', 'Brooklyn', 'Brooklyn Nets', '(40.68265, -73.974689)')
-Team('CHO', 'Charlotte', 'Charlotte Hornets', '(35.225, -80.839167)')
-Team('CHI', 'Chicago', 'Chicago Bulls', '(41.880556, -87.674167)')
-Team('CLE', 'Cleveland', 'Cleveland Cavaliers', '(41.496389, -81.688056)')
-Team('DAL', 'Dallas', 'Dallas Mavericks', '(32.790556, -96.810278)')
-Team('DEN', 'Denver', 'Denver Nuggets', '(39.748611, -105.0075)')
-Team('DET', 'Detroit', 'Detroit Pistons', '(42.696944, -83.245556)')
-Team('GSW', 'Golden State', 'Golden State Warriors', '(37.768056, -122.3875)')
-Team('HOU', 'Houston', 'Houston Rockets', '(29.750833, -95.362222)')
-Team('IND', 'Indiana', 'Indiana Pacers', '(39.763889, -86.155556)')
-Team('LAC', 'LA Clippers', 'Los Angeles Clippers', '(34.043056, -118.267222)')
-Team('LAL', 'LA Lakers', 'Los Angeles Lakers', '(34.043056, -118.267222)')
-Team('MEM', 'Memphis', 'Memphis Grizzlies', '(35.138333, -90.050556)')
-Team('MIA', 'Miami', 'Miami Heat', '(25.781389, -80.188056)')
-Team('MIL', 'Milwaukee', 'Milwaukee Bucks', '(43.043611, -87.916944)')
-Team('MIN', 'Minnesota', 'Minnesota Timberwolves', '(44.979444, -93.276111)')
-Team('NOP', 'New Orleans', 'New Orleans Pelicans', '(29.948889, -90.081944)')
-Team('NYK', 'New York', 'New York Knicks', '(40.750556, -73.993611)')
-Team('OKC', 'Oklahoma City', 'Oklahoma City Thunder', '(35.463333, -97.515)')
-Team('ORL', 'Orlando', 'Orlando Magic', '(28.539167, -81.383611)')
-Team('PHI', 'Philadelphia', 'Philadelphia 76ers', '(39.901111, -75.171944)')
-Team('PHO', 'Phoenix', 'Phoenix Suns', '(33.445833, -112.071389)')
-Team('POR', 'Portland', 'Portland Trail Blazers', '(45.531667, -122.666667)')
-Team('SAC', 'Sacramento', 'Sacramento Kings', '(38.649167, -121.518056)')
-Team('SAS', 'San Antonio', 'San Antonio Spurs', '(29.426944, -98.4375 )')
-Team('TOR', 'Toronto', 'Toronto Raptors', '(43.643333, -79.379167)')
-Team('UTA', 'Utah', 'Utah Jazz', '(40.768333, -111.901111)')
-Team('WAS', 'Washington', 'Washington Wizards', '(38.898056, -77.020833)')
+Team('ATL', 'Atlanta', 'Atlanta Hawks', (33.757222, -84.396389))
+Team('BOS', 'Boston', 'Boston Celtics', (42.366303, -71.062228))
+Team('BRK', 'Brooklyn', 'Brooklyn Nets', (40.68265, -73.974689))
+Team('CHO', 'Charlotte', 'Charlotte Hornets', (35.225, -80.839167))
+Team('CHI', 'Chicago', 'Chicago Bulls', (41.880556, -87.674167))
+Team('CLE', 'Cleveland', 'Cleveland Cavaliers', (41.496389, -81.688056))
+Team('DAL', 'Dallas', 'Dallas Mavericks', (32.790556, -96.810278))
+Team('DEN', 'Denver', 'Denver Nuggets', (39.748611, -105.0075))
+Team('DET', 'Detroit', 'Detroit Pistons', (42.696944, -83.245556))
+Team('GSW', 'Golden State', 'Golden State Warriors', (37.768056, -122.3875))
+Team('HOU', 'Houston', 'Houston Rockets', (29.750833, -95.362222))
+Team('IND', 'Indiana', 'Indiana Pacers', (39.763889, -86.155556))
+Team('LAC', 'LA Clippers', 'Los Angeles Clippers', (34.043056, -118.267222))
+Team('LAL', 'LA Lakers', 'Los Angeles Lakers', (34.043056, -118.267222))
+Team('MEM', 'Memphis', 'Memphis Grizzlies', (35.138333, -90.050556))
+Team('MIA', 'Miami', 'Miami Heat', (25.781389, -80.188056))
+Team('MIL', 'Milwaukee', 'Milwaukee Bucks', (43.043611, -87.916944))
+Team('MIN', 'Minnesota', 'Minnesota Timberwolves', (44.979444, -93.276111))
+Team('NOP', 'New Orleans', 'New Orleans Pelicans', (29.948889, -90.081944))
+Team('NYK', 'New York', 'New York Knicks', (40.750556, -73.993611))
+Team('OKC', 'Oklahoma City', 'Oklahoma City Thunder', (35.463333, -97.515))
+Team('ORL', 'Orlando', 'Orlando Magic', (28.539167, -81.383611))
+Team('PHI', 'Philadelphia', 'Philadelphia 76ers', (39.901111, -75.171944))
+Team('PHO', 'Phoenix', 'Phoenix Suns', (33.445833, -112.071389))
+Team('POR', 'Portland', 'Portland Trail Blazers', (45.531667, -122.666667))
+Team('SAC', 'Sacramento', 'Sacramento Kings', (38.649167, -121.518056))
+Team('SAS', 'San Antonio', 'San Antonio Spurs', (29.426944, -98.4375))
+Team('TOR', 'Toronto', 'Toronto Raptors', (43.643333, -79.379167))
+Team('UTA', 'Utah', 'Utah Jazz', (40.768333, -111.901111))
+Team('WAS', 'Washington', 'Washington Wizards', (38.898056, -77.020833))
 
 # deprecated teams
-Team('CHA', 'Charlotte', 'Charlotte Bobcats', '(35.186389, -80.912778)')
-Team('CHH', 'Charlotte', 'Charlotte Hornets', '(35.186389, -80.912778)')
-Team('NJN', 'New Jersey', 'New Jersey Nets', '(40.811667, -74.0675)')
-Team('NOH', 'New Orleans', 'New Orleans Hornets', '(29.948889, -90.081944)')
-Team('NOK', 'New Orleans/Oklahoma City', 'New Orleans/Oklahoma City Hornets', '(35.463333, -97.515)')
-Team('SEA', 'Seattle', 'Seattle Supersonics', '(47.622, -122.354)')
-Team('VAN', 'Vancouver', 'Vancouver Grizzlies', '(49.277778, -123.108889)')
+Team('CHA', 'Charlotte', 'Charlotte Bobcats', (35.186389, -80.912778))
+Team('CHH', 'Charlotte', 'Charlotte Hornets', (35.186389, -80.912778))
+Team('NJN', 'New Jersey', 'New Jersey Nets', (40.811667, -74.0675))
+Team('NOH', 'New Orleans', 'New Orleans Hornets', (29.948889, -90.081944))
+Team('NOK', 'New Orleans/Oklahoma City', 'New Orleans/Oklahoma City Hornets', (35.463333, -97.515))
+Team('SEA', 'Seattle', 'Seattle Supersonics', (47.622, -122.354))
+Team('VAN', 'Vancouver', 'Vancouver Grizzlies', (49.277778, -123.108889))
+
+# renamed teams, which odds portal lists under their current name
+Team.add_alias('NOP', 'NOH', 20130701)
+Team.add_alias('BRK', 'NJN', 20120701)
+Team.add_alias('CHO', 'CHA', 20140520)
+
+Team.set_distances()
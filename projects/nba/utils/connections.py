@@ -1,14 +1,58 @@
 # SETTING UP SQL CONNECTIONS
+import os
 import sqlalchemy as sql
 from modelling.projects.nba.utils.colours import *
 from modelling.projects.nba.utils.environment import *
 from sqlalchemy.exc import ProgrammingError
 
+# Engines for the current process, keyed by schema
+engines = {}
+engines_pid = os.getpid()
+
+
+# Stop pooled connections being used by any process other than the one that opened them
+def add_process_guard(engine):
+    @sql.event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @sql.event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+
+        # connection was inherited from the parent process, so drop it and let the pool open a new one
+        if connection_record.info['pid'] != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise sql.exc.DisconnectionError(f"Connection record belongs to pid {connection_record.info['pid']}, "
+                                             f"attempting to check out in pid {pid}")
+
+
+# Get the pooled engine for a schema, creating it once per process
+def get_engine(db):
+    global engines, engines_pid
+
+    # forked processes start their own registry rather than sharing the parent's sockets
+    if engines_pid != os.getpid():
+        engines = {}
+        engines_pid = os.getpid()
+
+    if db not in engines:
+        engine = sql.create_engine(f'mysql://{user}:{password}@{host}/{db}?charset=utf8mb4',
+                                   pool_size=pool_size,
+                                   max_overflow=pool_max_overflow,
+                                   pool_recycle=pool_recycle,
+                                   pool_pre_ping=True)
+        add_process_guard(engine)
+        engines[db] = engine
+
+    output = engines[db]
+    return output
+
 
 # Set up MySQL Connections
 def get_connection(db):
     try:
-        engine = sql.create_engine(f'mysql://{user}:{password}@{host}/{db}?charset=utf8mb4')
+        engine = get_engine(db)
         connection = engine.connect()
         metadata = sql.MetaData(engine)
         print(Colour.green + f'Established SQL connection to {db} schema' + Colour.end)
@@ -19,34 +63,54 @@ def get_connection(db):
     return engine, metadata, connection
 
 
+# Cache reflected tables, keyed by engine url and table name, so each is only read from the schema once
+reflected_tables = {}
+
+
+def get_table(metadata, engine, name):
+    key = (str(engine.url), name)
+
+    if key not in reflected_tables:
+        metadata.reflect(bind=engine, only=[name])
+        reflected_tables[key] = metadata.tables[name]
+
+    output = reflected_tables[key]
+    return output
+
+
+def clear_table_cache(engine, name=None):
+    """ drop cached tables for the engine (or just the named table), e.g. after creating or altering them """
+    url = str(engine.url)
+    keys = [key for key in reflected_tables if key[0] == url and name in [None, key[1]]]
+
+    for key in keys:
+        del reflected_tables[key]
+
+
 # Set up generic queries
 def get_table_query(metadata, engine, name, column, cond):
-    metadata.reflect(bind=engine)
-    table = metadata.tables[name]
+    table = get_table(metadata, engine, name)
 
     output = sql.sql.select([table]).where(table.c[column].in_(cond))
     return output
 
 
 def get_column_query(metadata, engine, name, column):
-    metadata.reflect(bind=engine)
-    table = metadata.tables[name]
+    table = get_table(metadata, engine, name)
     output = sql.sql.select([table.c[column]]).distinct()
     return output
 
 
 def get_delete_query(metadata, engine, name, column, series):
-    metadata.reflect(bind=engine)
-    table = metadata.tables[name]
+    table = get_table(metadata, engine, name)
 
     output = table.delete().where(table.c[column].in_(series))
     return output
 
 
 def get_join_query(metadata, engine, left, right, column=False, cond=False):
-    metadata.reflect(bind=engine)
-    left_table = metadata.tables[left]
-    right_table = metadata.tables[right]
+    left_table = get_table(metadata, engine, left)
+    right_table = get_table(metadata, engine, right)
     join = left_table.join(right=right_table, onclause=left_table.c.game_id == right_table.c.game_id)
 
     try:
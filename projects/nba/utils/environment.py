@@ -6,3 +6,8 @@ database_analysis = 'nba_analysis'
 user = 'root'
 password = 'password'
 host = 'localhost'
+
+#  Connection pool
+pool_size = 5
+pool_max_overflow = 10
+pool_recycle = 3600
@@ -0,0 +1,197 @@
+# FETCHING PAGES ASYNCHRONOUSLY
+from modelling.projects import time
+from modelling.projects.nba.utils.cache import *
+from modelling.projects.nba.utils.params import *
+import asyncio
+import concurrent.futures
+import datetime
+import email.utils
+import threading
+import aiohttp
+import lxml.html
+from urllib.parse import urlsplit
+
+# responses worth retrying, as the server is likely to recover
+retry_statuses = [429, 500, 502, 503, 504]
+
+
+def get_retry_after(value):
+    """ seconds to wait from a Retry-After header, given either as seconds or as an HTTP date """
+    try:
+        output = float(value)
+    except ValueError:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            output = (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            output = 0
+
+    output = max(output, 0)
+
+    return output
+
+
+class TokenBucket:
+    """ rate limit one host to rate requests per second on average, allowing bursts of up to capacity """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                # top up tokens for the time passed since the last request
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchEngine:
+    """ shared asyncio HTTP client on a background event loop, which scraper threads can call into """
+    def __init__(self,
+                 concurrency=8,
+                 rate=10,
+                 burst=10,
+                 retries=4,
+                 backoff=1,
+                 timeout=60,
+                 cache=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+
+        # decompress, compress and index cached pages in their own threads, keeping the event loop free for requests
+        self.cache_executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency,
+                                                                    thread_name_prefix='PageCache')
+
+        # run the event loop in its own thread so existing thread pools can keep calling get
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='FetchEngine', daemon=True)
+        self.thread.start()
+
+        asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    async def start(self):
+        """ open the keep-alive connection pool, which must be created inside the event loop """
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.buckets = {}
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def get_bucket(self, url):
+        host = urlsplit(url).netloc
+
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+
+        output = self.buckets[host]
+        return output
+
+    async def fetch(self, url):
+        """ get page content, retrying with exponential backoff on connection errors and busy servers """
+        # use the cached page if there is one, and never touch the network when replaying offline
+        if self.cache is not None:
+            output = await self.loop.run_in_executor(self.cache_executor, self.cache.get, url)
+
+            if output is not None:
+                return output
+            elif self.cache.offline:
+                raise PageNotCached(url)
+
+        bucket = self.get_bucket(url)
+
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt
+            await bucket.acquire()
+
+            try:
+                async with self.semaphore:
+                    async with self.session.get(url) as response:
+                        output = await response.read()
+                        status = response.status
+                        retry_after = response.headers.get('Retry-After')
+
+                        # a busy server on the last attempt is an error, never page content
+                        if status in retry_statuses and attempt == self.retries:
+                            response.raise_for_status()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            # store the page after releasing the connection, so compressing it never holds up other requests
+            if status == 200 and self.cache is not None:
+                await self.loop.run_in_executor(self.cache_executor, self.cache.put, url, output)
+
+            if status not in retry_statuses:
+                return output
+
+            # wait at least as long as the server asks
+            if retry_after is not None:
+                delay = max(delay, get_retry_after(retry_after))
+
+            await asyncio.sleep(delay)
+
+    async def fetch_all(self, urls):
+        output = await asyncio.gather(*[self.fetch(url) for url in urls])
+        return output
+
+    def get(self, url):
+        """ get page content from any thread, blocking until it arrives """
+        output = asyncio.run_coroutine_threadsafe(self.fetch(url), self.loop).result()
+        return output
+
+    def get_all(self, urls):
+        """ get the content of many pages concurrently, in the order given """
+        output = asyncio.run_coroutine_threadsafe(self.fetch_all(urls), self.loop).result()
+        return output
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.cache_executor.shutdown()
+
+        if self.cache is not None:
+            self.cache.close()
+
+
+def parse_page(page):
+    """ parse fetched page html into an lxml tree """
+    output = lxml.html.fromstring(page, parser=lxml.html.HTMLParser(encoding='utf-8'))
+
+    return output
+
+
+def get_fetcher(stage, processes=1):
+    """ fetch engine using the limits and page cache set in params, splitting the stage's rate between its processes """
+    if USE_PAGE_CACHE:
+        cache = PageCache(ttl=page_cache_ttl,
+                          max_bytes=page_cache_max_bytes,
+                          offline=PAGE_CACHE_OFFLINE)
+    else:
+        cache = None
+
+    output = FetchEngine(concurrency=fetch_concurrency,
+                         rate=fetch_stage_rates.get(stage, fetch_rate) / processes,
+                         burst=fetch_burst,
+                         cache=cache)
+
+    return output
@@ -43,11 +43,14 @@ def write_data(df,
                sql_engine,
                db_schema,
                if_exists='replace',
-               index=True):
+               index=True,
+               method=None,
+               chunk_size=None):
 
     # write to sql
     try:
-        df.to_sql(name, con=sql_engine, schema=db_schema, if_exists=if_exists, index=index)
+        df.to_sql(name, con=sql_engine, schema=db_schema, if_exists=if_exists, index=index,
+                  method=method, chunksize=chunk_size)
         status_sql = Colour.green + 'DB (Success)' + Colour.end
     except OperationalError:
         status_sql = Colour.red + 'DB (Failed)' + Colour.end
@@ -57,6 +60,12 @@ def write_data(df,
     return status
 
 
+# to_sql method skipping rows whose primary key is already in the table, e.g. lineups found by several processes
+def insert_ignore(table, conn, keys, data_iter):
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    conn.execute(table.table.insert().prefix_with('IGNORE'), rows)
+
+
 #  Data cleaning functions
 def left(x, length):
     return x[:length]
@@ -87,35 +96,33 @@ def find_occurrence(x, y, n):
 
 
 def insert_row(df, index, values):
-    # get rows from before desired index
-    df_before = df[df.index < index]
-
-    # append the desired row
-    df_before.loc[index] = values
+    # add 1 to index of rows from index on, leaving a gap for the desired row
+    new_index = df.index + (df.index >= index).astype('int')
+    output = df.set_axis(new_index, axis=0)
 
-    # add 1 to index of rows after index
-    df_after = df[df.index >= index]
-    df_after.index += 1
+    # add the desired row into the gap, reindexing once rather than splitting and joining the frame
+    output = output.reindex(new_index.insert(int((df.index < index).sum()), index))
+    output.loc[index] = values
 
-    # join together
-    output = pd.concat((df_before, df_after))
+    # reindexing leaves the gap as missing values, which makes int columns float, so set back any without missing values
+    output = output.astype({column: dtype for column, dtype in df.dtypes.items() if output[column].notnull().all()})
 
     return output
 
 
 def swap_rows(df, i, j, direction):
-    temp = df.loc[i].copy()
+    """ move row i to row j, shifting the rows in between towards i, with direction kept for existing calls """
+    order = list(range(len(df)))
+    order.insert(df.index.get_loc(j), order.pop(df.index.get_loc(i)))
 
-    if direction == 'forward':
-        for row in range(i, j):
-            df.loc[row] = df.loc[row+1]
+    output = df.iloc[order].set_axis(df.index, axis=0)
 
-        df.loc[j] = temp
+    return output, j
 
-    elif direction == 'back':
-        for row in reversed(range(j, i+1)):
-            df.loc[row] = df.loc[row-1]
 
-        df.loc[j] = temp
+def check_processes(processes):
+    """ raise if any process didn't finish cleanly, e.g. as its rows couldn't be written """
+    failed = [proc.name for proc in processes if proc.exitcode != 0]
 
-    return df, j
+    if failed:
+        raise RuntimeError(f'{", ".join(failed)} did not finish, so games may be missing')
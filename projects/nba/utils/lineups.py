@@ -0,0 +1,102 @@
+# LINEUP IDS, AND LOADING ON-COURT PLAYERS AS ARRAYS
+from modelling.projects import pd
+from modelling.projects.nba.utils.connections import get_table_query
+import hashlib
+import numpy as np
+
+lineup_columns = ['lineup_id', 'player_1', 'player_2', 'player_3', 'player_4', 'player_5']
+
+
+def get_lineup_id(players):
+    """ id for a lineup from its player_ids, the same in every process so workers don't need to share a sequence """
+    key = '|'.join(sorted(players)).encode()
+    output = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big', signed=True)
+
+    return output
+
+
+def get_lineups(lineups):
+    """ rows for the lineups table from tuples of player_ids, each lineup given once """
+    rows = [(get_lineup_id(i), *sorted(i)) for i in set(lineups)]
+    output = pd.DataFrame(rows, columns=lineup_columns)
+
+    return output
+
+
+class PlaysLineups:
+    """ on-court lineups for plays as arrays, with an index of the plays each player was on court for
+
+    players are numbered by their position in player_ids, and lineup_players has the 5 player numbers of each
+    lineup, so lineup_players[lineups] gives the players on court for every play
+    """
+    def __init__(self, play_ids, lineup_ids, opp_lineup_ids, lineups):
+        self.play_ids = np.asarray(play_ids)
+
+        lineup_index = pd.Index(lineups['lineup_id'])
+        self.lineups = lineup_index.get_indexer(lineup_ids)
+        self.opp_lineups = lineup_index.get_indexer(opp_lineup_ids)
+
+        # a play whose lineup isn't in the table would otherwise silently take the last lineup
+        missing = (self.lineups == -1) | (self.opp_lineups == -1)
+
+        if missing.any():
+            raise ValueError(f'{missing.sum()} plays have lineup ids missing from the lineups table')
+
+        players = lineups[lineup_columns[1:]].to_numpy()
+        codes, self.player_ids = pd.factorize(players.ravel())
+        self.lineup_players = codes.reshape(players.shape).astype('int32')
+
+        self.player_numbers = {player_id: i for i, player_id in enumerate(self.player_ids)}
+
+        self.index = self.get_index(self.lineups)
+        self.opp_index = self.get_index(self.opp_lineups)
+
+    def get_index(self, lineups):
+        """ inverted index of plays for each player, as the plays of player i being plays[starts[i]:starts[i+1]] """
+        players = self.lineup_players[lineups].ravel()
+        plays = np.repeat(np.arange(len(lineups)), self.lineup_players.shape[1])
+
+        order = np.argsort(players, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(np.bincount(players, minlength=len(self.player_ids)))])
+
+        output = plays[order], starts
+        return output
+
+    def get_plays(self, player_id, opp=False):
+        """ get the plays a player was on court for, or on court against if opp """
+        plays, starts = self.opp_index if opp else self.index
+        i = self.player_numbers.get(player_id)
+
+        output = plays[starts[i]:starts[i + 1]] if i is not None else np.array([], dtype='int64')
+        return output
+
+    def get_players(self, plays, opp=False):
+        """ get the player numbers on court for plays, as an array with a row of 5 for each play """
+        lineups = self.opp_lineups if opp else self.lineups
+
+        output = self.lineup_players[lineups[plays]]
+        return output
+
+
+def get_plays_lineups(engine, metadata, plays):
+    """ load the lineups for plays with lineup_id and opp_lineup_id columns, e.g. from plays_players or possessions """
+    lineup_ids = pd.unique(pd.concat([plays['lineup_id'], plays['opp_lineup_id']])).tolist()
+    selectable = get_table_query(metadata, engine, 'lineups', 'lineup_id', lineup_ids)
+    lineups = pd.read_sql(sql=selectable, con=engine)
+
+    output = PlaysLineups(play_ids=plays['play_id'],
+                          lineup_ids=plays['lineup_id'],
+                          opp_lineup_ids=plays['opp_lineup_id'],
+                          lineups=lineups)
+
+    return output
+
+
+def load_plays_lineups(engine, metadata, game_ids):
+    """ load the on-court lineups of every play in the games given """
+    selectable = get_table_query(metadata, engine, 'plays_players', 'game_id', game_ids)
+    plays_players = pd.read_sql(sql=selectable, con=engine).sort_values('play_id', ignore_index=True)
+
+    output = get_plays_lineups(engine, metadata, plays_players)
+
+    return output
@@ -16,3 +16,42 @@ SKIP_SCRAPED_PLAYERS = True
 # Dates for table odds
 start_season_odds = 2009  # odds only from 2008/2009
 end_season_odds = 2020
+
+# Limits for fetching pages from Basketball Reference
+fetch_concurrency = 8
+fetch_rate = 4  # average requests per second to each host, about what the two unthrottled threads used to manage
+fetch_burst = 4
+
+# Rate for each stage, overriding fetch_rate, split between the stage's processes
+fetch_stage_rates = {'games': 2, 'games_lineups': 4, 'players': 3, 'plays_raw': 4, 'plays_players': 1, 'pipeline': 4}
+
+# Cache of scraped pages on disk, and whether to only replay pages already in the cache
+USE_PAGE_CACHE = True
+PAGE_CACHE_OFFLINE = False
+page_cache_ttl = None  # seconds before a cached page is downloaded again, None to keep pages forever
+page_cache_max_bytes = 2 * 1024**3
+
+# Streaming pipeline, with processes for each cleaning stage and the number of games each queue can hold
+pipeline_clean_processes = 4
+pipeline_players_processes = 4
+pipeline_queue_size = 32
+
+# Processes for finding the players on court for each play
+plays_players_processes = 8
+
+# Control to only load games since each table's watermark, i.e. the last game it loaded
+INCREMENTAL = False
+
+# Pool of headless browsers for pages that need javascript, and seconds to wait for an element to load
+browser_pool_size = 4
+browser_timeout = 20
+
+# Ridge penalty for player values, pulling players with few possessions towards an average player
+player_value_alpha = 2000
+
+# Seasons to find player values for, with rolling windows of the last games every step games, solved in processes
+start_season_value = 2001
+end_season_value = 2020
+player_value_window = 500
+player_value_step = 100
+player_value_processes = 4
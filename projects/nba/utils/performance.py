@@ -1,44 +1,254 @@
 from modelling.projects import *  # high level packages
-from modelling.projects.nba.utils.connections import get_connection
+from modelling.projects.nba.utils.connections import get_connection, get_table
 from modelling.projects.nba.utils.environment import *
-import inspect
+from modelling.projects.nba.utils.functions import write_data
+from modelling.projects.nba.utils.tables import create_table_timings
+from modelling.projects.nba.utils.writer import BufferedWriter
+from multiprocessing import Queue
+import functools
+import random
+import threading
+import uuid
+import numpy as np
 
-# write performance of functions to DB
+# time functions and write their performance to DB, set before importing any module using timed
 PERFORMANCE_TEST = False
 
+# time 1 in every PERFORMANCE_SAMPLE calls to each function, while still counting every call
+PERFORMANCE_SAMPLE = 1
+
+# number of latencies kept per function for percentiles
+latency_size = 1024
+
 if PERFORMANCE_TEST:
     # create connection to performance schema
     engine_perf, metadata_perf, connection_perf = get_connection(database_perf)
+    create_table_timings(engine_perf, metadata_perf)
+
+# id tagging every metric of this run, which worker processes inherit when forked
+run_id = uuid.uuid4().hex
+
+# tags added to metrics recorded from now on in this process, e.g. the game being cleaned
+performance_tags = {'season': None, 'game_id': None}
+
+timing_columns = ['run_id', 'pid', 'season', 'game_id', 'stage', 'calls', 'timed_calls',
+                  'total_time', 'self_time', 'p50', 'p99']
+
+# running stats for each timed function or block, keyed by name
+performance = {}
+
+# stack of time spent in timed children for each open timer, per thread
+timer_stack = threading.local()
+
+
+class TimerStats:
+    """ call count, cumulative and self time, and a fixed size random sample of latencies for one name """
+    __slots__ = ['lock', 'calls', 'timed_calls', 'total_ns', 'self_ns', 'latencies']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.timed_calls = 0
+        self.total_ns = 0
+        self.self_ns = 0
+        self.latencies = np.zeros(latency_size, dtype='int64')
+
+    def count(self):
+        """ count a call, and return whether it should be timed """
+        with self.lock:
+            self.calls += 1
+            output = self.calls % PERFORMANCE_SAMPLE == 0
+
+        return output
+
+    def add(self, elapsed, self_elapsed):
+        with self.lock:
+            # reservoir sampling keeps every latency equally likely to be in the fixed size array
+            if self.timed_calls < latency_size:
+                self.latencies[self.timed_calls] = elapsed
+            else:
+                i = random.randrange(self.timed_calls + 1)
+                if i < latency_size:
+                    self.latencies[i] = elapsed
+
+            self.timed_calls += 1
+            self.total_ns += elapsed
+            self.self_ns += self_elapsed
+
+    def to_dict(self):
+        latencies = self.latencies[:min(self.timed_calls, latency_size)] / 1e9
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (None, None)
+
+        output = {'calls': self.calls,
+                  'timed_calls': self.timed_calls,
+                  'total_time': self.total_ns / 1e9,
+                  'self_time': self.self_ns / 1e9,
+                  'p50': p50,
+                  'p99': p99}
+
+        return output
+
+    def pop(self):
+        """ return the stats since the last pop, or None if there were no calls, and start again from zero """
+        with self.lock:
+            output = self.to_dict() if self.calls else None
+
+            self.calls = 0
+            self.timed_calls = 0
+            self.total_ns = 0
+            self.self_ns = 0
+
+        return output
+
+
+def get_timer_stats(name):
+    output = performance.get(name) or performance.setdefault(name, TimerStats())
+    return output
+
+
+def start_timer():
+    """ open a timer on this thread, returning its start time """
+    if not hasattr(timer_stack, 'children'):
+        timer_stack.children = []
+
+    timer_stack.children.append(0)
+
+    output = time.perf_counter_ns()
+    return output
+
+
+def stop_timer(stats, start):
+    """ close the latest timer on this thread, adding its time to its parent's children """
+    elapsed = time.perf_counter_ns() - start
+    children = timer_stack.children.pop()
+
+    if timer_stack.children:
+        timer_stack.children[-1] += elapsed
+
+    stats.add(elapsed, elapsed - children)
 
-performance = []
 
+def timed(func):
+    """ decorator timing each call of a function, which leaves the function untouched when not testing """
+    if not PERFORMANCE_TEST:
+        return func
 
-def log_performance():
+    stats = get_timer_stats(func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # calls skipped by sampling are counted, and their time goes to the calling timer's self time
+        if not stats.count():
+            return func(*args, **kwargs)
+
+        start = start_timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stop_timer(stats, start)
+
+    return wrapper
+
+
+def reset_performance():
+    """ drop stats not yet written, so forked worker processes don't send on their parent's stats """
+    for stats in list(performance.values()):
+        stats.pop()
+
+
+# only Unix forks, and spawned processes on Windows start with nothing recorded anyway
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_performance)
+
+
+def set_performance_tags(**tags):
+    """ tag metrics recorded from now on in this process, e.g. set_performance_tags(season=2020, game_id=...) """
+    performance_tags.update(tags)
+
+
+def get_performance_rows():
+    """ take the stats recorded since the last call as rows tagged with the run, process and current tags """
+    output = []
+
+    for name, stats in list(performance.items()):
+        row = stats.pop()
+
+        if row is not None:
+            output.append({'run_id': run_id, 'pid': os.getpid(), **performance_tags, 'stage': name, **row})
+
+    return output
+
+
+def send_performance(queue):
+    """ ship this process' metrics since the last send to the parent process, e.g. after each game """
     if PERFORMANCE_TEST:
-        # get timestamp of call
-        timestamp = time.time()
+        rows = get_performance_rows()
+
+        if rows:
+            queue.put(rows)
+
+
+class PerformanceCollector:
+    """ merge metrics sent by worker processes over a queue, appending them to the performance schema as they come """
+    def __init__(self):
+        self.queue = Queue()
+        self.thread = None
 
-        # get caller method name
-        current_frame = inspect.currentframe()
-        caller_frame = inspect.getouterframes(current_frame, 2)
-        string = caller_frame[1][3]
+        if PERFORMANCE_TEST:
+            self.writer = BufferedWriter(name='timings',
+                                         sql_engine=engine_perf,
+                                         db_schema='performance')
+            self.thread = threading.Thread(target=self.run, name='PerformanceCollector', daemon=True)
+            self.thread.start()
 
-        # create log row
-        row = [timestamp, string]
+    def run(self):
+        while (rows := self.queue.get()) is not None:
+            self.writer.write(pd.DataFrame(rows, columns=timing_columns))
 
-        performance.append(row)
-    return performance
+    def close(self):
+        """ write the metrics still in the queue, once every worker process has finished """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.writer.close()
 
 
 def write_performance():
+    """ append this process' metrics since the last write, for runs without worker processes """
+    if PERFORMANCE_TEST:
+        output = pd.DataFrame(get_performance_rows(), columns=timing_columns)
+
+        write_data(df=output,
+                   name='timings',
+                   sql_engine=engine_perf,
+                   db_schema='performance',
+                   if_exists='append',
+                   index=False)
+
+
+def get_performance_summary(top=10):
+    """ get the top slowest stages of each season in this run """
+    table = get_table(metadata_perf, engine_perf, 'timings')
+    df = pd.read_sql(sql=table.select().where(table.c.run_id == run_id), con=engine_perf)
+
+    # seasons are null for runs which are not split by season
+    df['season'] = df['season'].fillna(0)
+
+    output = df.groupby(['season', 'stage'], as_index=False).agg(calls=('calls', 'sum'),
+                                                                  total_time=('total_time', 'sum'),
+                                                                  self_time=('self_time', 'sum'),
+                                                                  p99=('p99', 'max'))
+    output = output.sort_values(['season', 'total_time'], ascending=[True, False])
+    output = output.groupby('season').head(top).reset_index(drop=True)
+
+    return output
+
+
+def report_performance(top=10):
+    """ print the top slowest stages of each season in this run """
     if PERFORMANCE_TEST:
-        output = pd.DataFrame(performance,
-                              columns=['timestamp_at', 'function'])
-        running_time = [output.timestamp_at[i] - output.timestamp_at[i - 1] for i in output.index if i > 0]
-        output.loc[1:len(running_time), 'running_time'] = running_time
-
-        output.to_sql('performance',
-                      con=engine_perf,
-                      schema='performance',
-                      if_exists='replace',
-                      index=False)
+        output = get_performance_summary(top)
+
+        for season, df in output.groupby('season'):
+            print(f'Slowest stages in season {season} of run {run_id}')
+            print(df.drop(columns='season').to_string(index=False))
@@ -0,0 +1,155 @@
+# SHARING SEASON DATA ACROSS PROCESSES
+from modelling.projects import pd
+import numpy as np
+from multiprocessing import shared_memory
+import pickle
+
+
+def share_array(array):
+    """ copy an array into a new shared memory block, and return the block with the spec to re-attach it """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+
+    output = {'name': block.name, 'dtype': array.dtype.str, 'shape': array.shape}
+
+    return block, output
+
+
+def attach_array(spec):
+    """ attach to an existing shared memory block as a read-only array """
+    block = shared_memory.SharedMemory(name=spec['name'])
+    output = np.ndarray(spec['shape'], dtype=np.dtype(spec['dtype']), buffer=block.buf)
+    output.flags.writeable = False
+
+    return block, output
+
+
+def get_column_arrays(series):
+    """ convert a column to plain arrays, with strings stored as fixed width utf-8 bytes plus a null mask """
+    is_numeric = pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype)
+
+    # only numpy dtypes have fixed size values to share as they are, not extension dtypes like Int64 or string
+    if is_numeric and isinstance(series.dtype, np.dtype):
+        output = 'numeric', {'values': series.to_numpy()}
+    elif (series.map(lambda x: isinstance(x, str)) | series.isnull()).all():
+        nulls = series.isnull().to_numpy()
+        values = np.array([x.encode('utf-8') for x in series.astype('object').where(~nulls, '')], dtype='S')
+        output = 'string', {'values': values, 'nulls': nulls}
+    else:
+        # anything else (e.g. datetime.date objects, or nullable Int64) is pickled whole
+        values = np.frombuffer(pickle.dumps(series.tolist()), dtype='uint8')
+        output = 'object', {'values': values}
+
+    return output
+
+
+def get_partition_index(series):
+    """ map each value of a sorted column to the contiguous slice of rows holding it """
+    # nulls are sorted last, so leave them out of the index
+    values = series.dropna().to_numpy()
+    keys = pd.unique(values)
+
+    starts = np.searchsorted(values, keys, side='left')
+    ends = np.searchsorted(values, keys, side='right')
+
+    output = {key: slice(start, end) for key, start, end in zip(keys, starts, ends)}
+
+    return output
+
+
+def share_frame(df, partition=None):
+    """ export each column of a DataFrame to shared memory once, so processes can attach without pickling it """
+    spec = {'length': len(df), 'columns': [], 'partitions': {}}
+    blocks = []
+
+    # sort by the partition column so each key is one contiguous slice, and index the slices once up front
+    if partition is not None:
+        # stable sort keeps the original row order within each partition
+        df = df.sort_values(partition, kind='mergesort').reset_index(drop=True)
+        spec['partitions'] = get_partition_index(df[partition])
+
+    for column in df.columns:
+        kind, arrays = get_column_arrays(df[column])
+        column_spec = {'name': column, 'kind': kind, 'arrays': {}}
+
+        for key, array in arrays.items():
+            block, column_spec['arrays'][key] = share_array(array)
+            blocks.append(block)
+
+        spec['columns'].append(column_spec)
+
+    return spec, blocks
+
+
+def release_frame(blocks):
+    """ free the shared memory once all processes using it have finished """
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+class SharedFrame:
+    """ read-only view of a DataFrame exported with share_frame, decoding only the rows asked for """
+    def __init__(self, spec):
+        self.length = spec['length']
+        self.columns = [column['name'] for column in spec['columns']]
+        self.kinds = {column['name']: column['kind'] for column in spec['columns']}
+        self.partitions = spec['partitions']
+        self.arrays = {}
+        self.blocks = []
+
+        for column in spec['columns']:
+            arrays = {}
+            for key, array_spec in column['arrays'].items():
+                block, arrays[key] = attach_array(array_spec)
+                self.blocks.append(block)
+
+            if column['kind'] == 'object':
+                arrays['values'] = np.array(pickle.loads(arrays['values'].tobytes()), dtype='object')
+
+            self.arrays[column['name']] = arrays
+
+    def __len__(self):
+        return self.length
+
+    def get_column(self, column, rows=slice(None)):
+        """ decode the given rows of a column into a Series """
+        arrays = self.arrays[column]
+        values = arrays['values'][rows]
+
+        if self.kinds[column] == 'string':
+            values = np.char.decode(values, 'utf-8').astype('object')
+            values[arrays['nulls'][rows]] = None
+        else:
+            # copy so nothing outside keeps a view of the shared memory
+            values = values.copy()
+
+        output = pd.Series(values, name=column)
+
+        return output
+
+    def get_rows(self, rows=slice(None)):
+        """ decode the given row positions (or slice) into a DataFrame indexed by those positions """
+        index = pd.RangeIndex(self.length)[rows]
+        output = pd.DataFrame({column: self.get_column(column, rows).values for column in self.columns},
+                              index=index,
+                              columns=self.columns)
+
+        return output
+
+    def get_partition(self, key):
+        """ decode the rows for one partition key (e.g. a game_id), empty if the key is not in the frame """
+        output = self.get_rows(self.partitions.get(key, slice(0, 0)))
+
+        return output
+
+    def to_frame(self):
+        return self.get_rows()
+
+    def close(self):
+        """ drop views of the shared memory, then detach from it """
+        self.arrays = {}
+        for block in self.blocks:
+            block.close()
+        self.blocks = []
+
@@ -1,5 +1,6 @@
 # SETTING UP SQL CONNECTIONS
 import sqlalchemy as sql
+from modelling.projects.nba.utils.connections import clear_table_cache
 
 
 # Set up building of tables
@@ -15,6 +16,7 @@ def create_table_games(engine, metadata):
                   sql.Column('season', sql.SMALLINT),
                   sql.Column('is_playoffs', sql.SMALLINT))
         metadata.create_all()
+        clear_table_cache(engine, 'games')
 
 
 def create_table_games_lineups(engine, metadata):
@@ -25,6 +27,7 @@ def create_table_games_lineups(engine, metadata):
                   sql.Column('player_id', sql.VARCHAR(9)),
                   sql.Column('role', sql.VARCHAR(7)))
         metadata.create_all()
+        clear_table_cache(engine, 'games_lineups')
 
 
 def create_table_odds(engine, metadata):
@@ -34,6 +37,22 @@ def create_table_odds(engine, metadata):
                   sql.Column('home_odds', sql.DECIMAL(4, 2)),
                   sql.Column('away_odds', sql.DECIMAL(4, 2)))
         metadata.create_all()
+        clear_table_cache(engine, 'odds')
+
+
+def create_table_player_values(engine, metadata):
+    if not engine.dialect.has_table(engine, 'player_values'):
+        sql.Table('player_values', metadata,
+                  sql.Column('window_type', sql.VARCHAR(7), nullable=False),
+                  sql.Column('season', sql.SMALLINT, nullable=False),
+                  sql.Column('end_date', sql.DATE, nullable=False),
+                  sql.Column('games', sql.SMALLINT),
+                  sql.Column('player_id', sql.VARCHAR(9), nullable=False),
+                  sql.Column('value', sql.FLOAT),
+                  sql.Column('possessions', sql.INTEGER),
+                  sql.Index('ix_player_values_window', 'window_type', 'end_date', 'season'))
+        metadata.create_all()
+        clear_table_cache(engine, 'player_values')
 
 
 def create_table_players(engine, metadata):
@@ -50,6 +69,7 @@ def create_table_players(engine, metadata):
                   sql.Column('draft_pick', sql.SMALLINT),
                   sql.Column('rookie_year', sql.SMALLINT))
         metadata.create_all()
+        clear_table_cache(engine, 'players')
 
 
 def create_table_plays(engine, metadata):
@@ -59,7 +79,8 @@ def create_table_plays(engine, metadata):
                   sql.Column('game_id', sql.VARCHAR(12)),
                   sql.Column('period', sql.VARCHAR(3)),
                   sql.Column('time', sql.TIME),
-                  sql.Column('score', sql.VARCHAR(7)),
+                  sql.Column('home_score', sql.SMALLINT),
+                  sql.Column('away_score', sql.SMALLINT),
                   sql.Column('team_id', sql.VARCHAR(3)),
                   sql.Column('player_id', sql.VARCHAR(9)),
                   sql.Column('event', sql.VARCHAR(32)),
@@ -67,6 +88,7 @@ def create_table_plays(engine, metadata):
                   sql.Column('event_detail', sql.VARCHAR(32)),
                   sql.Column('possession', sql.SMALLINT))
         metadata.create_all()
+        clear_table_cache(engine, 'plays')
 
 
 def create_table_plays_players(engine, metadata):
@@ -74,9 +96,37 @@ def create_table_plays_players(engine, metadata):
         sql.Table('plays_players', metadata,
                   sql.Column('play_id', sql.VARCHAR(16), primary_key=True, nullable=False),
                   sql.Column('game_id', sql.VARCHAR(12)),
-                  sql.Column('players', sql.VARCHAR(49)),
-                  sql.Column('opp_players', sql.VARCHAR(49)))
+                  sql.Column('lineup_id', sql.BIGINT),
+                  sql.Column('opp_lineup_id', sql.BIGINT))
+        metadata.create_all()
+        clear_table_cache(engine, 'plays_players')
+
+
+def create_table_lineups(engine, metadata):
+    if not engine.dialect.has_table(engine, 'lineups'):
+        sql.Table('lineups', metadata,
+                  sql.Column('lineup_id', sql.BIGINT, primary_key=True, autoincrement=False, nullable=False),
+                  sql.Column('player_1', sql.VARCHAR(9)),
+                  sql.Column('player_2', sql.VARCHAR(9)),
+                  sql.Column('player_3', sql.VARCHAR(9)),
+                  sql.Column('player_4', sql.VARCHAR(9)),
+                  sql.Column('player_5', sql.VARCHAR(9)))
         metadata.create_all()
+        clear_table_cache(engine, 'lineups')
+
+
+def create_table_possessions(engine, metadata):
+    if not engine.dialect.has_table(engine, 'possessions'):
+        sql.Table('possessions', metadata,
+                  sql.Column('play_id', sql.VARCHAR(16), primary_key=True, nullable=False),
+                  sql.Column('game_id', sql.VARCHAR(12), index=True),
+                  sql.Column('period', sql.VARCHAR(3)),
+                  sql.Column('team_id', sql.VARCHAR(3)),
+                  sql.Column('lineup_id', sql.BIGINT),
+                  sql.Column('opp_lineup_id', sql.BIGINT),
+                  sql.Column('points', sql.SMALLINT))
+        metadata.create_all()
+        clear_table_cache(engine, 'possessions')
 
 
 def create_table_plays_raw(engine, metadata):
@@ -88,6 +138,7 @@ def create_table_plays_raw(engine, metadata):
                   sql.Column('player_2', sql.VARCHAR(9)),
                   sql.Column('player_3', sql.VARCHAR(9)))
         metadata.create_all()
+        clear_table_cache(engine, 'plays_raw')
 
 
 def create_table_teams(metadata):
@@ -98,3 +149,32 @@ def create_table_teams(metadata):
               sql.Column('coordinates', sql.VARCHAR(32)))
     metadata.drop_all()
     metadata.create_all()
+    clear_table_cache(metadata.bind, 'teams')
+
+
+def create_table_timings(engine, metadata):
+    if not engine.dialect.has_table(engine, 'timings'):
+        sql.Table('timings', metadata,
+                  sql.Column('run_id', sql.VARCHAR(32), index=True, nullable=False),
+                  sql.Column('pid', sql.INTEGER),
+                  sql.Column('season', sql.SMALLINT),
+                  sql.Column('game_id', sql.VARCHAR(12)),
+                  sql.Column('stage', sql.VARCHAR(64)),
+                  sql.Column('calls', sql.INTEGER),
+                  sql.Column('timed_calls', sql.INTEGER),
+                  sql.Column('total_time', sql.FLOAT),
+                  sql.Column('self_time', sql.FLOAT),
+                  sql.Column('p50', sql.FLOAT),
+                  sql.Column('p99', sql.FLOAT))
+        metadata.create_all()
+        clear_table_cache(engine, 'timings')
+
+
+def create_table_watermarks(engine, metadata):
+    if not engine.dialect.has_table(engine, 'watermarks'):
+        sql.Table('watermarks', metadata,
+                  sql.Column('stage', sql.VARCHAR(32), primary_key=True, nullable=False),
+                  sql.Column('game_date', sql.DATE),
+                  sql.Column('updated_at', sql.DATETIME))
+        metadata.create_all()
+        clear_table_cache(engine, 'watermarks')
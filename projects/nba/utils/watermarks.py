@@ -0,0 +1,62 @@
+# TRACKING HOW FAR EACH TABLE HAS BEEN LOADED
+from modelling.projects import pd, dt
+from modelling.projects.nba.utils.connections import sql, get_table
+
+
+def get_watermark(engine, metadata, stage):
+    """ get the date of the last game loaded by a stage, or None if it has never run incrementally """
+    table = get_table(metadata, engine, 'watermarks')
+    output = engine.execute(sql.select([table.c.game_date]).where(table.c.stage == stage)).scalar()
+
+    return output
+
+
+def set_watermark(engine, metadata, stage, game_date):
+    """ move a stage's watermark on to the date of the last game it loaded """
+    table = get_table(metadata, engine, 'watermarks')
+
+    with engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.stage == stage))
+        connection.execute(table.insert().values(stage=stage, game_date=game_date, updated_at=dt.now()))
+
+
+# stages that each stage loads its games from, so it can't get ahead of any of them
+upstream_stages = {'games_lineups': ['games'],
+                   'plays_raw': ['games'],
+                   'plays': ['plays_raw', 'games_lineups'],
+                   'plays_players': ['plays'],
+                   'player_values': ['plays_players']}
+
+
+def get_new_games(engine, metadata, stage, upstream=None):
+    """ get games after a stage's watermark, up to the watermark of the stages it loads from, oldest first """
+    table = get_table(metadata, engine, 'games')
+    selectable = sql.select([table.c.game_id, table.c.game_date, table.c.season])
+
+    start = get_watermark(engine, metadata, stage)
+    ends = [get_watermark(engine, metadata, i) for i in upstream or upstream_stages[stage]]
+
+    if start is not None:
+        selectable = selectable.where(table.c.game_date > start)
+
+    if None in ends:
+        # a stage that has never run incrementally has no watermark, so only take games that have been played
+        selectable = selectable.where(table.c.home_score.isnot(None))
+    else:
+        selectable = selectable.where(table.c.game_date <= min(ends))
+
+    output = pd.read_sql(sql=selectable.order_by(table.c.game_date), con=engine)
+
+    return output
+
+
+def update_watermark(engine, metadata, stage, new_games, failed_games=()):
+    """ move a stage's watermark past the games it has just loaded, stopping before the first day with a game that
+    failed, so that day is loaded again at the next run """
+    failed_dates = new_games.loc[new_games['game_id'].isin(list(failed_games)), 'game_date']
+
+    if len(failed_dates):
+        new_games = new_games[new_games['game_date'] < failed_dates.min()]
+
+    if len(new_games):
+        set_watermark(engine, metadata, stage, new_games['game_date'].max())
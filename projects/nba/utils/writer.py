@@ -0,0 +1,227 @@
+# BUFFERED WRITING TO THE DB
+from modelling.projects import pd, time
+import threading
+import sqlalchemy as sql
+from modelling.projects.nba.utils.colours import *
+from modelling.projects.nba.utils.functions import write_data
+
+
+class BufferedWriter:
+    """ collect DataFrames for one table and append them in large batches from a background thread """
+    def __init__(self,
+                 name,
+                 sql_engine,
+                 db_schema,
+                 index=False,
+                 max_rows=20000,
+                 max_bytes=16*1024**2,
+                 flush_interval=5,
+                 method=None,
+                 chunk_size=10000,
+                 after=None,
+                 replace_on=None,
+                 max_retries=3,
+                 failed_games=None):
+        self.name = name
+        self.sql_engine = sql_engine
+        self.db_schema = db_schema
+        self.index = index
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+
+        # default executemany is sent by MySQLdb as multi-row INSERT statements, 'multi' builds them in pandas instead
+        self.method = method
+        self.chunk_size = chunk_size
+
+        # writer whose rows must be in the DB before these, e.g. the lineups that plays_players rows point to
+        self.after = after
+
+        # column whose values in a batch have their rows already in the table deleted in the same transaction, e.g.
+        # game_id so each game is loaded afresh without clearing every game before the run starts
+        self.replace_on = replace_on
+
+        # a batch still failing after max_retries more flushes is dropped, with its game_ids added to failed_games so
+        # the watermark stops before them and they are loaded again at the next run
+        self.max_retries = max_retries
+        self.failed_games = failed_games
+
+        self.buffer = []
+        self.buffer_rows = 0
+        self.buffer_bytes = 0
+        self.status = {'sql': Colour.green + 'DB (Buffered)' + Colour.end}
+
+        # error from the last flush, whose batch is kept to write again at the next flush, and rows dropped so far
+        self.error = None
+        self.attempts = 0
+        self.dropped_rows = 0
+
+        # buffer_lock guards the buffer, flush_lock keeps flushes in order
+        self.buffer_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_event = threading.Event()
+        self.stop_event = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, name=f'BufferedWriter-{name}', daemon=True)
+        self.thread.start()
+
+    def write(self, df):
+        """ add rows to the buffer, and return the status of the last flush, which may not include these rows """
+        with self.buffer_lock:
+            self.buffer.append(df)
+            self.buffer_rows += len(df)
+            self.buffer_bytes += int(df.memory_usage(index=self.index, deep=True).sum())
+
+            if self.buffer_rows >= self.max_rows or self.buffer_bytes >= self.max_bytes:
+                self.flush_event.set()
+
+        return self.status
+
+    def flush(self):
+        """ write everything buffered so far in one batch """
+        with self.flush_lock:
+            with self.buffer_lock:
+                buffer = self.buffer
+                self.buffer = []
+                self.buffer_rows = 0
+                self.buffer_bytes = 0
+                self.flush_event.clear()
+
+            if buffer:
+                try:
+                    # everything buffered by the other writer so far includes what this batch points to
+                    if self.after is not None:
+                        self.after.flush()
+
+                        if self.after.error is not None or self.after.dropped_rows:
+                            raise RuntimeError(f'{self.after.name} must be written first') from self.after.error
+
+                    self.write_batch(pd.concat(buffer, ignore_index=True))
+                except Exception as e:
+                    self.error = e
+                    self.attempts += 1
+
+                    if self.attempts > self.max_retries:
+                        self.drop(buffer)
+                    else:
+                        # put the batch back in front of anything buffered since, to try again at the next flush
+                        with self.buffer_lock:
+                            self.buffer = buffer + self.buffer
+                            self.buffer_rows += sum([len(df) for df in buffer])
+                            self.buffer_bytes += sum([int(df.memory_usage(index=self.index, deep=True).sum())
+                                                      for df in buffer])
+
+                    self.status = {'sql': Colour.red + 'DB (Last Flush Failed)' + Colour.end}
+                else:
+                    self.error = None
+                    self.attempts = 0
+                    self.status = {'sql': Colour.green + 'DB (Last Flush Succeeded)' + Colour.end}
+
+        return self.status
+
+    def drop(self, buffer):
+        """ give up on a batch, marking its games as failed """
+        self.attempts = 0
+        self.dropped_rows += sum([len(df) for df in buffer])
+
+        if self.failed_games is not None:
+            game_ids = {game_id for df in buffer if 'game_id' in df.columns for game_id in df['game_id'].unique()}
+            self.failed_games.extend(sorted(game_ids))
+
+    def write_batch(self, df):
+        """ append a batch in one transaction, replacing any rows for its replace_on values """
+        with self.sql_engine.begin() as connection:
+            if self.replace_on is not None:
+                table = self.name if self.db_schema is None else f'{self.db_schema}.{self.name}'
+                delete = sql.text(f'DELETE FROM {table} WHERE {self.replace_on} IN :values')
+
+                connection.execute(delete.bindparams(sql.bindparam('values', expanding=True)),
+                                   {'values': df[self.replace_on].unique().tolist()})
+
+            df.to_sql(self.name,
+                      con=connection,
+                      schema=self.db_schema,
+                      if_exists='append',
+                      index=self.index,
+                      method=self.method,
+                      chunksize=self.chunk_size)
+
+    def run(self):
+        """ flush when a threshold is reached, or every flush_interval seconds while rows are waiting """
+        while not self.stop_event.is_set():
+            self.flush_event.wait(self.flush_interval)
+
+            # keep the thread alive whatever goes wrong, as close reports anything that still can't be written
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        """ stop the background thread and write anything left in the buffer, raising if any rows were dropped """
+        self.stop_event.set()
+        self.flush_event.set()
+        self.thread.join()
+
+        # retry straight away, as there are no more flushes to wait for
+        output = self.flush()
+        while self.buffer:
+            output = self.flush()
+
+        if self.dropped_rows:
+            raise RuntimeError(f'Could not write {self.dropped_rows} rows to {self.name}') from self.error
+
+        return output
+
+
+def close_writers(*writers):
+    """ close each writer in order, even if an earlier one raises, then raise the first error """
+    errors = []
+
+    for writer in writers:
+        try:
+            writer.close()
+        except RuntimeError as e:
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+
+def benchmark_writer(games=200, rows=500, max_rows=20000):
+    """ compare per-game write_data calls against BufferedWriter on a file-backed SQLite stand-in """
+    import sqlalchemy as sql
+    import tempfile
+
+    df = pd.DataFrame({'play_id': [f'{i:0>16}' for i in range(rows)],
+                       'game_id': '202001010LAL',
+                       'event': 'FG Shot',
+                       'event_value': 2,
+                       'possession': 0})
+
+    with tempfile.TemporaryDirectory() as directory:
+        # each to_sql call is its own transaction, so per game writes pay a commit every game
+        engine = sql.create_engine(f'sqlite:///{directory}/per_game.db')
+        start = time.perf_counter()
+        for i in range(games):
+            write_data(df=df, name='plays', sql_engine=engine, db_schema=None, if_exists='append', index=False)
+        per_game = time.perf_counter() - start
+        engine.dispose()
+
+        engine = sql.create_engine(f'sqlite:///{directory}/buffered.db')
+        start = time.perf_counter()
+        writer = BufferedWriter('plays', engine, None, max_rows=max_rows)
+        for i in range(games):
+            writer.write(df)
+        writer.close()
+        buffered = time.perf_counter() - start
+        engine.dispose()
+
+    output = {'per_game': per_game, 'buffered': buffered}
+    print(f'{games} games of {rows} rows: per game {per_game:.2f} seconds, buffered {buffered:.2f} seconds')
+
+    return output
+
+
+if __name__ == '__main__':
+    benchmark_writer()